@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Company, Employee, Application, Question, TodoList, CompanyQuestions, CV
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+from .models import Company, Employee, Application, Question, TodoList, CompanyQuestions, CV, Task, ProfileReport
+from .profiling import report_text
 
 # Register your models here.
 admin.site.register(Company)
@@ -9,4 +15,55 @@ admin.site.register(Question)
 admin.site.register(TodoList)
 admin.site.register(CompanyQuestions)
 admin.site.register(CV)
+admin.site.register(Task)
 
+
+@admin.register(ProfileReport)
+class ProfileReportAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'view_name', 'status_code', 'duration_ms', 'query_count', 'db_ms', 'user',
+                    'trigger', 'downloads']
+    list_filter = ['view_name', 'trigger']
+    ordering = ['-pk']
+    fields = ['created_at', 'user', 'trigger', 'method', 'path', 'view_name', 'status_code', 'duration_ms',
+              'query_count', 'db_ms', 'downloads', 'statements', 'profile_stats']
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download.<str:extension>', self.admin_site.admin_view(self.download),
+                 name='JobLanderAPI_profilereport_download'),
+        ] + super().get_urls()
+
+    def download(self, request, pk, extension):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        report = get_object_or_404(ProfileReport, pk=pk)
+        if extension == 'prof':
+            content, content_type = bytes(report.profile), 'application/octet-stream'
+        elif extension == 'txt':
+            content, content_type = report_text(report), 'text/plain; charset=utf-8'
+        else:
+            return HttpResponse(status=404)
+        return HttpResponse(content, content_type=content_type,
+                            headers={'Content-Disposition': f'attachment; filename="profile-{pk}.{extension}"'})
+
+    @admin.display(description='Download')
+    def downloads(self, report):
+        return format_html_join(' ', '<a href="{}">.{}</a>', (
+            (reverse('admin:JobLanderAPI_profilereport_download', args=[report.pk, extension]), extension)
+            for extension in ('prof', 'txt')
+        ))
+
+    @admin.display(description='SQL')
+    def statements(self, report):
+        return format_html('<pre>{}</pre>', '\n'.join(f"{query['ms']:9.3f} ms  {query['sql']}" for query in report.queries))
+
+    @admin.display(description='Profile')
+    def profile_stats(self, report):
+        return format_html('<pre>{}</pre>', report.stats)
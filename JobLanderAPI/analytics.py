@@ -0,0 +1,201 @@
+# analytics.py
+# Statistics, percents and timeseries computed together from one grouped
+# query over ApplicationDailyRollup, which holds the same counts as
+# Application (see rollups.py) in far fewer rows.
+from datetime import datetime, timedelta
+
+from django.db.models import Case, DateField, F, Max, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .cache import acached_analytics, cached_analytics
+from .models import ApplicationDailyRollup, ApplicationStatus, Stage
+
+SECTIONS = ['statistics', 'percents', 'timeseries']
+INTERVALS = ['month', 'week', 'day']
+DATE_FORMATS = {'day': '%Y-%m-%d', 'week': '%Y-%m-W%W', 'month': '%Y-%m'}
+CLOSED_STATUSES = [ApplicationStatus.ACCEPTED.name, ApplicationStatus.REJECTED.name]
+PERCENT_STAGES = {
+    'applied_stage': Stage.APPLIED.name,
+    'phonescreen_stage': Stage.PHONE_SCREEN.name,
+    'assessment_stage': Stage.ASSESSMENT.name,
+    'interview_stage': Stage.INTERVIEW.name,
+    'offer_stage': Stage.OFFER.name,
+}
+
+
+class AnalyticsError(ValueError):
+    pass
+
+
+def parse_sections(value):
+    sections = [section.strip() for section in value.split(',') if section.strip()] if value else SECTIONS
+    if not sections or any(section not in SECTIONS for section in sections):
+        raise AnalyticsError(f"Invalid sections. Choose from: {', '.join(SECTIONS)}")
+    return [section for section in SECTIONS if section in sections]
+
+
+def parse_timeseries_params(query_params, user):
+    interval = query_params.get('interval', 'month')
+    start_date = query_params.get('start_date', user.date_joined.strftime('%Y-%m-%d'))
+    if interval not in INTERVALS:
+        raise AnalyticsError('Invalid interval. Choose from: month, week, day')
+    try:
+        points = int(query_params.get('points', 12))
+    except ValueError:
+        points = 0
+    if points < 1 or points>100:
+        raise AnalyticsError('Invalid number of points Choose from 1 to 100')
+    if start_date:
+        try:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        except ValueError:
+            raise AnalyticsError('Invalid date format. Use: YYYY-MM-DD')
+    return {'interval': interval, 'points': points, 'start_date': start_date or None}
+
+
+def add_months(day, months):
+    year, month = divmod(day.month - 1 + months, 12)
+    return day.replace(year=day.year + year, month=month + 1)
+
+
+def get_buckets(interval, points, start_date=None):
+    """
+    The first day of each of the `points` buckets plus the end of the last
+    one: calendar days, Monday-based weeks or calendar months. Without a
+    start date the series ends with the current bucket.
+    """
+    today = datetime.now().date()
+    if interval == 'day':
+        start_date = start_date or today - timedelta(days=points-1)
+        return [start_date + timedelta(days=i) for i in range(points + 1)]
+    if interval == 'week':
+        start_date = start_date or today - timedelta(weeks=points-1)
+        start_date = start_date - timedelta(days=start_date.weekday())
+        return [start_date + timedelta(weeks=i) for i in range(points + 1)]
+    start_date = add_months((start_date or today).replace(day=1), 0 if start_date else -(points-1))
+    return [add_months(start_date, i) for i in range(points + 1)]
+
+
+def bucket_expression(interval, buckets):
+    truncated = {'day': F('day'), 'week': TruncWeek('day'), 'month': TruncMonth('day')}[interval]
+    in_range = Q(day__gte=buckets[0], day__lt=buckets[-1])
+    return Case(When(in_range, then=truncated), default=Value(None), output_field=DateField())
+
+
+def rollup_rows(user, sections, timeseries=None):
+    """The grouped rollup query behind compute() and its buckets (None without timeseries)."""
+    rollup = ApplicationDailyRollup.objects.filter(user=user)
+    buckets = None
+    if 'timeseries' in sections:
+        buckets = get_buckets(**timeseries)
+        if sections == ['timeseries']:
+            rollup = rollup.filter(day__gte=buckets[0], day__lt=buckets[-1])
+        bucket = bucket_expression(timeseries['interval'], buckets)
+    else:
+        bucket = Value(None, output_field=DateField())
+    rows = (
+        rollup.annotate(bucket=bucket).values('status', 'stage', 'bucket')
+        .annotate(total=Sum('count'), last=Max('day')).order_by()
+    )
+    return rows, buckets
+
+
+def summarize(rows, sections, timeseries, buckets):
+    data = {}
+    if 'statistics' in sections:
+        data['statistics'] = get_statistics(rows)
+    if 'percents' in sections:
+        data['percents'] = get_percents(rows)
+    if 'timeseries' in sections:
+        data['timeseries'] = get_timeseries(rows, timeseries['interval'], timeseries['points'], buckets)
+    return data
+
+
+def compute(user, sections, timeseries=None):
+    rows, buckets = rollup_rows(user, sections, timeseries)
+    return summarize(list(rows), sections, timeseries, buckets)
+
+
+async def acompute(user, sections, timeseries=None):
+    rows, buckets = rollup_rows(user, sections, timeseries)
+    return summarize([row async for row in rows], sections, timeseries, buckets)
+
+
+def latest(rows):
+    dates = [row['last'] for row in rows]
+    return max(dates) if dates else None
+
+
+def get_statistics(rows):
+    rejected = [row for row in rows if row['status'] == ApplicationStatus.REJECTED.name]
+    accepted = [row for row in rows if row['status'] == ApplicationStatus.ACCEPTED.name]
+    pending = [row for row in rows if row['status'] not in CLOSED_STATUSES]
+    return {
+        'total_applications': sum(row['total'] for row in rows),
+        'pending_applications': sum(row['total'] for row in pending),
+        'rejected_applications': sum(row['total'] for row in rejected),
+        'accepted_applications': sum(row['total'] for row in accepted),
+        'last_application': latest(rows),
+        'last_rejection': latest(rejected),
+        'last_acceptance': latest(accepted),
+        'last_pending': latest(pending),
+    }
+
+
+def get_percents(rows):
+    closed = [row for row in rows if row['status'] in CLOSED_STATUSES]
+    stats = {'total_applications': sum(row['total'] for row in closed)}
+    for key, stage in PERCENT_STAGES.items():
+        stats[key] = sum(row['total'] for row in closed if row['stage'] == stage)
+
+    total = max(stats['total_applications'],1)
+    for key in stats:
+        stats[key] = round((stats[key]/total)*100, 2)
+    return stats
+
+
+def get_timeseries(rows, interval, points, buckets):
+    counts = {}
+    for row in rows:
+        if row['bucket'] is None:
+            continue
+        bucket = counts.setdefault(row['bucket'], {'total_applications': 0, 'rejections': 0, 'acceptances': 0})
+        bucket['total_applications'] += row['total']
+        if row['status'] == ApplicationStatus.REJECTED.name:
+            bucket['rejections'] += row['total']
+        elif row['status'] == ApplicationStatus.ACCEPTED.name:
+            bucket['acceptances'] += row['total']
+
+    date_str = DATE_FORMATS[interval]
+    results = []
+    for date_point in buckets[:-1]:
+        results.append({
+            'date': date_point.strftime(date_str),
+            **counts.get(date_point, {'total_applications': 0, 'rejections': 0, 'acceptances': 0}),
+        })
+    return {
+        "points" : points,
+        "start_date" : buckets[0].strftime(date_str),
+        "interval" : interval,
+        "results": results,
+    }
+
+
+def dashboard_params(sections, timeseries):
+    params = {'sections': ','.join(sections)}
+    if 'timeseries' in sections:
+        # Without a start date the buckets move with the current day
+        params.update(timeseries, start_date=timeseries['start_date'] or f"today-{datetime.now().date()}")
+    return params
+
+
+def get_dashboard(user, sections, timeseries=None):
+    """The requested sections for `user`, served from the per-user analytics cache."""
+    params = dashboard_params(sections, timeseries)
+    return cached_analytics(user.id, 'dashboard', params, lambda: compute(user, sections, timeseries))
+
+
+async def aget_dashboard(user, sections, timeseries=None):
+    """get_dashboard() for the async views, sharing its cache entries."""
+    params = dashboard_params(sections, timeseries)
+    return await acached_analytics(user.id, 'dashboard', params, lambda: acompute(user, sections, timeseries))
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class JoblanderapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'JobLanderAPI'
+
+    def ready(self):
+        from . import checks, metrics, signals  # noqa: F401
@@ -0,0 +1,85 @@
+# asyncviews.py
+# DRF views whose handlers are coroutines, for the hot read endpoints when
+# served by ASGI (see joblander/asgi.py and urls.py). DRF's dispatch() is
+# synchronous, so AsyncAPIViewMixin replaces it: authenticators with an
+# aauthenticate() (see authentication.py) run on the event loop, others and
+# the throttles in a thread. List views count and fetch their page with the
+# async ORM and serialize the loaded rows, which must not need further
+# queries (the querysets already select_related what the serializers read).
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from rest_framework import exceptions, generics
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+class AsyncAPIViewMixin:
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if not iscoroutinefunction(handler):
+                # OPTIONS and the 405 response
+                handler = sync_to_async(handler)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        if self.throttle_classes:
+            # Throttles read and write the cache
+            await sync_to_async(self.check_throttles)(request)
+
+    async def aperform_authentication(self, request):
+        # Request._authenticate() with the async path of each authenticator
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, 'aauthenticate', None) or sync_to_async(authenticator.authenticate)
+            try:
+                user_auth_tuple = await authenticate(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+
+class AsyncAPIView(AsyncAPIViewMixin, APIView):
+    pass
+
+
+class AsyncListCreateAPIView(AsyncAPIViewMixin, generics.ListCreateAPIView):
+    """Lists with the async ORM; creating stays synchronous and runs in a thread."""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.create)(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer([obj async for obj in queryset], many=True).data)
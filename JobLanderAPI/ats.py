@@ -0,0 +1,238 @@
+# ats.py
+# ATS scores: how much of an application's job description its submitted CV
+# covers. The description becomes a term vector (lowercased words without
+# stopwords, weighted by sublinear term frequency) and the score is the share
+# of its weight carried by terms the CV contains, 0 to 100. CV text is
+# extracted once per stored file and kept on its CVBlob; as the file name is
+# the hash of its content, the CV's term set is also cached in memory by
+# name. Scores are computed by a task after the application is committed,
+# and again for all its applications when a CV's file is replaced (see
+# signals.py), so the response carries the previous value. An application
+# whose CV has no readable text, because the file is broken, encrypted or a
+# scan, gets a null score; the task does not fail.
+from collections import Counter, defaultdict
+from functools import lru_cache
+import logging
+import math
+import re
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import blobs, cache, cvtext, tasks
+
+logger = logging.getLogger(__name__)
+
+SCORE_BATCH_SIZE = 500
+CV_TERMS_CACHE_SIZE = 256
+TERM = re.compile(r'[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*')
+# Languages spelled with a single letter; other one letter words are noise
+SHORT_TERMS = frozenset({'c', 'r'})
+STOPWORDS = frozenset('''
+    a about above after again against all also am an and any are as at be because been before being below between
+    both but by can could did do does doing down during each etc few for from further had has have having he her
+    here hers him his how i if in into is it its itself just me more most must my no nor not now of off on once only
+    or other our ours out over own same she should so some such than that the their theirs them then there these
+    they this those through to too under until up us very was we were what when where which while who whom why will
+    with within would you your yours
+    ability able across apply candidate candidates including job looking plus position preferred prior required
+    requirement role strong work working year
+'''.split())
+
+
+def terms(text):
+    result = []
+    for term in TERM.findall(str(text or '').lower()):
+        # Plurals match their singular on either side; names like node.js stay
+        if len(term) > 3 and term.endswith('s') and term[-2] not in 'su' and term.isalpha() and term not in STOPWORDS:
+            term = term[:-1]
+        if term in STOPWORDS or (len(term) < 2 and term not in SHORT_TERMS) or not any(c.isalpha() for c in term):
+            continue
+        result.append(term)
+    return result
+
+
+def description_weights(description):
+    return {term: 1 + math.log(count) for term, count in Counter(terms(description)).items()}
+
+
+class TermMatrix:
+    """
+    Descriptions as a sparse matrix over a shared vocabulary: one row of
+    column indices and weights per distinct description. It is built once
+    per batch of applications and scored against each of their CVs, so a
+    description is weighed once however many applications or CVs share it.
+    """
+
+    def __init__(self, descriptions=()):
+        self.vocabulary, self.rows, self.row_ids = {}, [], {}
+        for description in descriptions:
+            self.add(description)
+
+    def add(self, description):
+        """The row of `description`, added when it is new."""
+        row_id = self.row_ids.get(description)
+        if row_id is None:
+            weights = description_weights(description)
+            columns = [self.vocabulary.setdefault(term, len(self.vocabulary)) for term in weights]
+            row_id = self.row_ids[description] = len(self.rows)
+            self.rows.append((columns, list(weights.values()), sum(weights.values())))
+        return row_id
+
+    def mask(self, cv_terms):
+        # The CV as 0/1 over the columns, from whichever of the two sets is smaller
+        mask = bytearray(len(self.vocabulary))
+        if len(cv_terms) < len(self.vocabulary):
+            for term in cv_terms:
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    mask[column] = 1
+        else:
+            for term, column in self.vocabulary.items():
+                mask[column] = term in cv_terms
+        return mask
+
+    def scores(self, cv_terms, row_ids):
+        """Scores of the given rows against one CV: masked row sums over total weights."""
+        mask = self.mask(cv_terms)
+        scores = []
+        for row_id in row_ids:
+            columns, weights, total = self.rows[row_id]
+            scores.append(round(100 * sum(weight for column, weight in zip(columns, weights) if mask[column]) / total)
+                          if total else 0)
+        return scores
+
+
+def score_batch(cv_terms, descriptions):
+    """Scores of many descriptions against one CV."""
+    matrix = TermMatrix()
+    return matrix.scores(cv_terms, [matrix.add(description) for description in descriptions])
+
+
+def score(cv_terms, description):
+    return score_batch(cv_terms, [description])[0]
+
+
+def extract(name):
+    """The text of a stored CV, '' when it cannot be read."""
+    with blobs.cv_storage().open(name, 'rb') as file:
+        try:
+            return cvtext.extract_text(file, name)
+        except cvtext.UnreadableFile as exc:
+            logger.warning('Could not read the text of %s: %s', name, exc)
+        except Exception:
+            # A parser bug must not fail the task on every retry either
+            logger.exception('Could not extract the text of %s', name)
+    return ''
+
+
+@lru_cache(maxsize=CV_TERMS_CACHE_SIZE)
+def cv_terms(name):
+    """The CV's set of terms, None when it has none to score against."""
+    from .models import CVBlob
+    text = CVBlob.objects.filter(name=name).values_list('text', flat=True).first()
+    if text is None:
+        text = extract(name)
+        CVBlob.objects.filter(name=name, text__isnull=True).update(text=text)
+    return frozenset(terms(text)) or None
+
+
+def rescore(applications):
+    """
+    Score the applications of a queryset that have a CV, in pk order and
+    batches. Each batch gets one TermMatrix of its descriptions, scored
+    against each of its CVs in turn. Scores that changed are written with
+    bulk_update. Returns how many changed.
+    """
+    from .models import Application
+    applications = applications.filter(submitted_cv__isnull=False).order_by('pk')
+    last, changed_count = 0, 0
+    while True:
+        started = timezone.now()
+        rows = list(applications.filter(pk__gt=last).values_list(
+            'pk', 'user_id', 'description', 'submitted_cv__cv', 'ats_score')[:SCORE_BATCH_SIZE])
+        if not rows:
+            return changed_count
+        last = rows[-1][0]
+        matrix = TermMatrix()
+        by_cv = defaultdict(list)
+        for row in rows:
+            if row[3]:
+                by_cv[row[3]].append((row, matrix.add(row[2])))
+        # Scored before the transaction, extraction can take a while
+        changed = []
+        for name, cv_rows in by_cv.items():
+            try:
+                cv = cv_terms(name)
+            except FileNotFoundError:
+                logger.warning('CV file %s is missing, its applications are not scored', name)
+                continue
+            scores = matrix.scores(cv, [row_id for _, row_id in cv_rows]) if cv is not None else [None] * len(cv_rows)
+            for ((pk, user_id, _, _, current), _), new in zip(cv_rows, scores):
+                if new != current:
+                    changed.append(Application(pk=pk, user_id=user_id, ats_score=new))
+        if changed:
+            with transaction.atomic():
+                # Rows edited since they were read are left to the job that edit scheduled
+                Application.objects.filter(updated_at__lt=started).bulk_update(changed, ['ats_score'])
+                for user_id in {application.user_id for application in changed}:
+                    cache.invalidate_on_commit(user_id, cache.DATA)
+        changed_count += len(changed)
+
+
+@tasks.task
+def score_applications(ids):
+    """Score the applications with a CV among `ids` and store the scores that changed."""
+    from .models import Application
+    ids = sorted(ids)
+    for start in range(0, len(ids), SCORE_BATCH_SIZE):
+        rescore(Application.objects.filter(pk__in=ids[start:start + SCORE_BATCH_SIZE]))
+
+
+@tasks.task
+def rescore_cv(cv_id):
+    """Score every application submitted with the CV, after its file was replaced."""
+    from .models import Application
+    rescore(Application.objects.filter(submitted_cv_id=cv_id))
+
+
+def rescore_user(user_id):
+    from .models import Application
+    return rescore(Application.objects.filter(user_id=user_id))
+
+
+def inputs(instance):
+    return instance.description, instance.submitted_cv_id
+
+
+def needs_score(instance, created, update_fields=None):
+    if instance.submitted_cv_id is None:
+        return False
+    if update_fields is not None and not {'description', 'submitted_cv', 'submitted_cv_id'} & set(update_fields):
+        return False
+    return created or getattr(instance, '_ats_inputs', None) != inputs(instance)
+
+
+def schedule(ids):
+    """
+    Queue scoring of the applications once the transaction commits. Calls in
+    one transaction (imports save rows one at a time on some backends) share
+    one task. It is queued from the commit hook, so a crash right after the
+    commit loses it; `manage.py rescore_applications` catches up.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        tasks.enqueue(score_applications, sorted(ids))
+        return
+    pending = connection.__dict__.get('pending_ats_scores')
+    if pending is None or not any(entry[1] is pending[1] for entry in connection.run_on_commit):
+        pending_ids = set()
+
+        def callback():
+            connection.__dict__.pop('pending_ats_scores', None)
+            for start in range(0, len(pending_ids), SCORE_BATCH_SIZE):
+                tasks.enqueue(score_applications, sorted(pending_ids)[start:start + SCORE_BATCH_SIZE])
+
+        pending = connection.__dict__['pending_ats_scores'] = (pending_ids, callback)
+        connection.on_commit(callback)
+    pending[0].update(ids)
@@ -0,0 +1,137 @@
+# authentication.py
+# simplejwt's JWTAuthentication with an async path. The token is decoded and
+# checked the same way; aauthenticate() only loads the user with the async
+# ORM, so the async views (see asyncviews.py) do not block on it.
+# CachedJWTAuthentication, the one in DEFAULT_AUTHENTICATION_CLASSES, also
+# keeps the users in the cache rather than loading them on every request.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import is_shared
+
+# What check_user(), the permissions and the analytics (date_joined) read,
+# the async views included, which cannot load fields later. The other
+# fields, password hash included, are deferred and loaded on first use.
+CACHED_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser', 'date_joined')
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        return self.check_user(self.load_user(self.get_user_id(validated_token)), validated_token)
+
+    async def aget_user(self, validated_token):
+        return self.check_user(await self.aload_user(self.get_user_id(validated_token)), validated_token)
+
+    def load_user(self, user_id):
+        try:
+            return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+    async def aload_user(self, user_id):
+        try:
+            return await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def check_user(self, user, validated_token):
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != self.get_password_hash(user):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+    def get_password_hash(self, user):
+        return get_md5_hash_password(user.password)
+
+
+def user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_user_on_commit(user_id):
+    # Deleted once the change is visible, or a concurrent request could
+    # cache the row as it was until the entry expires
+    transaction.on_commit(lambda: cache.delete(user_key(user_id)))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Keeps the fields of each token's user that the checks read in the cache,
+    by user id, and rebuilds the user from them with every other field
+    deferred: the password hash is never cached, and the user can still be
+    saved and its password checked. Saving or deleting the user drops the
+    entry (see signals.py), which covers password changes, deactivation and
+    djoser's updates; changes made with queryset.update() show once the
+    entry expires. The checks of check_user() run on every request, cached
+    or not. The entry is dropped from the cache of the process that saved
+    the user only, so without a shared cache (see is_shared()) it is kept
+    for AUTH_USER_LOCAL_CACHE_TIMEOUT seconds, which bounds how long a
+    change made through another machine goes unseen.
+    """
+
+    def get_timeout(self):
+        if is_shared():
+            return settings.AUTH_USER_CACHE_TIMEOUT
+        return settings.AUTH_USER_LOCAL_CACHE_TIMEOUT
+
+    def to_cached(self, user):
+        cached = {name: getattr(user, name) for name in CACHED_USER_FIELDS}
+        if api_settings.CHECK_REVOKE_TOKEN:
+            cached['password_hash'] = super().get_password_hash(user)
+        return cached
+
+    def from_cached(self, cached):
+        # from_db() takes the values in the order of the model's fields
+        names = [field.attname for field in self.user_model._meta.concrete_fields if field.attname in CACHED_USER_FIELDS]
+        user = self.user_model.from_db(self.user_model.objects.db, names, [cached[name] for name in names])
+        user.cached_password_hash = cached.get('password_hash')
+        return user
+
+    def get_password_hash(self, user):
+        cached = getattr(user, 'cached_password_hash', None)
+        return cached if cached is not None else super().get_password_hash(user)
+
+    def load_user(self, user_id):
+        timeout = self.get_timeout()
+        cached = cache.get(user_key(user_id)) if timeout else None
+        if cached is not None:
+            return self.from_cached(cached)
+        user = super().load_user(user_id)
+        if timeout:
+            cache.set(user_key(user_id), self.to_cached(user), timeout)
+        return user
+
+    async def aload_user(self, user_id):
+        timeout = self.get_timeout()
+        cached = await cache.aget(user_key(user_id)) if timeout else None
+        if cached is not None:
+            return self.from_cached(cached)
+        user = await super().aload_user(user_id)
+        if timeout:
+            await cache.aset(user_key(user_id), self.to_cached(user), timeout)
+        return user
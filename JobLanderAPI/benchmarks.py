@@ -0,0 +1,488 @@
+# benchmarks.py
+# Scenarios for `manage.py benchmark`. Each one seeds its own rows inside a
+# transaction that the command rolls back, so it can run against any database.
+from contextlib import contextmanager
+import csv
+from datetime import date, datetime, timedelta, timezone
+import io
+import json
+import statistics
+import time
+import tracemalloc
+import uuid
+import zlib
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from docx import Document
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt import tokens as simplejwt_tokens
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import ats, blobs
+from .authentication import CachedJWTAuthentication, JWTAuthentication, user_key
+from .models import CV, Application, ApplicationStatus, Company, CVBlob, Question, Stage
+from .cache import invalidate
+from .rollups import rebuild_rollups
+from .search import rebuild_index
+from .tokens import RefreshToken, blacklist_filter
+
+SCENARIOS = {}
+
+def scenario(name, default_rows):
+    def register(func):
+        func.default_rows = default_rows
+        SCENARIOS[name] = func
+        return func
+    return register
+
+@contextmanager
+def unthrottled():
+    rates = SimpleRateThrottle.THROTTLE_RATES
+    SimpleRateThrottle.THROTTLE_RATES = {scope: None for scope in rates}
+    try:
+        yield
+    finally:
+        SimpleRateThrottle.THROTTLE_RATES = rates
+
+def make_client(user):
+    client = APIClient(SERVER_NAME='localhost')
+    client.force_authenticate(user)
+    return client
+
+def make_jwt_client(user):
+    # Authenticates like the frontend does, so every request pays for the JWT decode
+    client = APIClient(SERVER_NAME='localhost')
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    return client
+
+def measure(client, url, repeat, expected_status=200, **headers):
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url, **headers)
+            timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == expected_status, (url, response.status_code)
+    return {'ms': round(statistics.median(timings), 2), 'queries': len(queries)}, response
+
+def seed_user(username='benchmark'):
+    return User.objects.create(username=username, email=f'{username}@example.com')
+
+def seed_applications(user, rows, companies=50):
+    Company.objects.bulk_create(
+        Company(user=user, name=f'Company {i}', location='Remote') for i in range(companies)
+    )
+    company_ids = list(Company.objects.filter(user=user).values_list('id', flat=True))
+    stages = [tag.name for tag in Stage]
+    statuses = [tag.name for tag in ApplicationStatus]
+    today = date.today()
+    Application.objects.bulk_create((
+        Application(
+            user=user,
+            company_id=company_ids[i % len(company_ids)],
+            job_title=f'Engineer {i}',
+            job_type='Full-time',
+            description='Python Django REST APIs SQL',
+            stage=stages[i % len(stages)],
+            status=statuses[(i // 3) % len(statuses)],
+            submission_date=today - timedelta(days=i % 730),
+        ) for i in range(rows)
+    ), batch_size=1000)
+    rebuild_rollups(user)
+
+@scenario('pagination', default_rows=5000)
+def pagination(rows, repeat):
+    """Page 1 against page 500 with page-number and cursor pagination."""
+    user = seed_user()
+    seed_applications(user, rows)
+    client = make_client(user)
+    page_size = 10
+    deep_page = max(rows // page_size, 1)
+    results = []
+
+    for page in (1, deep_page):
+        stats, _ = measure(client, f'/api/applications?page_size={page_size}&page={page}', repeat)
+        results.append({'mode': 'page', 'page': page, **stats})
+
+    url = f'/api/applications?page_size={page_size}&cursor='
+    for page in range(1, deep_page + 1):
+        if page in (1, deep_page):
+            stats, response = measure(client, url, repeat)
+            results.append({'mode': 'cursor', 'page': page, **stats})
+        else:
+            response = client.get(url)
+        url = response.json()['next']
+        if url is None:
+            break
+    return results
+
+@scenario('search', default_rows=100000)
+def search(rows, repeat):
+    """?search= on questions with the inverted index against icontains."""
+    user = seed_user()
+    seed_applications(user, max(rows // 20, 1))
+    application_ids = list(Application.objects.filter(user=user).values_list('id', flat=True))
+    words = ['python', 'django', 'salary', 'remote', 'team', 'culture', 'deadline', 'visa', 'stack', 'mentor']
+    Question.objects.bulk_create((
+        Question(
+            user=user,
+            application_id=application_ids[i % len(application_ids)],
+            question=f'Question {i} about {words[i % len(words)]} and {words[(i * 7) % len(words)]} {i % 997}',
+            answer='Answer',
+        ) for i in range(rows)
+    ), batch_size=1000)
+    client = make_client(user)
+    results = []
+    for backend in ('like', 'index'):
+        with override_settings(SEARCH_BACKEND=backend):
+            if backend == 'index':
+                rebuild_index(user)
+            for term in ('visa', 'mentor 42', '4242', 'nomatch'):
+                stats, response = measure(client, f'/api/questions?search={term}&page_size=10', repeat)
+                results.append({'backend': backend, 'search': term, 'count': response.json()['count'], **stats})
+    return results
+
+@scenario('analytics', default_rows=20000)
+def analytics(rows, repeat):
+    """Dashboard analytics endpoints computed (cold) against served from the cache (warm)."""
+    user = seed_user()
+    seed_applications(user, rows)
+    client = make_client(user)
+    results = []
+    for url in ('/api/statistics', '/api/percents', '/api/timeseries?interval=week&points=52&start_date=2024-01-01'):
+        cold = []
+        for _ in range(repeat):
+            invalidate(user.id)
+            stats, _ = measure(client, url, 1)
+            cold.append(stats)
+        results.append({'url': url, 'cache': 'cold', 'ms': statistics.median(stats['ms'] for stats in cold),
+                        'queries': cold[-1]['queries']})
+        stats, _ = measure(client, url, repeat)
+        results.append({'url': url, 'cache': 'warm', **stats})
+    return results
+
+@scenario('dashboard', default_rows=20000)
+def dashboard(rows, repeat):
+    """statistics + percents + timeseries as three requests against one /dashboard request, cold cache."""
+    user = seed_user()
+    seed_applications(user, rows)
+    client = make_jwt_client(user)
+    series = 'interval=month&points=12&start_date=2025-01-01'
+    variants = {
+        'separate': ['/api/statistics', '/api/percents', f'/api/timeseries?{series}'],
+        'dashboard': [f'/api/dashboard?{series}'],
+    }
+    results = []
+    for name, urls in variants.items():
+        timings, queries = [], 0
+        for _ in range(repeat):
+            total = 0
+            for url in urls:
+                invalidate(user.id)
+                stats, _ = measure(client, url, 1)
+                total += stats['ms']
+                queries += stats['queries']
+            timings.append(total)
+        results.append({'variant': name, 'requests': len(urls), 'ms': round(statistics.median(timings), 2),
+                        'queries': queries // repeat})
+    return results
+
+@scenario('sparse', default_rows=2000)
+def sparse(rows, repeat):
+    """Bytes and ms per page with full nesting against ?fields= / ?expand=."""
+    user = seed_user()
+    seed_applications(user, rows)
+    application_ids = list(Application.objects.filter(user=user).values_list('id', flat=True))
+    Question.objects.bulk_create((
+        Question(user=user, application_id=application_ids[i % len(application_ids)], question=f'Question {i}', answer='Answer')
+        for i in range(rows)
+    ), batch_size=1000)
+    client = make_client(user)
+    urls = [
+        '/api/applications?page_size=10',
+        '/api/applications?page_size=10&expand=company',
+        '/api/applications?page_size=10&fields=id,job_title,status,submission_date,company',
+        '/api/questions?page_size=10',
+        '/api/questions?page_size=10&expand=application',
+        '/api/questions?page_size=10&fields=id,question,answer,application',
+    ]
+    results = []
+    for url in urls:
+        stats, response = measure(client, url, repeat)
+        results.append({'url': url, 'bytes': len(response.content), **stats})
+    return results
+
+@scenario('conditional', default_rows=2000)
+def conditional(rows, repeat):
+    """Full page against a 304 revalidation with If-None-Match."""
+    user = seed_user()
+    seed_applications(user, rows)
+    client = make_jwt_client(user)
+    results = []
+    for url in ('/api/applications?page_size=10', '/api/applications?page_size=10&expand=company'):
+        stats, response = measure(client, url, repeat)
+        results.append({'url': url, 'status': 200, 'bytes': len(response.content), **stats})
+        stats, response = measure(client, url, repeat, 304, HTTP_IF_NONE_MATCH=response['ETag'])
+        results.append({'url': url, 'status': 304, 'bytes': len(response.content), **stats})
+    return results
+
+# Peak Python memory allowed while streaming an export, whatever the row count
+EXPORT_MEMORY_CEILING = 32 * 1024 * 1024
+
+@scenario('export', default_rows=1000000)
+def export(rows, repeat):
+    """Streams every application as CSV and NDJSON and checks peak memory stays under a fixed ceiling."""
+    user = seed_user()
+    seed_applications(user, rows)
+    client = make_client(user)
+    results = []
+    for format in ('csv', 'ndjson'):
+        with CaptureQueriesContext(connection) as queries:
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = client.get(f'/api/export/applications?format={format}')
+            lines = size = 0
+            for chunk in response.streaming_content:
+                lines += chunk.count(b'\n')
+                size += len(chunk)
+            elapsed = (time.perf_counter() - start) * 1000
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        assert response.status_code == 200, response.status_code
+        assert peak < EXPORT_MEMORY_CEILING, (format, peak)
+        results.append({'format': format, 'lines': lines, 'mb': round(size / 2**20, 1), 'ms': round(elapsed, 2),
+                        'peak_mb': round(peak / 2**20, 2), 'queries': len(queries)})
+    return results
+
+@scenario('import', default_rows=50000)
+def import_history(rows, repeat):
+    """Uploads an application history file as CSV and NDJSON; companies are resolved by name or created."""
+    stages = [tag.name for tag in Stage]
+    statuses = [tag.name for tag in ApplicationStatus]
+    records = [{
+        'company': f'Company {i % 500}',
+        'company_location': 'Remote',
+        'job_title': f'Engineer {i}',
+        'job_type': 'Full-time',
+        'description': 'Python Django REST APIs SQL',
+        'status': statuses[i % len(statuses)],
+        'stage': stages[i % len(stages)],
+        'submission_date': (date.today() - timedelta(days=i % 730)).isoformat(),
+        'ats_score': i % 101,
+    } for i in range(rows)]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(records[0]))
+    writer.writeheader()
+    writer.writerows(records)
+    files = {
+        'history.csv': buffer.getvalue().encode(),
+        'history.ndjson': ''.join(json.dumps(record) + '\n' for record in records).encode(),
+    }
+    results = []
+    for name, content in files.items():
+        user = seed_user(f'import-{name}')
+        # Half of the companies exist already
+        Company.objects.bulk_create(Company(user=user, name=f'Company {i}', location='Remote') for i in range(0, 500, 2))
+        client = make_client(user)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.post('/api/import/applications', {'file': SimpleUploadedFile(name, content)}, format='multipart')
+            elapsed = (time.perf_counter() - start) * 1000
+        assert response.status_code == 200, response.status_code
+        report = response.json()
+        assert report['created'] == rows and not report['failed'], report['errors'][:5]
+        results.append({'file': name, 'mb': round(len(content) / 2**20, 1), 'created': report['created'],
+                        'companies_created': report['companies_created'], 'ms': round(elapsed, 2),
+                        'queries': len(queries)})
+    return results
+
+SKILLS = ['python', 'django', 'postgresql', 'mysql', 'aws', 'docker', 'kubernetes', 'react', 'typescript', 'redis',
+          'kafka', 'terraform', 'graphql', 'celery', 'linux', 'golang', 'java', 'spark', 'airflow', 'pandas']
+
+def make_pdf(lines):
+    # One page of Helvetica, the way simple PDF writers lay text out
+    content = 'BT /F1 11 Tf 72 760 Td ' + ' '.join(f'({line}) Tj 0 -14 Td' for line in lines) + ' ET'
+    stream = zlib.compress(content.encode())
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream) + stream + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    out, offsets = io.BytesIO(b'%PDF-1.4\n'), []
+    out.seek(0, io.SEEK_END)
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    out.write(b''.join(b'%010d 00000 n \n' % offset for offset in offsets))
+    out.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return out.getvalue()
+
+def make_docx(lines):
+    document = Document()
+    for line in lines:
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+@scenario('ats', default_rows=20000)
+def ats_scoring(rows, repeat):
+    """Applications scored per second against PDF and DOCX CVs, extracting the CV text (cold) or not (warm), and after a CV is replaced."""
+    user = seed_user()
+    seed_applications(user, rows)
+    storage = blobs.cv_storage()
+    cvs, stored = [], []
+    for i in range(10):
+        lines = [f'Engineer {i}', 'Experience'] + [f'Built services with {SKILLS[(i + j) % len(SKILLS)]} and '
+                                                   f'{SKILLS[(i * 3 + j) % len(SKILLS)]} in production' for j in range(6)]
+        name, content = (f'cv{i}.pdf', make_pdf(lines)) if i % 2 else (f'cv{i}.docx', make_docx(lines))
+        new = not storage.exists(blobs.blob_name(ContentFile(content), name))
+        cv = CV(user=user)
+        cv.cv.save(name, ContentFile(content))
+        cvs.append(cv)
+        if new:
+            stored.append(cv.cv.name)
+    try:
+        applications = list(Application.objects.filter(user=user).values_list('id', flat=True))
+        for i, pk in enumerate(applications):
+            skills = ', '.join(SKILLS[(i * 7 + j) % len(SKILLS)] for j in range(6))
+            Application.objects.filter(pk=pk).update(
+                submitted_cv=cvs[i % len(cvs)],
+                description=f'We are hiring a backend engineer. You will design APIs using {skills}. '
+                            f'Experience with cloud infrastructure, testing and code review is expected.',
+            )
+        results = []
+        for cache_state in ('cold', 'warm'):
+            timings, queries = [], 0
+            for _ in range(repeat):
+                Application.objects.filter(user=user).update(ats_score=0)
+                if cache_state == 'cold':
+                    CVBlob.objects.filter(name__in=[cv.cv.name for cv in cvs]).update(text=None)
+                    ats.cv_terms.cache_clear()
+                executed = []
+                # Counted without the query log, which keeps only the last 9000
+                with connection.execute_wrapper(lambda execute, *args: executed.append(1) or execute(*args)):
+                    start = time.perf_counter()
+                    ats.score_applications(applications)
+                    timings.append(time.perf_counter() - start)
+                queries = len(executed)
+            elapsed = statistics.median(timings)
+            results.append({'cv_text': cache_state, 'applications': len(applications), 'ms': round(elapsed * 1000, 2),
+                            'per_sec': round(len(applications) / elapsed), 'queries': queries})
+        # Replacing a CV rescores every application submitted with it in one pass
+        replaced = cvs[0]
+        content = make_docx(['Engineer', 'Experience'] + [f'Built services with {skill}' for skill in SKILLS[::2]])
+        new = not storage.exists(blobs.blob_name(ContentFile(content), 'replaced.docx'))
+        replaced.cv.save('replaced.docx', ContentFile(content))
+        if new:
+            stored.append(replaced.cv.name)
+        executed = []
+        with connection.execute_wrapper(lambda execute, *args: executed.append(1) or execute(*args)):
+            start = time.perf_counter()
+            ats.rescore_cv(replaced.pk)
+            elapsed = time.perf_counter() - start
+        count = Application.objects.filter(submitted_cv=replaced).count()
+        results.append({'cv_text': 'replaced', 'applications': count, 'ms': round(elapsed * 1000, 2),
+                        'per_sec': round(count / elapsed), 'queries': len(executed)})
+        scores = list(Application.objects.filter(user=user).values_list('ats_score', flat=True))
+        assert all(0 < score <= 100 for score in scores), (min(scores), max(scores))
+        results.append({'min_score': min(scores), 'median_score': statistics.median(scores), 'max_score': max(scores)})
+        return results
+    finally:
+        # Files outlive the rolled back rows
+        for name in stored:
+            storage.delete(name)
+
+@scenario('auth', default_rows=1000)
+def auth(rows, repeat):
+    """A JWT's user loaded from the database on every request against kept in the cache; rows is authentications per run."""
+    user = seed_user()
+    request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    results = []
+    try:
+        for authenticator in (JWTAuthentication(), CachedJWTAuthentication()):
+            cache.delete(user_key(user.pk))
+            authenticator.authenticate(request)
+            timings = []
+            for _ in range(repeat):
+                executed = []
+                with connection.execute_wrapper(lambda execute, *args: executed.append(1) or execute(*args)):
+                    start = time.perf_counter()
+                    for _ in range(rows):
+                        authenticator.authenticate(request)
+                    timings.append(time.perf_counter() - start)
+            results.append({'authentication': type(authenticator).__name__,
+                            'us_per_request': round(statistics.median(timings) / rows * 1e6, 1),
+                            'queries_per_request': len(executed) / rows})
+
+        # Whole requests; "cold" drops the cached user first, like the first request after it expires
+        client = make_jwt_client(user)
+        url = '/api/users/me/'
+        timings = []
+        for _ in range(repeat):
+            cache.delete(user_key(user.pk))
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.status_code
+        results.append({'url': url, 'user': 'cold', 'ms': round(statistics.median(timings), 2), 'queries': len(queries)})
+        stats, _ = measure(client, url, repeat)
+        results.append({'url': url, 'user': 'cached', **stats})
+        return results
+    finally:
+        # The cache outlives the rolled back user, whose id may be reused
+        cache.delete(user_key(user.pk))
+
+@scenario('tokens', default_rows=100000)
+def token_blacklist(rows, repeat):
+    """Blacklist check of a valid refresh token with simplejwt's lookup against the Bloom filter, and whole refreshes."""
+    user = seed_user()
+    expires = datetime.now(timezone.utc) + timedelta(days=1)
+    OutstandingToken.objects.bulk_create((
+        OutstandingToken(user=user, jti=uuid.uuid4().hex, token='', expires_at=expires) for _ in range(rows)
+    ), batch_size=5000)
+    BlacklistedToken.objects.bulk_create((
+        BlacklistedToken(token_id=pk) for pk in OutstandingToken.objects.filter(user=user).values_list('pk', flat=True)
+    ), batch_size=5000)
+    # Rows added in this transaction never commit, so the filter is rebuilt rather than told
+    blacklist_filter.bloom = None
+    raw = str(RefreshToken.for_user(user))
+    results = []
+    for token_class in (simplejwt_tokens.RefreshToken, RefreshToken):
+        token = token_class(raw)
+        token.check_blacklist()
+        timings = []
+        for _ in range(repeat):
+            executed = []
+            with connection.execute_wrapper(lambda execute, *args: executed.append(1) or execute(*args)):
+                start = time.perf_counter()
+                for _ in range(100):
+                    token.check_blacklist()
+                timings.append(time.perf_counter() - start)
+        results.append({'check': f'{token_class.__module__}.RefreshToken', 'blacklisted': rows,
+                        'us': round(statistics.median(timings) / 100 * 1e6, 1), 'queries': len(executed) / 100})
+
+    client = APIClient(SERVER_NAME='localhost')
+    timings, queries = [], 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.post('/api/token/refresh/', {'refresh': raw}, format='json')
+            timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.status_code
+        raw, queries = response.data['refresh'], len(captured)
+    results.append({'url': '/api/token/refresh/', 'ms': round(statistics.median(timings), 2), 'queries': queries})
+    return results
@@ -0,0 +1,191 @@
+# blobs.py
+# Content addressed CV storage. A CV file is stored once as cvs/<sha256><ext>
+# and shared by every CV row with the same content; CVBlob.refs counts those
+# rows and the file is deleted after the last one goes. Uploads to the CV
+# views are hashed while they stream to a temporary file next to the final
+# location, so storing them is a rename, not a copy.
+import hashlib
+import os
+import tempfile
+import time
+
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile
+
+from . import tasks
+
+CV_DIR = 'cvs'
+INCOMING_DIR = 'cvs/incoming'
+MAX_EXTENSION_LENGTH = 10
+
+
+def cv_storage():
+    from .models import CV
+    return CV._meta.get_field('cv').storage
+
+
+def incoming_path():
+    """Local directory for uploads in progress, None when the storage has no local paths."""
+    try:
+        path = cv_storage().path(INCOMING_DIR)
+    except NotImplementedError:
+        return None
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def extension(name):
+    ext = os.path.splitext(name or '')[1].lower()
+    return ext if 1 < len(ext) <= MAX_EXTENSION_LENGTH and ext[1:].isalnum() else ''
+
+
+def file_sha256(content):
+    sha256 = getattr(content, 'sha256', None)
+    if sha256 is None:
+        hasher = hashlib.sha256()
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        sha256 = hasher.hexdigest()
+        content.seek(0)
+    return sha256
+
+
+def blob_name(content, original_name):
+    return f'{CV_DIR}/{file_sha256(content)}{extension(original_name)}'
+
+
+def refresh(storage, name):
+    """
+    True when the file is stored. Its mtime is bumped, so a deferred delete or
+    the GC that was about to remove it as unreferenced leaves it alone.
+    """
+    try:
+        os.utime(storage.path(name))
+        return True
+    except FileNotFoundError:
+        return False
+    except NotImplementedError:
+        return storage.exists(name)
+
+
+def modified_at(storage, name):
+    try:
+        return storage.get_modified_time(name).timestamp()
+    except FileNotFoundError:
+        return None
+
+
+def store(content, original_name):
+    """
+    Write `content` under its hash unless it is stored already. Returns the
+    blob name. An upload of the same content can store the file between the
+    check and the write, in which case the storage saves this copy under
+    another name and the copy is deleted again.
+    """
+    name = blob_name(content, original_name)
+    storage = cv_storage()
+    if refresh(storage, name):
+        return name
+    stored = storage.save(name, content)
+    if stored != name:
+        if not refresh(storage, name):
+            # Not a concurrent upload: the storage changed the name itself
+            return stored
+        storage.delete(stored)
+    return name
+
+
+def add_ref(name):
+    from .models import CVBlob
+    if CVBlob.objects.filter(name=name).update(refs=F('refs') + 1):
+        return
+    try:
+        with transaction.atomic():
+            CVBlob.objects.create(name=name, size=cv_storage().size(name), refs=1)
+    except IntegrityError:
+        # Another upload of the same content created it in the meantime
+        CVBlob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release(name):
+    """Drop a reference; once nothing references the file a task deletes it after commit."""
+    from .models import CVBlob
+    CVBlob.objects.filter(name=name).update(refs=F('refs') - 1)
+    if CVBlob.objects.filter(name=name, refs__lte=0).delete()[0]:
+        tasks.enqueue(delete_unreferenced, name, time.time())
+
+
+@tasks.task
+def delete_unreferenced(name, released_at):
+    from .models import CVBlob
+    storage = cv_storage()
+    # An upload of the same content may have stored or referenced it again since
+    if CVBlob.objects.filter(name=name).exists():
+        return
+    modified = modified_at(storage, name)
+    if modified is not None and modified < released_at:
+        storage.delete(name)
+
+
+class BlobFieldFile(FieldFile):
+    # FileField.pre_save() and cv.save(name, content) both store through here;
+    # CV.save() takes the reference
+
+    def save(self, name, content, save=True):
+        self.name = store(content, name)
+        setattr(self.instance, self.field.attname, self.name)
+        self._committed = True
+        if save:
+            self.instance.save()
+
+
+class BlobFileField(models.FileField):
+    attr_class = BlobFieldFile
+
+
+class HashedUploadedFile(TemporaryUploadedFile):
+    """A TemporaryUploadedFile in `directory`, carrying the sha256 of its content."""
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None, directory=None):
+        file = tempfile.NamedTemporaryFile(suffix='.upload' + extension(name), dir=directory)
+        UploadedFile.__init__(self, file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = None
+
+
+class HashingFileUploadHandler(FileUploadHandler):
+    """
+    Streams every uploaded file to disk next to the CV storage and hashes it on
+    the way, so the file is neither held in memory nor read again to be hashed
+    or copied into place.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = HashedUploadedFile(self.file_name, self.content_type, 0, self.charset,
+                                       self.content_type_extra, incoming_path())
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hasher.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+class HashedUploadViewMixin:
+    # Must be set before DRF parses the body
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [HashingFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
@@ -0,0 +1,247 @@
+# bulk.py
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from rest_framework import generics, serializers, status
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .signals import bulk_saved
+from .validators import load_objects, owned_queryset, unique_field_sets, unique_violation_as
+
+BULK_MAX_ITEMS = 1000
+BULK_BATCH_SIZE = 500
+
+
+def bulk_insert(model, objs):
+    # One INSERT per batch on every backend, then one bulk_saved for the
+    # search index, rollups and caches. bulk_create() only sets primary keys
+    # where a multi-row INSERT returns rows (SQLite, MariaDB, PostgreSQL); on
+    # MySQL they are read back, as in seeding.inserted_ids().
+    with transaction.atomic():
+        last = None
+        if not connection.features.can_return_rows_from_bulk_insert:
+            last = model._base_manager.aggregate(last=Max('pk'))['last'] or 0
+        objs = model.objects.bulk_create(objs, batch_size=BULK_BATCH_SIZE)
+        if last is not None:
+            set_inserted_ids(model, objs, last)
+        bulk_saved.send(sender=model, instances=objs, created=True)
+    return objs
+
+
+def set_inserted_ids(model, objs, last):
+    # The rows of an INSERT get increasing ids in the order of objs, above
+    # the highest id before it. Rows other transactions committed meanwhile
+    # are told apart by their values.
+    ids = list(model._base_manager.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True))
+    if len(ids) != len(objs):
+        fields = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+        by_values = {}
+        for pk, *values in model._base_manager.filter(pk__in=ids).order_by('pk').values_list('pk', *fields):
+            by_values.setdefault(tuple(values), []).append(pk)
+        ids = [by_values[tuple(getattr(obj, name) for name in fields)].pop(0) for obj in objs]
+    for obj, pk in zip(objs, ids):
+        obj.pk = pk
+
+
+def set_many_to_many(model, field_name, links, replace=False):
+    # links maps an instance pk to the list of related pks
+    field = model._meta.get_field(field_name)
+    through = field.remote_field.through
+    source, target = field.m2m_field_name() + '_id', field.m2m_reverse_field_name() + '_id'
+    if replace and links:
+        through.objects.filter(**{f'{source}__in': list(links)}).delete()
+    through.objects.bulk_create(
+        [through(**{source: pk, target: related}) for pk, related_pks in links.items() for related in related_pks],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Validates a list payload in one pass: referenced ids are loaded with one
+    query per model and the model's unique constraints are checked once for
+    the whole batch instead of once per item. Errors are reported per item.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.instances_by_id = kwargs.pop('instances_by_id', None)
+        kwargs.setdefault('allow_empty', False)
+        kwargs.setdefault('max_length', BULK_MAX_ITEMS)
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list) or not data or len(data) > self.max_length:
+            return super().to_internal_value(data)
+
+        self.load_owned_objects(data)
+        validated, errors = [], []
+        for item in data:
+            try:
+                validated.append(self.run_child_validation(item))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                validated.append(None)
+                errors.append(exc.detail)
+        self.check_unique_constraints(validated, errors)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def run_child_validation(self, data):
+        if self.instances_by_id is None:
+            self.child.instance = None
+            return super().run_child_validation(data)
+        pk = data.get('id') if isinstance(data, dict) else None
+        if pk not in self.instances_by_id:
+            raise serializers.ValidationError({'id': [f"Object {pk} does not exist"]})
+        self.child.instance = self.instances_by_id[pk]
+        self.child.initial_data = data
+        attrs = super().run_child_validation(data)
+        attrs['id'] = pk
+        return attrs
+
+    def load_owned_objects(self, data):
+        cache = self.context.setdefault('owned_objects', {})
+        for field_name, model in getattr(self.child, 'owned_fields', {}).items():
+            ids = set()
+            for item in data:
+                value = item.get(field_name) if isinstance(item, dict) else None
+                for pk in value if isinstance(value, list) else [value]:
+                    if isinstance(pk, int) and not isinstance(pk, bool):
+                        ids.add(pk)
+            if ids:
+                load_objects(owned_queryset(model), ids, cache)
+
+    def get_key(self, attrs, fields):
+        instance = self.instances_by_id.get(attrs['id']) if self.instances_by_id else None
+        key = []
+        for field in fields:
+            if field in attrs:
+                key.append(attrs[field])
+            elif instance is not None:
+                key.append(getattr(instance, field))
+            else:
+                return None
+        return tuple(key)
+
+    def check_unique_constraints(self, validated, errors):
+        model = self.child.Meta.model
+        message = getattr(self.child, 'unique_error_message', None)
+        for fields in unique_field_sets(model):
+            keys = {}
+            for index, attrs in enumerate(validated):
+                key = attrs is not None and self.get_key(attrs, fields)
+                # NULLs never collide in a unique index
+                if key and None not in key:
+                    keys.setdefault(key, []).append(index)
+            if not keys:
+                continue
+            query = Q()
+            for key in keys:
+                query |= Q(**dict(zip(fields, key)))
+            queryset = model.objects.filter(query)
+            if self.instances_by_id:
+                queryset = queryset.exclude(pk__in=list(self.instances_by_id))
+            taken = set(queryset.values_list(*fields))
+            for key, indexes in keys.items():
+                if key in taken or len(indexes) > 1:
+                    for index in indexes:
+                        errors[index] = {api_settings.NON_FIELD_ERRORS_KEY: [message]}
+
+    def split_many_to_many(self, attrs):
+        model = self.child.Meta.model
+        attrs = dict(attrs)
+        relations = {}
+        for field in model._meta.many_to_many:
+            if field.name in attrs:
+                relations[field.name] = [getattr(obj, 'pk', obj) for obj in attrs.pop(field.name)]
+        return attrs, relations
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        objs, relations = [], []
+        for attrs in validated_data:
+            attrs, related = self.split_many_to_many(attrs)
+            objs.append(model(**attrs))
+            relations.append(related)
+        with unique_violation_as(getattr(self.child, 'unique_error_message', None)):
+            objs = bulk_insert(model, objs)
+            for field in model._meta.many_to_many:
+                links = {obj.pk: related[field.name] for obj, related in zip(objs, relations) if related.get(field.name)}
+                set_many_to_many(model, field.name, links)
+        return objs
+
+    def update(self, instances, validated_data):
+        model = self.child.Meta.model
+        objs, fields, relations, previous = [], set(), {}, {}
+        for attrs in validated_data:
+            attrs, related = self.split_many_to_many(attrs)
+            instance = self.instances_by_id[attrs.pop('id')]
+            previous[instance.pk] = {name: getattr(instance, name) for name in attrs}
+            for name, value in attrs.items():
+                setattr(instance, name, value)
+                fields.add(model._meta.get_field(name).name)
+            objs.append(instance)
+            for name, related_pks in related.items():
+                relations.setdefault(name, {})[instance.pk] = related_pks
+        # bulk_update() skips auto_now fields such as updated_at
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False):
+                for instance in objs:
+                    field.pre_save(instance, add=False)
+                fields.add(field.name)
+        with unique_violation_as(getattr(self.child, 'unique_error_message', None)):
+            if fields:
+                model.objects.bulk_update(objs, list(fields), batch_size=BULK_BATCH_SIZE)
+            for name, links in relations.items():
+                set_many_to_many(model, name, links, replace=True)
+            bulk_saved.send(sender=model, instances=objs, created=False, previous=previous)
+        return objs
+
+
+class BulkAPIView(generics.GenericAPIView):
+    """
+    POST creates, PATCH partially updates (every item carries its "id") and
+    DELETE removes {"ids": [...]}; each call is one request, one throttle hit
+    and one transaction.
+    """
+
+    def get_bulk_serializer(self, data, instances_by_id=None):
+        context = self.get_serializer_context()
+        child = self.get_serializer_class()(context=context)
+        instance = list(instances_by_id.values()) if instances_by_id is not None else None
+        return BulkListSerializer(instance, child=child, data=data, context=context,
+                                  instances_by_id=instances_by_id, partial=instance is not None)
+
+    def get_instances_by_id(self, ids):
+        ids = [pk for pk in ids if isinstance(pk, int) and not isinstance(pk, bool)]
+        return self.get_queryset().in_bulk(ids)
+
+    def bulk_response(self, objs, status_code):
+        # In the order of the payload, which clients match the items by
+        by_id = self.get_queryset().in_bulk([obj.pk for obj in objs])
+        serializer = self.get_serializer([by_id[obj.pk] for obj in objs], many=True)
+        return Response(serializer.data, status=status_code)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_bulk_serializer(request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.bulk_response(serializer.save(), status.HTTP_201_CREATED)
+
+    def patch(self, request, *args, **kwargs):
+        ids = [item.get('id') for item in request.data if isinstance(item, dict)] if isinstance(request.data, list) else []
+        serializer = self.get_bulk_serializer(request.data, self.get_instances_by_id(ids))
+        serializer.is_valid(raise_exception=True)
+        return self.bulk_response(serializer.save(), status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids or len(ids) > BULK_MAX_ITEMS:
+            return Response({'ids': [f"Expected a list of 1 to {BULK_MAX_ITEMS} ids"]}, status=status.HTTP_400_BAD_REQUEST)
+        instances = self.get_instances_by_id(ids)
+        missing = [pk for pk in ids if pk not in instances]
+        if missing:
+            return Response({'ids': [f"Objects {', '.join(map(str, missing))} do not exist"]}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            self.get_queryset().filter(pk__in=list(instances)).delete()
+        return Response({'deleted': list(instances)}, status=status.HTTP_200_OK)
@@ -0,0 +1,190 @@
+# cache.py
+# Per-user version tokens kept in the Django cache. "analytics" changes with
+# the user's applications and keys the cached analytics below; "data"
+# changes with any of the user's rows and backs conditional GETs (see
+# conditional.py). Stale entries are never read again and simply expire.
+# Invalidation only reaches the other processes through a cache they all
+# share; without one the analytics are cached for
+# ANALYTICS_LOCAL_CACHE_TIMEOUT seconds, which bounds how long a write made
+# through another process goes unseen.
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+
+ANALYTICS = 'analytics'
+DATA = 'data'
+ANALYTICS_TIMEOUT = 60 * 60
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+HITS_KEY = 'analytics:hits'
+MISSES_KEY = 'analytics:misses'
+SHARED_BACKENDS = (BaseMemcachedCache, RedisCache, DatabaseCache)
+
+
+def is_shared():
+    """
+    Whether every process on every machine sees the same cache. The file
+    cache is only shared on one machine and the local memory cache within
+    one process; CACHE_SHARED overrides the guess from the backend.
+    """
+    shared = getattr(settings, 'CACHE_SHARED', None)
+    if shared is None:
+        return isinstance(caches['default'], SHARED_BACKENDS)
+    return shared
+
+
+def analytics_timeout():
+    """Seconds to keep analytics for, 0 when they are not cached."""
+    if is_shared():
+        return ANALYTICS_TIMEOUT
+    return settings.ANALYTICS_LOCAL_CACHE_TIMEOUT
+
+
+def version_key(user_id, scope=ANALYTICS):
+    return f'{scope}:version:{user_id}'
+
+
+def get_version(user_id, scope=ANALYTICS):
+    version = cache.get(version_key(user_id, scope))
+    if version is None:
+        # Timestamps rather than counters, so an evicted token is never reused
+        cache.add(version_key(user_id, scope), time.time_ns(), None)
+        version = cache.get(version_key(user_id, scope), time.time_ns())
+    return version
+
+
+async def aget_version(user_id, scope=ANALYTICS):
+    version = await cache.aget(version_key(user_id, scope))
+    if version is None:
+        await cache.aadd(version_key(user_id, scope), time.time_ns(), None)
+        version = await cache.aget(version_key(user_id, scope), time.time_ns())
+    return version
+
+
+def invalidate(user_id, scope=ANALYTICS):
+    cache.set(version_key(user_id, scope), time.time_ns(), None)
+
+
+def invalidate_on_commit(user_id, scope=ANALYTICS):
+    """
+    Bump the version once the transaction commits. Bumping earlier would let
+    a concurrent reader cache the not yet visible state under the new
+    version. Repeated calls in one transaction (bulk deletes send a signal
+    per row) share one callback while it is still registered; a rolled back
+    savepoint drops it, and the next call registers it again.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return invalidate(user_id, scope)
+    pending = connection.__dict__.setdefault('pending_invalidations', {})
+    key = (scope, user_id)
+    if key in pending and any(entry[1] is pending[key] for entry in connection.run_on_commit):
+        return
+
+    def callback():
+        pending.pop(key, None)
+        invalidate(user_id, scope)
+
+    pending[key] = callback
+    connection.on_commit(callback)
+
+
+def increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+async def aincrement(key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, None)
+        await cache.aincr(key)
+
+
+def cache_stats():
+    hits, misses = cache.get(HITS_KEY, 0), cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
+
+
+def analytics_key(user_id, version, name, params):
+    suffix = ':'.join(f'{key}={params[key]}' for key in sorted(params))
+    return f'analytics:{user_id}:{version}:{name}:{suffix}'
+
+
+def cached_analytics(user_id, name, params, compute):
+    """
+    Return compute() for (user, name, params) from the cache. On a miss only
+    one caller computes the value; concurrent callers wait for it up to
+    LOCK_TIMEOUT. Without a shared cache the value is only kept for a few
+    seconds (see analytics_timeout()), as another process could not
+    invalidate it.
+    """
+    timeout = analytics_timeout()
+    if not timeout:
+        return compute()
+    key = analytics_key(user_id, get_version(user_id), name, params)
+    value = cache.get(key)
+    if value is not None:
+        increment(HITS_KEY)
+        return value
+    increment(MISSES_KEY)
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            if cache.get(lock_key) is None:
+                break
+        return compute()
+    try:
+        value = compute()
+        cache.set(key, value, timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+async def acached_analytics(user_id, name, params, compute):
+    """cached_analytics() for async views: compute is a coroutine function and waiting does not block the loop."""
+    timeout = analytics_timeout()
+    if not timeout:
+        return await compute()
+    key = analytics_key(user_id, await aget_version(user_id), name, params)
+    value = await cache.aget(key)
+    if value is not None:
+        await aincrement(HITS_KEY)
+        return value
+    await aincrement(MISSES_KEY)
+
+    lock_key = f'{key}:lock'
+    if not await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            value = await cache.aget(key)
+            if value is not None:
+                return value
+            if await cache.aget(lock_key) is None:
+                break
+        return await compute()
+    try:
+        value = await compute()
+        await cache.aset(key, value, timeout)
+        return value
+    finally:
+        await cache.adelete(lock_key)
@@ -0,0 +1,46 @@
+# checks.py
+# Deployment checks, run by `manage.py check --deploy` before every release
+# (see fly.toml and build.sh), and database checks, run by `migrate`.
+from django.apps import apps
+from django.core.checks import Error, Tags, Warning, register
+from django.db import connections
+from django.db.models import UniqueConstraint
+
+from .cache import is_shared
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if is_shared():
+        return []
+    return [Warning(
+        'The default cache is not shared by all processes and machines, so '
+        'analytics are only cached for ANALYTICS_LOCAL_CACHE_TIMEOUT seconds '
+        'and may miss writes made through other processes for that long.',
+        hint='Set CACHE_URL to a Redis ("redis://..."), Memcached or database '
+             '("dbcache://...") URL, or set CACHE_SHARED=True if the backend is shared.',
+        id='JobLanderAPI.W001',
+    )]
+
+
+@register(Tags.database)
+def check_expression_indexes(app_configs, databases=None, **kwargs):
+    # The serializers leave uniqueness to the constraints (see
+    # validators.UniqueConstraintMixin). Django skips the ones on expressions
+    # where the database cannot index them (MySQL before 8.0.13, MariaDB) with
+    # warning models.W044, so duplicates would be written without an error.
+    errors = []
+    for alias in databases or []:
+        if connections[alias].features.supports_expression_indexes:
+            continue
+        for model in apps.get_app_config('JobLanderAPI').get_models():
+            for constraint in model._meta.constraints:
+                if isinstance(constraint, UniqueConstraint) and constraint.expressions:
+                    errors.append(Error(
+                        f'{connections[alias].display_name} does not support the unique constraint '
+                        f'{constraint.name}, which is all that keeps {model._meta.verbose_name_plural} unique.',
+                        hint='Use MySQL 8.0.13 or later, or PostgreSQL.',
+                        obj=model,
+                        id='JobLanderAPI.E002',
+                    ))
+    return errors
@@ -0,0 +1,109 @@
+# conditional.py
+# ETag / Last-Modified revalidation for the generic views. Both validators
+# derive from the user's "data" version (see cache.py), which changes after
+# every committed write to the user's rows, so a revalidation costs one
+# cache read and no query or serialization. A write on another machine only
+# changes the version in a shared cache, so without one (see is_shared())
+# the ETag derives from the user's rows instead: the latest updated_at and
+# the row count of every model the responses embed, read in one query.
+# Deletes do not show in the times, so those responses carry no
+# Last-Modified.
+from hashlib import md5
+import time
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import DATA, aget_version, get_version, is_shared
+from .models import CV, Application, Company, CompanyQuestions, Employee, Question, TodoList
+from .search import OWNER_PATHS
+
+NANOSECONDS = 10 ** 9
+# (model, path to the owner, field growing with every write)
+DATA_SOURCES = [
+    (model, OWNER_PATHS.get(model._meta.model_name, 'user_id'), 'updated_at')
+    for model in (CV, Company, CompanyQuestions, Employee, Question, Application, TodoList)
+] + [(Application.contacted_employees.through, 'application__user_id', 'pk')]
+
+
+def parse_etags(header):
+    return {etag.strip().removeprefix('W/') for etag in header.split(',') if etag.strip()}
+
+
+def data_state(user_id):
+    """The latest change and row count of each of DATA_SOURCES for the user."""
+    annotations = {}
+    for index, (model, owner, field) in enumerate(DATA_SOURCES):
+        rows = model.objects.filter(**{owner: OuterRef('pk')}).order_by().values(owner)
+        annotations[f'last_{index}'] = Subquery(rows.annotate(value=Max(field)).values('value'))
+        annotations[f'count_{index}'] = Subquery(rows.annotate(value=Count('pk')).values('value'))
+    return User.objects.filter(pk=user_id).annotate(**annotations).values_list(*annotations)
+
+
+class ConditionalGetMixin:
+
+    def get(self, request, *args, **kwargs):
+        if is_shared():
+            version = get_version(request.user.id, DATA)
+        else:
+            version = data_state(request.user.id).first()
+        etag, last_modified = self.get_validators(request, version)
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super().get(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
+
+    def get_validators(self, request, version):
+        # Only cache versions date the deletes too
+        last_modified = self.get_last_modified(version) if isinstance(version, int) else None
+        return self.get_etag(request, version), last_modified
+
+    def add_validators(self, response, etag, last_modified):
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = f'W/{etag}'
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Browsers keep the response but revalidate it on every use
+            response['Cache-Control'] = 'private, no-cache'
+            response['Vary'] = 'Accept, Authorization, Cookie'
+        return response
+
+    def get_etag(self, request, version):
+        # The URL covers the page, filters, ?fields= and the host used in links
+        key = f'{request.user.id}:{version}:{request.build_absolute_uri()}:{request.accepted_media_type}'
+        return f'"{md5(key.encode()).hexdigest()}"'
+
+    def get_last_modified(self, version):
+        # HTTP dates have one second resolution. The header is only sent once
+        # the version's second is over: any later write then falls into a
+        # later second and If-Modified-Since cannot hide it.
+        seconds = version // NANOSECONDS
+        return seconds if time.time() >= seconds + 1 else None
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return last_modified is not None and if_modified_since is not None and last_modified <= if_modified_since
+
+
+class AsyncConditionalGetMixin(ConditionalGetMixin):
+    """ConditionalGetMixin for the async list views (see asyncviews.py)."""
+
+    async def get(self, request, *args, **kwargs):
+        if is_shared():
+            version = await aget_version(request.user.id, DATA)
+        else:
+            version = await data_state(request.user.id).afirst()
+        etag, last_modified = self.get_validators(request, version)
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = await self.alist(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
@@ -0,0 +1,80 @@
+# cvtext.py
+# Plain text of uploaded CV files, for ATS scoring (see ats.py). PDFs are
+# read with pypdf, which also copes with object streams, broken cross
+# reference tables and files encrypted with an empty user password, and
+# DOCX files with python-docx. Layout is not kept; the text is only ever
+# split into words. Files that cannot be read raise UnreadableFile.
+import zipfile
+import zlib
+
+from docx import Document
+from docx.opc.exceptions import OpcError
+from docx.oxml.ns import qn
+from docx.parts.hdrftr import FooterPart, HeaderPart
+from lxml.etree import XMLSyntaxError
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+# Extracted text beyond this is dropped; no CV needs more to be scored
+MAX_TEXT_LENGTH = 200 * 1024
+# Uncompressed size allowed for any one part of a DOCX file
+MAX_PART_SIZE = 32 * 1024 * 1024
+# What the parsers raise on malformed files, besides their own errors
+PARSE_ERRORS = (PyPdfError, OpcError, XMLSyntaxError, zipfile.BadZipFile, zlib.error,
+                KeyError, IndexError, TypeError, ValueError, AttributeError, RecursionError)
+
+
+class UnreadableFile(ValueError):
+    pass
+
+
+def extract_text(fileobj, name=''):
+    """The text of a CV file. Raises UnreadableFile for broken files and formats that cannot be read."""
+    head = fileobj.read(5)
+    fileobj.seek(0)
+    name = name.lower()
+    try:
+        if head.startswith(b'%PDF-'):
+            text = pdf_text(fileobj)
+        elif head.startswith(b'PK') and not name.endswith(('.odt', '.pages')):
+            text = docx_text(fileobj)
+        elif name.endswith(('.txt', '.md')):
+            text = fileobj.read(MAX_TEXT_LENGTH * 4).decode('utf-8', 'replace')
+        else:
+            raise UnreadableFile('Unsupported file format')
+    except PARSE_ERRORS as exc:
+        if isinstance(exc, UnreadableFile):
+            raise
+        raise UnreadableFile(f'{type(exc).__name__}: {exc}') from exc
+    return text[:MAX_TEXT_LENGTH]
+
+
+def pdf_text(fileobj):
+    reader = PdfReader(fileobj, strict=False)
+    if reader.is_encrypted and not reader.decrypt(''):
+        raise UnreadableFile('The PDF is protected by a password')
+    texts, length = [], 0
+    for page in reader.pages:
+        text = page.extract_text() or ''
+        texts.append(text)
+        length += len(text)
+        if length > MAX_TEXT_LENGTH:
+            break
+    return '\n'.join(texts)
+
+
+def docx_text(fileobj):
+    # python-docx reads whole parts into memory, so their size is checked first
+    with zipfile.ZipFile(fileobj) as archive:
+        if any(info.file_size > MAX_PART_SIZE for info in archive.infolist()):
+            raise UnreadableFile('A part of the DOCX file is too large')
+    fileobj.seek(0)
+    document = Document(fileobj)
+    headers = [part.element for part in document.part.package.iter_parts() if isinstance(part, (HeaderPart, FooterPart))]
+    elements = [*headers, document.element.body]
+    # Paragraphs of tables and text boxes are included
+    return '\n'.join(
+        ''.join(text.text or '' for text in paragraph.iter(qn('w:t')))
+        for element in elements
+        for paragraph in element.iter(qn('w:p'))
+    )
@@ -0,0 +1,73 @@
+# emails.py
+# djoser's emails, sent by a task rather than during the request (see
+# DJOSER["EMAIL"] in settings). They are rendered in the request, which knows
+# the site and the user; only the SMTP round trip is queued, and retried.
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from djoser import email
+
+from . import tasks
+
+
+@tasks.task
+def send_email(message):
+    sent = EmailMultiAlternatives(
+        subject=message['subject'],
+        body=message['body'],
+        from_email=message['from_email'],
+        to=message['to'],
+        cc=message['cc'],
+        bcc=message['bcc'],
+        reply_to=message['reply_to'],
+        alternatives=[tuple(alternative) for alternative in message['alternatives']],
+    )
+    sent.content_subtype = message['content_subtype']
+    sent.send()
+
+
+class QueuedEmailMixin:
+    def send(self, to, *args, **kwargs):
+        # Fills in the message like BaseEmailMessage.send(), then queues it
+        self.render()
+        self.to = to
+        self.cc = kwargs.pop('cc', [])
+        self.bcc = kwargs.pop('bcc', [])
+        self.reply_to = kwargs.pop('reply_to', [])
+        self.from_email = kwargs.pop('from_email', settings.DEFAULT_FROM_EMAIL)
+        if not self.recipients():
+            return
+        tasks.enqueue(send_email, {
+            'subject': self.subject,
+            'body': self.body,
+            'content_subtype': self.content_subtype,
+            'alternatives': [list(alternative) for alternative in self.alternatives],
+            'from_email': self.from_email,
+            'to': list(self.to),
+            'cc': list(self.cc),
+            'bcc': list(self.bcc),
+            'reply_to': list(self.reply_to),
+        })
+
+
+class ActivationEmail(QueuedEmailMixin, email.ActivationEmail):
+    pass
+
+
+class ConfirmationEmail(QueuedEmailMixin, email.ConfirmationEmail):
+    pass
+
+
+class PasswordResetEmail(QueuedEmailMixin, email.PasswordResetEmail):
+    pass
+
+
+class PasswordChangedConfirmationEmail(QueuedEmailMixin, email.PasswordChangedConfirmationEmail):
+    pass
+
+
+class UsernameChangedConfirmationEmail(QueuedEmailMixin, email.UsernameChangedConfirmationEmail):
+    pass
+
+
+class UsernameResetEmail(QueuedEmailMixin, email.UsernameResetEmail):
+    pass
@@ -0,0 +1,159 @@
+# exports.py
+# Streaming CSV / NDJSON exports of a user's rows. Rows are read in keyset
+# chunks by primary key (each chunk one joined values_list query), so memory
+# stays flat however many rows the user has. A plain .iterator() would not
+# be enough: mysqlclient loads the whole result set into memory.
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+from .models import Application, Company, Employee, Question
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class CSVRenderer(BaseRenderer):
+    # Exports stream their own content; see ExportView.handle_exception for errors
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b''
+
+
+class NDJSONRenderer(CSVRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class Echo:
+    # csv.writer needs a file; this one hands the formatted line back
+    def write(self, value):
+        return value
+
+
+class Export:
+    model = None
+    # (header, ORM path) pairs
+    columns = []
+
+    def get_queryset(self, user):
+        return self.model.objects.filter(user=user)
+
+    def iter_chunks(self, user, chunk_size=EXPORT_CHUNK_SIZE):
+        queryset = self.get_queryset(user).order_by('pk').values_list('pk', *[path for _, path in self.columns])
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                return
+            last_pk = chunk[-1][0]
+            yield [row[1:] for row in self.add_related(chunk)]
+            if len(chunk) < chunk_size:
+                return
+
+    def add_related(self, chunk):
+        return chunk
+
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def iter_csv(self, user):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.headers())
+        for chunk in self.iter_chunks(user):
+            yield ''.join(writer.writerow(row) for row in chunk)
+
+    def iter_ndjson(self, user):
+        headers = self.headers()
+        for chunk in self.iter_chunks(user):
+            yield ''.join(json.dumps(dict(zip(headers, row)), default=str) + '\n' for row in chunk)
+
+    def stream(self, user, format, filename):
+        content = self.iter_csv(user) if format == 'csv' else self.iter_ndjson(user)
+        response = StreamingHttpResponse(
+            content, content_type='text/csv' if format == 'csv' else 'application/x-ndjson',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{format}"'
+        return response
+
+
+class ApplicationExport(Export):
+    model = Application
+    columns = [
+        ('id', 'id'),
+        ('company', 'company__name'),
+        ('job_title', 'job_title'),
+        ('job_type', 'job_type'),
+        ('link', 'link'),
+        ('submission_date', 'submission_date'),
+        ('status', 'status'),
+        ('stage', 'stage'),
+        ('ats_score', 'ats_score'),
+        ('description', 'description'),
+        ('submitted_cv', 'submitted_cv__cv'),
+        ('updated_at', 'updated_at'),
+    ]
+
+    def headers(self):
+        return super().headers() + ['contacted_employees']
+
+    def add_related(self, chunk):
+        # One query per chunk for the many-to-many names
+        through = Application.contacted_employees.through
+        names = {}
+        for application_id, name in through.objects.filter(
+            application_id__in=[row[0] for row in chunk]
+        ).values_list('application_id', 'employee__name').order_by('application_id', 'employee__name'):
+            names.setdefault(application_id, []).append(name)
+        return [row + ('; '.join(names.get(row[0], [])),) for row in chunk]
+
+
+class QuestionExport(Export):
+    model = Question
+    columns = [
+        ('id', 'id'),
+        ('question', 'question'),
+        ('answer', 'answer'),
+        ('application_id', 'application_id'),
+        ('application', 'application__job_title'),
+        ('company', 'application__company__name'),
+        ('updated_at', 'updated_at'),
+    ]
+
+
+class EmployeeExport(Export):
+    model = Employee
+    columns = [
+        ('id', 'id'),
+        ('name', 'name'),
+        ('email', 'email'),
+        ('linkedin_link', 'linkedin_link'),
+        ('job_title', 'job_title'),
+        ('contacted', 'contacted'),
+        ('company', 'company__name'),
+        ('updated_at', 'updated_at'),
+    ]
+
+
+class CompanyExport(Export):
+    model = Company
+    columns = [
+        ('id', 'id'),
+        ('name', 'name'),
+        ('location', 'location'),
+        ('careers_link', 'careers_link'),
+        ('linkedin_link', 'linkedin_link'),
+        ('description', 'description'),
+        ('updated_at', 'updated_at'),
+    ]
+
+
+EXPORTS = {
+    'applications': ApplicationExport,
+    'questions': QuestionExport,
+    'employees': EmployeeExport,
+    'companies': CompanyExport,
+}
@@ -0,0 +1,329 @@
+# imports.py
+# Imports of application history files (the same columns exports.py writes)
+# in CSV, NDJSON or a JSON array. Records are parsed one at a time from the
+# upload and validated and written in batches: company names and contact
+# names are resolved through in-memory maps with one query per batch, rows go
+# through the API serializers and valid rows are written with the bulk
+# serializer, so search, rollups and caches stay in step. Rows that fail are
+# skipped and reported with their 1-based position in the file.
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .bulk import BULK_MAX_ITEMS, BulkListSerializer, bulk_insert
+from .models import Company, Employee
+from .serializers import ApplicationSerializer, CompanySerializer, EmployeeSerializer
+
+IMPORT_BATCH_SIZE = BULK_MAX_ITEMS
+IMPORT_MAX_ERRORS = 1000
+FORMATS = ('csv', 'ndjson', 'json')
+READ_SIZE = 64 * 1024
+# A JSON record that does not parse within this many characters is malformed
+MAX_RECORD_SIZE = 1024 * 1024
+CONTACT_SEPARATOR = ';'
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def detect_format(name, head):
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    if extension in FORMATS:
+        return extension
+    head = head.lstrip()
+    return 'json' if head.startswith('[') else 'ndjson' if head.startswith('{') else 'csv'
+
+
+def iter_csv(stream):
+    reader = csv.DictReader(stream)
+    try:
+        for record in reader:
+            # Empty cells mean "not given", so model defaults apply
+            yield {key: value for key, value in record.items() if key and value not in ('', None)}
+    except csv.Error as exc:
+        raise ImportFormatError(f'Malformed CSV at line {reader.line_num}: {exc}')
+
+
+def iter_ndjson(stream):
+    for line in stream:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                # Reported as an error of this row, the next lines still import
+                yield ImportFormatError(f'Invalid JSON: {exc}')
+
+
+def iter_json_array(stream):
+    decoder = json.JSONDecoder()
+    buffer, position, eof, expect = '', 0, False, '['
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise ImportFormatError('Unexpected end of the JSON array')
+            buffer, position = stream.read(READ_SIZE), 0
+            eof = not buffer
+            continue
+        char = buffer[position]
+        if expect == '[':
+            if char != '[':
+                raise ImportFormatError('Expected a JSON array')
+            position, expect = position + 1, 'value or ]'
+        elif char == ']' and expect != 'value':
+            return
+        elif expect == ', or ]':
+            if char != ',':
+                raise ImportFormatError(f"Expected ',' or ']' in the JSON array, got {char!r}")
+            position, expect = position + 1, 'value'
+        else:
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except ValueError as exc:
+                # Either the record is cut by the read size or it is invalid
+                if eof or len(buffer) - position > MAX_RECORD_SIZE:
+                    raise ImportFormatError(f'Invalid JSON: {exc}')
+                more = stream.read(READ_SIZE)
+                buffer, position, eof = buffer[position:] + more, 0, not more
+                continue
+            yield record
+            expect = ', or ]'
+
+
+def iter_records(fileobj, name='', format=None):
+    """Yield the records of a binary file object one at a time."""
+    stream = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        if format is None:
+            format = detect_format(name, stream.read(1024))
+            stream.seek(0)
+        if format not in FORMATS:
+            raise ImportFormatError(f"Unknown format {format}. Choose from: {', '.join(FORMATS)}")
+        parse = {'csv': iter_csv, 'ndjson': iter_ndjson, 'json': iter_json_array}[format]
+        yield from parse(stream)
+    except UnicodeDecodeError:
+        raise ImportFormatError('The file is not UTF-8 encoded')
+    finally:
+        # Leave the upload open for its owner
+        stream.detach()
+
+
+def request_for(user):
+    # Serializers read the user from context['request']; commands have none
+    request = Request(RequestFactory().post('/'))
+    request.user = user
+    return request
+
+
+class CompanyMap:
+    """Company rows of one user by name, created on first use."""
+
+    def __init__(self, user, owned_objects):
+        self.user = user
+        self.by_name = {}
+        self.created = 0
+        self.owned = owned_objects.setdefault(Company, {})
+
+    def add(self, company):
+        self.by_name[company.name] = company
+        self.owned[company.pk] = company
+
+    def resolve(self, locations):
+        # locations maps every name used by the batch to a location for new rows
+        unknown = [name for name in locations if name not in self.by_name]
+        if not unknown:
+            return
+        existing = {}
+        for company in Company.objects.filter(user=self.user, name__in=unknown).only('id', 'user_id', 'name'):
+            self.add(company)
+            existing[company.name.casefold()] = company
+        new = []
+        for name in unknown:
+            if name in self.by_name:
+                continue
+            # Case-insensitive collations (MySQL) match names the map does not
+            if name.casefold() in existing:
+                self.by_name[name] = existing[name.casefold()]
+            else:
+                new.append(Company(user=self.user, name=name, location=locations[name]))
+        if new:
+            new = bulk_insert(Company, new)
+            for company in new:
+                self.add(company)
+        self.created += len(new)
+
+    def get(self, name):
+        return self.by_name.get(name)
+
+
+class Importer:
+    serializer_class = None
+    # Columns copied as they are to the serializer
+    fields = []
+
+    def __init__(self, request):
+        self.user = request.user
+        self.context = {'request': request, 'owned_objects': {}}
+        self.companies = CompanyMap(self.user, self.context['owned_objects'])
+        self.serializer = BulkListSerializer(child=self.serializer_class(context=self.context), context=self.context)
+
+    def prepare(self, records):
+        """Batch level lookups, run before the records are converted."""
+
+    def to_payload(self, record):
+        payload = {field: record[field] for field in self.fields if field in record}
+        payload['user_id'] = self.user.pk
+        return payload
+
+    def company_id(self, record):
+        name = record.get('company')
+        company = self.companies.get(name) if isinstance(name, str) else None
+        return company.pk if company is not None else None
+
+    def require_company(self, record):
+        company_id = self.company_id(record)
+        if company_id is None:
+            name = record.get('company')
+            max_length = Company._meta.get_field('name').max_length
+            if isinstance(name, str) and len(name) > max_length:
+                message = f'Ensure this field has no more than {max_length} characters.'
+            else:
+                message = 'This field is required.'
+            raise serializers.ValidationError({'company': [message]})
+        return company_id
+
+    def resolve_companies(self, records):
+        locations = {}
+        for record in records:
+            name = record.get('company')
+            if isinstance(name, str) and 0 < len(name) <= Company._meta.get_field('name').max_length:
+                location = record.get('company_location')
+                locations.setdefault(name, location if isinstance(location, str) else '')
+        self.companies.resolve(locations)
+
+    def import_batch(self, batch, report):
+        records = [record for _, record in batch if isinstance(record, dict)]
+        self.prepare(records)
+        rows, validated, errors = [], [], []
+        for row, record in batch:
+            try:
+                if isinstance(record, Exception):
+                    raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [str(record)]})
+                if not isinstance(record, dict):
+                    raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: ['Expected an object']})
+                validated.append(self.serializer.run_child_validation(self.to_payload(record)))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                validated.append(None)
+                errors.append(exc.detail)
+            rows.append(row)
+        self.serializer.check_unique_constraints(validated, errors)
+        valid = [attrs for attrs, error in zip(validated, errors) if not error]
+        if valid:
+            self.serializer.create(valid)
+        report['created'] += len(valid)
+        for row, error in zip(rows, errors):
+            if error:
+                report['failed'] += 1
+                if len(report['errors']) < IMPORT_MAX_ERRORS:
+                    report['errors'].append({'row': row, 'errors': error})
+
+    def run(self, records):
+        """Import every record in one transaction and return the report."""
+        report = {'created': 0, 'failed': 0, 'companies_created': 0, 'errors': []}
+        records = enumerate(records, start=1)
+        with transaction.atomic():
+            while batch := list(islice(records, IMPORT_BATCH_SIZE)):
+                self.import_batch(batch, report)
+        report['companies_created'] = self.companies.created
+        return report
+
+
+class CompanyImporter(Importer):
+    serializer_class = CompanySerializer
+    fields = ['name', 'location', 'careers_link', 'linkedin_link', 'description']
+
+
+class EmployeeImporter(Importer):
+    serializer_class = EmployeeSerializer
+    fields = ['name', 'linkedin_link', 'email', 'job_title', 'contacted']
+
+    def prepare(self, records):
+        self.resolve_companies(records)
+
+    def to_payload(self, record):
+        payload = super().to_payload(record)
+        payload['company_id'] = self.require_company(record)
+        return payload
+
+
+class ApplicationImporter(Importer):
+    serializer_class = ApplicationSerializer
+    fields = ['job_title', 'job_type', 'link', 'submission_date', 'status', 'stage', 'ats_score', 'description']
+
+    def __init__(self, request):
+        super().__init__(request)
+        # (company id, name) -> Employee, None when there is no such contact
+        self.employees = {}
+
+    def contact_names(self, record):
+        names = record.get('contacted_employees') or []
+        if isinstance(names, str):
+            names = names.split(CONTACT_SEPARATOR)
+        return [name.strip() for name in names if isinstance(name, str) and name.strip()]
+
+    def prepare(self, records):
+        self.resolve_companies(records)
+        wanted = {
+            (company_id, name)
+            for record in records
+            if (company_id := self.company_id(record)) is not None
+            for name in self.contact_names(record)
+        } - set(self.employees)
+        if not wanted:
+            return
+        owned = self.context['owned_objects'].setdefault(Employee, {})
+        for employee in Employee.objects.filter(
+            user=self.user,
+            company_id__in={company_id for company_id, _ in wanted},
+            name__in={name for _, name in wanted},
+        ).only('id', 'user_id', 'company_id', 'name'):
+            self.employees[(employee.company_id, employee.name)] = employee
+            owned[employee.pk] = employee
+        for key in wanted:
+            self.employees.setdefault(key, None)
+
+    def to_payload(self, record):
+        payload = super().to_payload(record)
+        payload['company_id'] = company_id = self.require_company(record)
+        contacts, missing = [], []
+        for name in self.contact_names(record):
+            employee = self.employees.get((company_id, name))
+            if employee is None:
+                missing.append(name)
+            else:
+                contacts.append(employee.pk)
+        if missing:
+            raise serializers.ValidationError({'contacted_employees': [
+                f"Employee {', '.join(missing)} does not exist at {record['company']}"
+            ]})
+        payload['contacted_employees'] = contacts
+        return payload
+
+
+IMPORTERS = {
+    'applications': ApplicationImporter,
+    'companies': CompanyImporter,
+    'employees': EmployeeImporter,
+}
@@ -0,0 +1,416 @@
+# loadtest.py
+# HTTP load generation for `manage.py loadtest` and `manage.py
+# benchmark_servers`. Clients are closed loop: each sends its next request as
+# soon as the previous response arrives, over a keep-alive connection when
+# the server allows one (gunicorn sync workers close it after every
+# response). Everything runs on one event loop, so hundreds of clients cost
+# the load generator little. A client is a Session: the token and rows of one
+# seeded user plus what the client created. Each request is a Step, picked
+# by weight from the scenario with a per-client seeded random generator.
+import asyncio
+from contextlib import contextmanager
+from datetime import date, timedelta
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from .models import (Application, ApplicationStatus, Company, CompanyQuestions, ContactStatus, Employee, Question,
+                     Stage, TodoList)
+from .rollups import rebuild_rollups
+from .search import get_search_backend, rebuild_index
+
+PERCENTILES = (50, 95, 99)
+CONNECT_TIMEOUT = 30
+PASSWORD = 'loadtest-password'
+USERNAME_PREFIX = 'loadtest-'
+JOB_TITLES = ['Backend Engineer', 'Frontend Engineer', 'Data Analyst', 'DevOps Engineer', 'Product Manager',
+              'QA Engineer', 'Machine Learning Engineer', 'Mobile Developer']
+SKILLS = ['python', 'django', 'react', 'sql', 'aws', 'docker', 'kubernetes', 'typescript', 'go', 'java']
+
+
+def percentile(ordered, p):
+    """Nearest rank percentile of a sorted list."""
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(timings, errors, elapsed):
+    ordered = sorted(timings)
+    result = {'requests': len(ordered), 'errors': errors, 'rps': round(len(ordered) / elapsed, 1)}
+    for p in PERCENTILES:
+        value = percentile(ordered, p)
+        result[f'p{p}_ms'] = round(value * 1000, 1) if value is not None else None
+    return result
+
+
+class Connection:
+
+    def __init__(self, host, port, headers=None):
+        self.host, self.port = host, port
+        self.headers = {'Host': f'{host}:{port}', **(headers or {})}
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b'', headers=None):
+        """Send a request and return (status, body), reconnecting when the server closed the connection."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f'{method} {path} HTTP/1.1', *(f'{key}: {value}' for key, value in {
+            **self.headers, **(headers or {}), 'Content-Length': len(body)}.items())]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        try:
+            status, response_headers = await self.read_head()
+            if response_headers.get('transfer-encoding') == 'chunked':
+                content = await self.read_chunked()
+            elif 'content-length' in response_headers:
+                content = await self.reader.readexactly(int(response_headers['content-length']))
+            else:
+                content = await self.reader.read()
+                response_headers['connection'] = 'close'
+        except (asyncio.IncompleteReadError, ConnectionError):
+            await self.close()
+            raise
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, content
+
+    async def read_head(self):
+        status_line = await self.reader.readuntil(b'\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        while (line := await self.reader.readuntil(b'\r\n')) != b'\r\n':
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def read_chunked(self):
+        chunks = []
+        while size := int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16):
+            chunks.append(await self.reader.readexactly(size + 2))
+        # Trailers end with an empty line
+        while await self.reader.readuntil(b'\r\n') != b'\r\n':
+            pass
+        return b''.join(chunk[:-2] for chunk in chunks)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+def multipart(fields, files):
+    """(body, content type) of a multipart/form-data request; files maps a field to (file name, bytes)."""
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in fields.items()]
+    for name, (filename, content) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n')
+    return b''.join(parts) + f'--{boundary}--\r\n'.encode(), f'multipart/form-data; boundary={boundary}'
+
+
+class Session:
+    """
+    One client. Path templates are formatted against it: {company} and the
+    like pick a random row of its user, {created_todo} takes the last todo
+    it created.
+    """
+
+    def __init__(self, index, user=None, access=None, seed=0):
+        self.index = index
+        self.user = user or {'id': None, 'username': None, 'ids': {}}
+        self.access = access or self.user.get('access')
+        self.refresh = None
+        self.todos = []
+        self.counter = 0
+        self.rng = random.Random(f'{seed}:{index}')
+
+    def __getitem__(self, key):
+        if key == 'created_todo':
+            return self.todos.pop()
+        return self.rng.choice(self.user['ids'][key])
+
+    def unique(self, prefix):
+        self.counter += 1
+        return f'{prefix} {self.index}-{self.counter}-{uuid.uuid4().hex[:6]}'
+
+
+class Step:
+
+    def __init__(self, name, method, path, weight=1, body=None, expect=200, auth=True, available=None, after=None):
+        self.name, self.method, self.path, self.weight = name, method, path, weight
+        self.body, self.expect, self.auth = body, expect, auth
+        self.available = available or (lambda session: True)
+        self.after = after
+
+    def build(self, session):
+        """(method, path, body bytes, headers) of the next request of the session."""
+        headers = {}
+        if self.auth and session.access:
+            headers['Authorization'] = f'Bearer {session.access}'
+        body = self.body(session) if self.body else None
+        if isinstance(body, tuple):
+            body, headers['Content-Type'] = body
+        elif body is not None:
+            body, headers['Content-Type'] = json.dumps(body).encode(), 'application/json'
+        return self.method, self.path.format_map(session), body or b'', headers
+
+    def done(self, session, status, content):
+        if self.after is not None and status == self.expect:
+            self.after(session, json.loads(content) if content else None)
+
+
+def store_tokens(session, data):
+    session.access, session.refresh = data['access'], data['refresh']
+
+
+def store_refresh(session, data):
+    session.access = data['access']
+    # Rotated: the previous refresh token is blacklisted
+    session.refresh = data.get('refresh', session.refresh)
+
+
+def import_file(session):
+    rows = '\n'.join(f"{session.unique('Imported')},Remote" for _ in range(5))
+    return multipart({}, {'file': ('companies.csv', f'name,location\n{rows}\n'.encode())})
+
+
+READS = [
+    Step('companies', 'GET', '/api/companies', weight=4),
+    Step('single_company', 'GET', '/api/companies/{company}', weight=2),
+    Step('companyquestions', 'GET', '/api/companyquestions', weight=2),
+    Step('single_companyquestion', 'GET', '/api/companyquestions/{companyquestion}'),
+    Step('employees', 'GET', '/api/employees', weight=2),
+    Step('single_employee', 'GET', '/api/employees/{employee}'),
+    Step('applications', 'GET', '/api/applications', weight=10),
+    Step('applications_cursor', 'GET', '/api/applications?cursor=&ordering=-submission_date', weight=4),
+    Step('applications_search', 'GET', '/api/applications?search=engineer', weight=2),
+    Step('single_application', 'GET', '/api/applications/{application}', weight=5),
+    Step('questions', 'GET', '/api/questions', weight=4),
+    Step('single_question', 'GET', '/api/questions/{question}', weight=2),
+    Step('todos', 'GET', '/api/todos', weight=3),
+    Step('single_todo', 'GET', '/api/todos/{todo}'),
+    Step('cv', 'GET', '/api/cvs'),
+    Step('statistics', 'GET', '/api/statistics', weight=3),
+    Step('percents', 'GET', '/api/percents', weight=2),
+    Step('timeseries', 'GET', '/api/timeseries?interval=week&points=12', weight=2),
+    Step('dashboard', 'GET', '/api/dashboard', weight=3),
+    Step('export', 'GET', '/api/export/applications?format=ndjson'),
+    Step('user_me', 'GET', '/api/users/me/'),
+]
+# In the order a client can run them, so that every step finds what it needs
+WRITES = [
+    Step('token_obtain_pair', 'POST', '/api/token/', auth=False, after=store_tokens,
+         body=lambda session: {'username': session.user['username'], 'password': PASSWORD}),
+    Step('token_refresh', 'POST', '/api/token/refresh/', weight=2, auth=False, after=store_refresh,
+         body=lambda session: {'refresh': session.refresh}, available=lambda session: session.refresh is not None),
+    Step('create_company', 'POST', '/api/companies', weight=2, expect=201,
+         body=lambda session: {'user_id': session.user['id'], 'name': session.unique('Company'), 'location': 'Remote'}),
+    Step('bulk_companies', 'POST', '/api/companies/bulk', expect=201,
+         body=lambda session: [{'user_id': session.user['id'], 'name': session.unique('Company'), 'location': 'Remote'}
+                               for _ in range(5)]),
+    Step('update_application', 'PATCH', '/api/applications/{application}', weight=4,
+         body=lambda session: {'status': session.rng.choice(list(ApplicationStatus)).name}),
+    Step('bulk_applications', 'PATCH', '/api/applications/bulk',
+         body=lambda session: [{'id': pk, 'status': session.rng.choice(list(ApplicationStatus)).name}
+                               for pk in set(session['application'] for _ in range(5))]),
+    Step('create_question', 'POST', '/api/questions', weight=2, expect=201,
+         body=lambda session: {'user_id': session.user['id'], 'application_id': session['application'],
+                               'question': session.unique('Question'), 'answer': 'Answer'}),
+    Step('create_todo', 'POST', '/api/todos', weight=2, expect=201,
+         after=lambda session, data: session.todos.append(data['id']),
+         body=lambda session: {'user_id': session.user['id'], 'application_title': session.unique('Todo'),
+                               'application_link': 'https://example.com/jobs/1', 'completed': False}),
+    Step('delete_todo', 'DELETE', '/api/todos/{created_todo}', expect=204,
+         available=lambda session: bool(session.todos)),
+    Step('import_companies', 'POST', '/api/import/companies', body=import_file),
+]
+SCENARIOS = {
+    'read': READS,
+    'write': WRITES,
+    'mixed': READS + WRITES,
+}
+
+
+def seed_users(count, rows, seed=0):
+    """
+    Create `count` users with `rows` applications each, plus companies,
+    employees, questions and todos, and return them as dicts with their row
+    ids. The data only depends on the seed; usernames are unique per run.
+    """
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+    run = uuid.uuid4().hex[:8]
+    today = date.today()
+    users = []
+    for i in range(count):
+        user = User.objects.create(username=f'{USERNAME_PREFIX}{run}-{i}', email=f'loadtest{i}@example.com',
+                                   password=password)
+        companies = max(rows // 10, 1)
+        Company.objects.bulk_create(
+            Company(user=user, name=f'Company {n}', location=rng.choice(['Remote', 'Cairo', 'Berlin', 'London']))
+            for n in range(companies)
+        )
+        company_ids = list(Company.objects.filter(user=user).values_list('id', flat=True))
+        CompanyQuestions.objects.bulk_create(
+            CompanyQuestions(company_id=pk, question=f'Why {pk}?', answer='Answer') for pk in company_ids
+        )
+        Employee.objects.bulk_create(
+            Employee(user=user, company_id=pk, name=f'Employee {pk}-{n}', job_title='Recruiter',
+                     contacted=rng.choice(list(ContactStatus)).name)
+            for pk in company_ids for n in range(2)
+        )
+        Application.objects.bulk_create((
+            Application(
+                user=user,
+                company_id=rng.choice(company_ids),
+                job_title=rng.choice(JOB_TITLES),
+                job_type='Full-time',
+                description=' '.join(rng.sample(SKILLS, 4)),
+                stage=rng.choice(list(Stage)).name,
+                status=rng.choice(list(ApplicationStatus)).name,
+                submission_date=today - timedelta(days=rng.randrange(365)),
+            ) for _ in range(rows)
+        ), batch_size=1000)
+        application_ids = list(Application.objects.filter(user=user).values_list('id', flat=True))
+        Question.objects.bulk_create((
+            Question(user=user, application_id=pk, question=f'Question {pk}', answer='Answer') for pk in application_ids
+        ), batch_size=1000)
+        TodoList.objects.bulk_create(
+            TodoList(user=user, application_title=f'Todo {n}', completed=rng.random() < 0.5)
+            for n in range(max(rows // 10, 1))
+        )
+        rebuild_rollups(user)
+        if get_search_backend().maintains_index:
+            rebuild_index(user)
+        users.append({'id': user.id, 'username': user.username, 'ids': {
+            'company': company_ids,
+            'companyquestion': list(CompanyQuestions.objects.filter(company__user=user).values_list('id', flat=True)),
+            'employee': list(Employee.objects.filter(user=user).values_list('id', flat=True)),
+            'application': application_ids,
+            'question': list(Question.objects.filter(user=user).values_list('id', flat=True)),
+            'todo': list(TodoList.objects.filter(user=user).values_list('id', flat=True)),
+        }})
+    return users
+
+
+def delete_users(users):
+    User.objects.filter(pk__in=[user['id'] for user in users]).delete()
+
+
+async def run_steps(host, port, sessions, steps, duration, warmup=0.0):
+    """
+    Run every session as a client for `duration` seconds after `warmup`.
+    Returns {step name: summarize() stats} with a "total" entry, and the
+    number of unexpected responses by step and status.
+    """
+    timings = {step.name: [] for step in steps}
+    errors = {step.name: 0 for step in steps}
+    statuses = {}
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    measure_from, stop = start + warmup, start + warmup + duration
+
+    async def client(session):
+        connection = Connection(host, port)
+        try:
+            while (sent := loop.time()) < stop:
+                candidates = [step for step in steps if step.available(session)]
+                step = session.rng.choices(candidates, [step.weight for step in candidates])[0]
+                method, path, body, headers = step.build(session)
+                try:
+                    status, content = await connection.request(method, path, body, headers)
+                    step.done(session, status, content)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    status = None
+                if sent < measure_from:
+                    continue
+                if status == step.expect:
+                    timings[step.name].append(loop.time() - sent)
+                else:
+                    errors[step.name] += 1
+                    key = f'{step.name} {status}'
+                    statuses[key] = statuses.get(key, 0) + 1
+        finally:
+            await connection.close()
+
+    await asyncio.gather(*(client(session) for session in sessions))
+    results = {name: summarize(timings[name], errors[name], duration) for name in timings if timings[name] or errors[name]}
+    results['total'] = summarize([t for values in timings.values() for t in values], sum(errors.values()), duration)
+    return results, statuses
+
+
+async def run_load(host, port, path, concurrency, duration, warmup=0.0, headers=None):
+    """GET `path` from `concurrency` clients for `duration` seconds after `warmup`; returns summarize()'s stats."""
+    access = (headers or {}).get('Authorization', '').removeprefix('Bearer ') or None
+    sessions = [Session(index, access=access) for index in range(concurrency)]
+    results, _ = await run_steps(host, port, sessions, [Step(path, 'GET', path)], duration, warmup)
+    return results.get(path, summarize([], 0, duration))
+
+
+async def login(host, port, users):
+    """Access token of each user from /api/token/, like the frontend gets it."""
+    async def obtain(user):
+        connection = Connection(host, port)
+        try:
+            body = json.dumps({'username': user['username'], 'password': PASSWORD}).encode()
+            status, content = await connection.request('POST', '/api/token/', body, {'Content-Type': 'application/json'})
+        finally:
+            await connection.close()
+        if status != 200:
+            raise RuntimeError(f"/api/token/ answered {status} for {user['username']}: {content[:200]!r}")
+        user['access'] = json.loads(content)['access']
+
+    await asyncio.gather(*(obtain(user) for user in users))
+
+
+def server_command(server, workers, host, port):
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'{host}:{port}', '--workers', str(workers)]
+    if server == 'asgi':
+        return command + ['--worker-class', 'uvicorn_worker.UvicornWorker', 'joblander.asgi']
+    return command + ['joblander.wsgi']
+
+
+def server_env(server):
+    # Clients share a few users, so throttling would fail most requests
+    return {**os.environ, 'ASYNC_VIEWS': str(server == 'asgi'), 'USER_THROTTLE_RATE': '', 'ANON_THROTTLE_RATE': ''}
+
+
+def wait_for_port(host, port, process=None, timeout=CONNECT_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'The server exited with status {process.returncode}')
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'The server did not listen on {host}:{port} within {timeout}s')
+
+
+@contextmanager
+def serve(args, host, port, env=None, cwd=None):
+    """Run a server command until the block exits."""
+    process = subprocess.Popen(args, env=env, cwd=cwd or settings.BASE_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(host, port, process)
+        yield process
+    finally:
+        process.terminate()
+        try:
+            process.wait(CONNECT_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
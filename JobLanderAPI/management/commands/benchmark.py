@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from JobLanderAPI.benchmarks import SCENARIOS, unthrottled
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Run a benchmark scenario. Seeded rows are rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--rows', type=int, help='Rows to seed (scenario specific default)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per measurement, the median is reported')
+
+    def handle(self, *args, **options):
+        func = SCENARIOS[options['scenario']]
+        rows = options['rows'] or func.default_rows
+        results = []
+        try:
+            with transaction.atomic(), unthrottled():
+                results = func(rows, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{options['scenario']}: {func.__doc__} ({rows} rows)")
+        for result in results:
+            self.stdout.write('  ' + '  '.join(f'{key}={value}' for key, value in result.items()))
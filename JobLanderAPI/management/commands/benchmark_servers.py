@@ -0,0 +1,56 @@
+import asyncio
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from JobLanderAPI.benchmarks import seed_applications
+from JobLanderAPI.loadtest import run_load, serve, server_command, server_env
+from JobLanderAPI.models import Application, Question
+
+HOST = '127.0.0.1'
+PATHS = [
+    '/api/applications?page_size=10',
+    '/api/applications?page_size=10&cursor=',
+    '/api/questions?page_size=10',
+    '/api/statistics',
+    '/api/timeseries?interval=week&points=12',
+]
+
+
+class Command(BaseCommand):
+    help = ('Latency of the hot read endpoints under concurrent clients, served by gunicorn with sync workers '
+            '(WSGI) and with uvicorn workers (ASGI, async views). Seeds a throwaway user and deletes it afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+        parser.add_argument('--concurrency', type=int, default=200, help='Clients sending requests at the same time')
+        parser.add_argument('--duration', type=float, default=10, help='Measured seconds per endpoint')
+        parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds before each measurement')
+        parser.add_argument('--rows', type=int, default=2000, help='Applications to seed, with one question each')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        # Committed, as the servers read it over their own connections
+        user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+        try:
+            seed_applications(user, options['rows'])
+            Question.objects.bulk_create((
+                Question(user=user, application_id=pk, question=f'Question {pk}', answer='Answer')
+                for pk in Application.objects.filter(user=user).values_list('pk', flat=True)
+            ), batch_size=1000)
+            headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+            self.stdout.write(f"{options['concurrency']} clients, {options['workers']} workers, "
+                              f"{options['duration']}s per endpoint ({options['rows']} rows)")
+            for server in options['servers']:
+                command = server_command(server, options['workers'], HOST, options['port'])
+                with serve(command, HOST, options['port'], env=server_env(server)):
+                    for path in PATHS:
+                        stats = asyncio.run(run_load(HOST, options['port'], path, options['concurrency'],
+                                                     options['duration'], options['warmup'], headers))
+                        self.stdout.write(f"  server={server}  url={path}  " + '  '.join(
+                            f'{key}={value}' for key, value in stats.items()))
+        finally:
+            user.delete()
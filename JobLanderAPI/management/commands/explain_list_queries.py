@@ -0,0 +1,86 @@
+import json
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.mixins import ListModelMixin
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from JobLanderAPI import urls
+
+
+class Rollback(Exception):
+    pass
+
+
+def full_scans(plan):
+    """Tables the plan reads in full (MySQL access_type ALL, SQLite SCAN without an index)."""
+    if connection.vendor == 'mysql':
+        scans = []
+
+        def walk(node):
+            if isinstance(node, dict):
+                if node.get('access_type') == 'ALL':
+                    scans.append(node.get('table_name'))
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(json.loads(plan))
+        return scans
+    return [match.group(1) for match in re.finditer(r'\bSCAN (\S+)(?!\S| USING)', plan)]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the main query of every list endpoint and fail if one reads a whole table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Explain the queries as this user (plans depend on its data)')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        failures = []
+        try:
+            with transaction.atomic():
+                user = self.get_user(options['username'])
+                for pattern in urls.urlpatterns:
+                    view_class = getattr(pattern.callback, 'view_class', None)
+                    if view_class is None or not issubclass(view_class, ListModelMixin):
+                        continue
+                    for ordering in [None] + list(getattr(view_class, 'ordering_fields', None) or []):
+                        scans = self.explain(view_class, pattern.name, user, ordering)
+                        label = f"{pattern.name}" + (f" ordering={ordering}" if ordering else '')
+                        if scans:
+                            failures.append(label)
+                            self.stdout.write(self.style.ERROR(f"{label}: full scan of {', '.join(scans)}"))
+                        else:
+                            self.stdout.write(f"{label}: ok")
+                raise Rollback
+        except Rollback:
+            pass
+        if failures:
+            raise CommandError(f"{len(failures)} list queries do not use an index")
+
+    def get_user(self, username):
+        if username:
+            return User.objects.get(username=username)
+        return User.objects.order_by('id').first() or User.objects.create(username='explain_list_queries')
+
+    def explain(self, view_class, name, user, ordering):
+        params = {'ordering': ordering} if ordering else {}
+        request = APIRequestFactory().get(f'/api/{name}', params)
+        force_authenticate(request, user)
+        view = view_class(request=request, args=(), kwargs={}, format_kwarg=None)
+        view.request = Request(request)
+        view.request.user = user
+        queryset = view.filter_queryset(view.get_queryset())
+        page_size = view.paginator.get_page_size(view.request) if view.paginator else 10
+        options = {'format': 'json'} if connection.vendor == 'mysql' else {}
+        plan = queryset[:page_size].explain(**options)
+        if self.verbosity > 1:
+            self.stdout.write(plan)
+        return full_scans(plan)
@@ -0,0 +1,75 @@
+from collections import namedtuple
+from itertools import islice
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from JobLanderAPI.blobs import CV_DIR, INCOMING_DIR, cv_storage, modified_at
+from JobLanderAPI.models import CV, CVBlob
+
+StoredFile = namedtuple('StoredFile', 'name size modified')
+
+
+def iter_files(storage, directory):
+    # scandir streams the directory; other storages can only list it whole
+    try:
+        path = storage.path(directory)
+    except NotImplementedError:
+        for filename in storage.listdir(directory)[1]:
+            name = f'{directory}/{filename}'
+            yield StoredFile(name, storage.size(name), modified_at(storage, name))
+        return
+    if not os.path.isdir(path):
+        return
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                yield StoredFile(f'{directory}/{entry.name}', stat.st_size, stat.st_mtime)
+
+
+class Command(BaseCommand):
+    help = ('Delete CV files that no CV row references and uploads that were never finished. '
+            'Files younger than --min-age are kept, so it is safe to run while uploads are in progress.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=3600, help='Seconds since a file was last written or reused')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Files checked per query')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        storage = cv_storage()
+        cutoff = time.time() - options['min_age']
+        scanned = deleted = reclaimed = 0
+
+        def collect(files, referenced):
+            nonlocal deleted, reclaimed
+            for stored in files:
+                if stored.name in referenced or stored.modified is None or stored.modified >= cutoff:
+                    continue
+                # Checked again: an upload may have reused the file since the scan
+                modified = modified_at(storage, stored.name)
+                if modified is None or modified >= cutoff:
+                    continue
+                if not options['dry_run']:
+                    storage.delete(stored.name)
+                deleted += 1
+                reclaimed += stored.size
+
+        files = iter_files(storage, CV_DIR)
+        while batch := list(islice(files, options['batch_size'])):
+            scanned += len(batch)
+            names = [stored.name for stored in batch]
+            referenced = set(CV.objects.filter(cv__in=names).values_list('cv', flat=True))
+            referenced |= set(CVBlob.objects.filter(name__in=names).values_list('name', flat=True))
+            collect(batch, referenced)
+
+        # Temporary files of uploads that never completed
+        files = iter_files(storage, INCOMING_DIR)
+        while batch := list(islice(files, options['batch_size'])):
+            scanned += len(batch)
+            collect(batch, set())
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(f'Scanned {scanned} files. {verb} {deleted} files, {reclaimed} bytes reclaimed.')
@@ -0,0 +1,33 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from JobLanderAPI.imports import FORMATS, IMPORTERS, ImportFormatError, iter_records, request_for
+
+
+class Command(BaseCommand):
+    help = 'Import applications, companies or employees for a user from a CSV, NDJSON or JSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('resource', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Detected from the file name by default')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"User {options['username']} does not exist")
+        importer = IMPORTERS[options['resource']](request_for(user))
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                report = importer.run(iter_records(fileobj, options['path'], options['format']))
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            f"Imported {report['created']} {options['resource']}, {report['failed']} failed, "
+            f"{report['companies_created']} companies created"
+        )
+        for error in report['errors']:
+            self.stdout.write(f"  row {error['row']}: {json.dumps(error['errors'])}")
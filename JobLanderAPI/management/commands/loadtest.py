@@ -0,0 +1,163 @@
+import asyncio
+from datetime import datetime, timezone
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from JobLanderAPI.loadtest import (SCENARIOS, Session, delete_users, login, run_steps, seed_users, serve,
+                                   server_command, server_env)
+
+
+class Rollback(Exception):
+    pass
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Seed users, start gunicorn (or use --url), log in through /api/token/ and run a read, write or mixed '
+            'scenario over every API route. Reports latency percentiles, requests per second and SQL queries per '
+            'request by endpoint; --output saves them as JSON and --compare checks them against a saved run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+        parser.add_argument('--users', type=int, default=10, help='Seeded users, the clients are spread over them')
+        parser.add_argument('--rows', type=int, default=200, help='Applications per user')
+        parser.add_argument('--concurrency', type=int, default=20, help='Clients sending requests at the same time')
+        parser.add_argument('--duration', type=float, default=30, help='Measured seconds')
+        parser.add_argument('--warmup', type=float, default=5, help='Unmeasured seconds before the measurement')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the data and of the request sequence')
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--url', help='host:port of a running server on the same database, with throttling off '
+                                          '(USER_THROTTLE_RATE= ANON_THROTTLE_RATE=), instead of starting one')
+        parser.add_argument('--output', help='Save the results to this JSON file')
+        parser.add_argument('--compare', help='Results of an earlier run (JSON) to compare with')
+        parser.add_argument('--tolerance', type=float, default=20,
+                            help='Percent by which p95 may grow or rps drop before --compare fails')
+        parser.add_argument('--min-requests', type=int, default=20,
+                            help='Endpoints with fewer requests in either run are shown but not checked by --compare')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded users')
+
+    def handle(self, *args, **options):
+        steps = SCENARIOS[options['scenario']]
+        host, port = options['host'], options['port']
+        if options['url']:
+            host, _, port = options['url'].rpartition(':')
+            port = int(port)
+        self.stdout.write(f"Seeding {options['users']} users with {options['rows']} applications each")
+        users = seed_users(options['users'], options['rows'], options['seed'])
+        try:
+            if options['url']:
+                results, statuses = self.run(users, steps, host, port, options)
+            else:
+                command = server_command(options['server'], options['workers'], host, port)
+                with serve(command, host, port, env=server_env(options['server'])):
+                    results, statuses = self.run(users, steps, host, port, options)
+        finally:
+            if not options['keep']:
+                delete_users(users)
+
+        report = {
+            'meta': {
+                'scenario': options['scenario'],
+                'server': 'external' if options['url'] else options['server'],
+                'workers': None if options['url'] else options['workers'],
+                'database': connection.vendor,
+                'commit': git_commit(),
+                'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                **{key: options[key] for key in ('users', 'rows', 'concurrency', 'duration', 'warmup', 'seed')},
+            },
+            'endpoints': results,
+            'errors': statuses,
+        }
+        self.write_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f"Saved to {options['output']}")
+        if options['compare']:
+            self.compare(report, options['compare'], options['tolerance'], options['min_requests'])
+
+    def run(self, users, steps, host, port, options):
+        asyncio.run(login(host, port, users))
+        queries = self.count_queries(users[0], steps, options['seed'])
+        sessions = [Session(index, users[index % len(users)], seed=options['seed'])
+                    for index in range(options['concurrency'])]
+        self.stdout.write(f"Running {options['scenario']} with {options['concurrency']} clients for "
+                          f"{options['duration']}s after {options['warmup']}s of warmup")
+        results, statuses = asyncio.run(run_steps(host, port, sessions, steps, options['duration'], options['warmup']))
+        for name, stats in results.items():
+            if name in queries:
+                stats['queries'] = queries[name]
+        return results, statuses
+
+    def count_queries(self, user, steps, seed):
+        """
+        SQL queries of one request per step, run in this process in the
+        scenario's order and rolled back. Each step runs twice and the second
+        count is kept, as under load caches are warm.
+        """
+        session = Session('queries', user, seed=seed)
+        client = Client(SERVER_NAME='localhost')
+        queries = {}
+        try:
+            with transaction.atomic():
+                for step in steps:
+                    for _ in range(2):
+                        if not step.available(session):
+                            break
+                        method, path, body, headers = step.build(session)
+                        content_type = headers.pop('Content-Type', 'application/octet-stream')
+                        with CaptureQueriesContext(connection) as captured:
+                            response = client.generic(method, path, body, content_type, headers=headers)
+                            content = b''.join(response.streaming_content) if response.streaming else response.content
+                        step.done(session, response.status_code, content)
+                        queries[step.name] = len(captured)
+                raise Rollback
+        except Rollback:
+            pass
+        return queries
+
+    def write_report(self, report):
+        for name, stats in report['endpoints'].items():
+            self.stdout.write(f'  endpoint={name}  ' + '  '.join(f'{key}={value}' for key, value in stats.items()))
+        for key, count in report['errors'].items():
+            self.stderr.write(f'  unexpected response: {key} x{count}')
+
+    def compare(self, report, path, tolerance, min_requests):
+        with open(path) as file:
+            previous = json.load(file)
+        regressions = []
+        self.stdout.write(f"Compared with {path} ({previous['meta'].get('commit')}, {previous['meta'].get('date')})")
+        for name, stats in report['endpoints'].items():
+            before = previous['endpoints'].get(name)
+            if not before or not before.get('p95_ms') or not stats.get('p95_ms') or not before.get('rps'):
+                continue
+            p95 = (stats['p95_ms'] / before['p95_ms'] - 1) * 100
+            rps = (stats['rps'] / before['rps'] - 1) * 100
+            line = (f"  endpoint={name}  p95_ms={before['p95_ms']}->{stats['p95_ms']} ({p95:+.1f}%)  "
+                    f"rps={before['rps']}->{stats['rps']} ({rps:+.1f}%)")
+            if 'queries' in stats:
+                line += f"  queries={before.get('queries')}->{stats['queries']}"
+            if min(before['requests'], stats['requests']) < min_requests:
+                self.stdout.write(line + '  (too few requests, not checked)')
+                continue
+            self.stdout.write(line)
+            if p95 > tolerance or rps < -tolerance or (stats.get('queries') or 0) > (before.get('queries') or 0):
+                regressions.append(name)
+        if regressions:
+            raise CommandError(f"Regressed beyond {tolerance}% or in queries: {', '.join(regressions)}")
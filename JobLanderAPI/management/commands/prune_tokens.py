@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from JobLanderAPI import tokens
+
+
+class Command(BaseCommand):
+    help = ('Delete the expired refresh tokens and their blacklist entries, which token rotation adds on every '
+            'refresh. Unlike flushexpiredtokens it deletes a batch per short transaction, so the tables are never '
+            'locked for long. runworkers also runs it every TOKEN_PRUNE_INTERVAL seconds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=tokens.PRUNE_BATCH_SIZE, help='Tokens deleted per transaction')
+        parser.add_argument('--pause', type=float, default=tokens.PRUNE_PAUSE, help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        deleted, blacklisted = tokens.prune_expired(options['batch_size'], options['pause'])
+        self.stdout.write(f'Deleted {deleted} expired tokens and {blacklisted} blacklist entries '
+                          f'in {time.perf_counter() - start:.1f}s')
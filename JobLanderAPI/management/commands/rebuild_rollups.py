@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from JobLanderAPI.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recount ApplicationDailyRollup from the applications.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Only rebuild the rows of this user')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f"User {options['username']} does not exist")
+        with transaction.atomic():
+            created = rebuild_rollups(user)
+        self.stdout.write(f'Rebuilt {created} rollup buckets')
@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from JobLanderAPI.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the inverted index used by SEARCH_BACKEND="index".'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Only rebuild the rows of this user')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f"User {options['username']} does not exist")
+        with transaction.atomic():
+            created = rebuild_index(user)
+        self.stdout.write(f'Indexed {created} tokens')
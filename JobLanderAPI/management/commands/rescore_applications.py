@@ -0,0 +1,41 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from JobLanderAPI.ats import rescore_user
+from JobLanderAPI.models import Application
+from JobLanderAPI.tasks import setup_worker
+
+
+class Command(BaseCommand):
+    help = 'Recompute ats_score for every application with a submitted CV, one user per task.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Only rescore the applications of this user')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes (default: one per CPU, 0 rescores in this process)')
+
+    def handle(self, *args, **options):
+        users = Application.objects.filter(submitted_cv__isnull=False)
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f"User {options['username']} does not exist")
+            users = users.filter(user=user)
+        user_ids = list(users.values_list('user_id', flat=True).distinct().order_by('user_id'))
+
+        start = time.perf_counter()
+        if options['workers'] and len(user_ids) > 1:
+            # Forked workers must not share this process's connections
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers'], initializer=setup_worker) as executor:
+                changed = sum(executor.map(rescore_user, user_ids, chunksize=16))
+        else:
+            changed = sum(map(rescore_user, user_ids))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Rescored the applications of {len(user_ids)} users in {elapsed:.1f}s, '
+                          f'{changed} scores changed')
@@ -0,0 +1,74 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from JobLanderAPI import tasks, tokens
+
+
+class Command(BaseCommand):
+    help = 'Run queued tasks (see JobLanderAPI/tasks.py) until stopped with SIGINT or SIGTERM.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.TASK_WORKERS, help='Tasks run at the same time')
+        parser.add_argument('--processes', action='store_true',
+                            help='Run tasks in worker processes rather than threads, for CPU bound tasks')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once no task is due, for tests and cron')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        worker = tasks.worker_id()
+        self.stopping = False
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.stop)
+
+        if options['processes']:
+            # Forked processes must not share this process's connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(workers, initializer=tasks.setup_worker)
+        else:
+            executor = ThreadPoolExecutor(workers, thread_name_prefix='task')
+        self.stdout.write(f"Running tasks with {workers} {'processes' if options['processes'] else 'threads'} as {worker}")
+
+        running, self.succeeded, self.failed = set(), 0, 0
+        recovered_at = 0
+        with executor:
+            while not self.stopping:
+                close_old_connections()
+                if time.monotonic() - recovered_at > tasks.TASK_LEASE / 4:
+                    if requeued := tasks.recover_expired():
+                        self.stderr.write(f'Requeued {requeued} tasks whose worker stopped')
+                    self.schedule_periodic()
+                    recovered_at = time.monotonic()
+                claimed = tasks.claim(workers - len(running), worker) if len(running) < workers else []
+                running.update(executor.submit(tasks.run, task.pk, worker) for task in claimed)
+                if running:
+                    # Wake up as soon as a slot frees, or to poll again
+                    timeout = None if len(running) >= workers else options['poll_interval']
+                    done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                    self.count(done)
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll_interval'])
+            # Let running tasks finish; unclaimed ones stay queued
+            self.count(wait(running).done)
+        self.stdout.write(f'Stopped: {self.succeeded} tasks succeeded, {self.failed} failed')
+
+    def schedule_periodic(self):
+        if settings.TOKEN_PRUNE_INTERVAL:
+            tasks.schedule(tokens.prune_expired, settings.TOKEN_PRUNE_INTERVAL)
+
+    def count(self, futures):
+        for future in futures:
+            if future.exception() is None and future.result():
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def stop(self, signum, frame):
+        self.stopping = True
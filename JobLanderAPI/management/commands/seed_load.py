@@ -0,0 +1,75 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from JobLanderAPI.seeding import PASSWORD, create_users, distribute, seed_user
+from JobLanderAPI.tasks import setup_worker
+
+
+class Command(BaseCommand):
+    help = ('Fill the database with synthetic users, companies, employees, applications, questions, todos and '
+            'contacted employees for scale tests. Applications are spread over the users with a skew, the data '
+            'only depends on --seed, and users are generated in parallel by worker processes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--applications', type=int, default=100000, help='Applications over all the users')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed-', help='Usernames are <prefix><number>')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes (default: one per CPU, 0 generates in this process)')
+        parser.add_argument('--no-index', action='store_true',
+                            help='Skip the search index; run rebuild_search_index later')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['applications'] < 0:
+            raise CommandError('--users must be positive and --applications not negative')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Users named {prefix}... exist already, choose another --prefix')
+        workers = options['workers']
+        if workers and connection.vendor == 'sqlite':
+            # One writer at a time: the workers would only wait on each other's locks
+            self.stdout.write('SQLite takes one writer at a time, generating in this process')
+            workers = 0
+
+        start = time.perf_counter()
+        counts = distribute(options['applications'], options['users'], options['seed'])
+        user_ids = create_users(prefix, options['users'])
+        # The busiest users first, so they do not end up running alone at the end
+        jobs = sorted(zip(user_ids, range(options['users']), counts), key=lambda job: -job[2])
+        arguments = (options['seed'], date.today(), options['batch_size'], not options['no_index'])
+        self.stdout.write(f"Generating {options['applications']} applications for {options['users']} users "
+                          f"(the busiest has {max(counts)})")
+
+        totals = {}
+        done = 0
+        if workers:
+            # Forked workers must not share this process's connections
+            connections.close_all()
+            with ProcessPoolExecutor(workers, initializer=setup_worker) as executor:
+                futures = {executor.submit(seed_user, *job, *arguments): job[2] for job in jobs}
+                for future in as_completed(futures):
+                    done = self.progress(totals, future.result(), done, futures[future], options['applications'])
+        else:
+            for job in jobs:
+                done = self.progress(totals, seed_user(*job, *arguments), done, job[2], options['applications'])
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Done in {elapsed:.1f}s ({options["applications"] / elapsed:.0f} applications/s): '
+                          + ', '.join(f'{count} {name}' for name, count in totals.items()))
+        self.stdout.write(f"Users {prefix}0 to {prefix}{options['users'] - 1} log in with password {PASSWORD}")
+
+    def progress(self, totals, counts, done, applications, total):
+        for name, count in counts.items():
+            totals[name] = totals.get(name, 0) + count
+        # A line every tenth of the applications
+        if total and (done + applications) * 10 // total > done * 10 // total:
+            self.stdout.write(f'  {(done + applications) * 100 // total}% of the applications')
+        return done + applications
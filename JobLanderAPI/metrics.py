@@ -0,0 +1,260 @@
+# metrics.py
+# Per-endpoint request metrics as Prometheus histograms, labelled with the
+# URL name and method (methods outside METHODS count as "other", so a client
+# cannot add series by sending made up ones). MetricsMiddleware (see middleware.py) times each
+# request; the SQL queries and their time are counted by a wrapper on every
+# database connection and the serializer time by SerializerTimingMixin,
+# both through a context variable holding the current request's numbers, so
+# they are attributed correctly under ASGI too. Each process keeps its
+# histograms in memory and writes them to its own file in METRICS_DIR every
+# FLUSH_INTERVAL seconds; /metrics adds up the files, so the scrape covers
+# every gunicorn worker whichever one answers it. gunicorn.conf.py empties
+# METRICS_DIR when the server starts, and folds the file of each exited
+# worker into EXITED_FILE, so the totals stay monotonic while the directory
+# holds one file per running worker.
+import atexit
+from bisect import bisect_left
+from contextvars import ContextVar
+import json
+import math
+import os
+from pathlib import Path
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+FLUSH_INTERVAL = 5
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, math.inf)
+UNMATCHED = 'unmatched'
+METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'})
+OTHER_METHOD = 'other'
+EXITED_FILE = 'exited.json'
+
+current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('start', 'queries', 'db_time', 'serializer_time', 'serializing', 'statements')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+        # A list while the request is profiled (see profiling.py): (sql, many, seconds), as
+        # the parameters hold user data
+        self.statements = None
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # labels -> observations per bucket (not cumulative) followed by their sum
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * len(self.buckets) + [0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+
+HISTOGRAMS = {histogram.name: histogram for histogram in (
+    Histogram('joblander_request_duration_seconds', 'Time to respond, middleware included.', SECONDS_BUCKETS),
+    Histogram('joblander_request_queries', 'SQL queries run by the request.', QUERIES_BUCKETS),
+    Histogram('joblander_request_db_seconds', 'Time spent executing SQL queries.', SECONDS_BUCKETS),
+    Histogram('joblander_request_serializer_seconds',
+              'Time spent in serializers validating and representing data, their queries included.', SECONDS_BUCKETS),
+)}
+lock = threading.Lock()
+flusher = None
+
+
+def count_query(execute, sql, params, many, context):
+    record = current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        record.queries += 1
+        record.db_time += elapsed
+        if record.statements is not None:
+            record.statements.append((sql, many, elapsed))
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    # Sent again when a closed connection reconnects
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class SerializerTimingMixin:
+    """Adds the time of the outermost serializer call to the request's serializer time."""
+
+    def is_valid(self, *args, **kwargs):
+        return self.timed(super().is_valid, *args, **kwargs)
+
+    def to_representation(self, instance):
+        return self.timed(super().to_representation, instance)
+
+    def timed(self, method, *args, **kwargs):
+        record = current.get()
+        if record is None or record.serializing:
+            return method(*args, **kwargs)
+        record.serializing = True
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            record.serializer_time += time.perf_counter() - start
+            record.serializing = False
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNMATCHED
+
+
+def observe(request, record):
+    labels = (view_name(request), request.method if request.method in METHODS else OTHER_METHOD)
+    with lock:
+        HISTOGRAMS['joblander_request_duration_seconds'].observe(labels, time.perf_counter() - record.start)
+        HISTOGRAMS['joblander_request_queries'].observe(labels, record.queries)
+        HISTOGRAMS['joblander_request_db_seconds'].observe(labels, record.db_time)
+        HISTOGRAMS['joblander_request_serializer_seconds'].observe(labels, record.serializer_time)
+    if flusher is None or flusher.pid != os.getpid():
+        start_flusher()
+
+
+class Flusher(threading.Thread):
+
+    def __init__(self):
+        super().__init__(name='metrics-flusher', daemon=True)
+        self.pid = os.getpid()
+        # The pid alone could be reused by a later worker and overwrite this one's totals
+        self.path = Path(settings.METRICS_DIR) / f'{self.pid}-{uuid.uuid4().hex[:8]}.json'
+        # /metrics and exit flush as well
+        self.writing = threading.Lock()
+
+    def run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self):
+        with self.writing:
+            with lock:
+                data = {name: [[list(labels), list(series)] for labels, series in histogram.series.items()]
+                        for name, histogram in HISTOGRAMS.items()}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.path.with_suffix('.tmp')
+            temporary.write_text(json.dumps(data))
+            os.replace(temporary, self.path)
+
+
+def start_flusher():
+    global flusher
+    with lock:
+        if flusher is not None and flusher.pid == os.getpid():
+            return
+        if flusher is not None:
+            # Forked after recording, the parent's numbers are in its own file
+            for histogram in HISTOGRAMS.values():
+                histogram.series.clear()
+        flusher = Flusher()
+    flusher.start()
+    atexit.register(flusher.flush)
+
+
+def add_file(totals, path):
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return
+    for name, series_list in data.items():
+        if name not in totals:
+            continue
+        for labels, series in series_list:
+            total = totals[name].setdefault(tuple(labels), [0] * len(series))
+            for index, value in enumerate(series):
+                total[index] += value
+
+
+def collect():
+    """Histograms of all processes, summed: {name: {labels: series}}."""
+    if flusher is not None and flusher.pid == os.getpid():
+        flusher.flush()
+    totals = {name: {} for name in HISTOGRAMS}
+    for path in Path(settings.METRICS_DIR).glob('*.json'):
+        add_file(totals, path)
+    return totals
+
+
+def clear():
+    """Remove every process's file, when the server starts."""
+    for path in Path(settings.METRICS_DIR).glob('*'):
+        path.unlink(missing_ok=True)
+
+
+def retire(pid):
+    """
+    Add the numbers of an exited process to EXITED_FILE and remove its file.
+    Only the gunicorn master calls this, one worker at a time.
+    """
+    directory = Path(settings.METRICS_DIR)
+    paths = list(directory.glob(f'{pid}-*.json'))
+    if not paths:
+        return
+    exited = directory / EXITED_FILE
+    totals = {name: {} for name in HISTOGRAMS}
+    for path in [exited, *paths]:
+        add_file(totals, path)
+    temporary = exited.with_suffix('.tmp')
+    temporary.write_text(json.dumps({name: [[list(labels), series] for labels, series in series_by_labels.items()]
+                                     for name, series_by_labels in totals.items()}))
+    # A scrape between this and the unlink counts the worker twice, for that instant
+    os.replace(temporary, exited)
+    for path in directory.glob(f'{pid}-*'):
+        path.unlink(missing_ok=True)
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_bound(bound):
+    return '+Inf' if bound == math.inf else str(bound)
+
+
+def render(totals):
+    """Prometheus text exposition format."""
+    lines = []
+    for name, histogram in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {histogram.documentation}', f'# TYPE {name} histogram']
+        for (view, method), series in sorted(totals.get(name, {}).items()):
+            labels = f'view="{escape(view)}",method="{escape(method)}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, series):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{format_bound(bound)}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {series[-1]}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
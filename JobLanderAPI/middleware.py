@@ -0,0 +1,118 @@
+# middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, profiling
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, usable by ASGI as well. WhiteNoiseMiddleware is sync only, so
+    under ASGI Django would run every request through it in a thread and
+    call the async views back through async_to_sync.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Opens the file
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, SQL queries and serializer time of each request in
+    the histograms of metrics.py, served on /metrics. First in MIDDLEWARE
+    so the latency includes the other middleware. Streamed responses (the
+    exports) are timed until their first byte.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        record = metrics.RequestMetrics()
+        token = metrics.current.set(record)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        metrics.observe(request, record)
+        return response
+
+    async def __acall__(self, request):
+        record = metrics.RequestMetrics()
+        token = metrics.current.set(record)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        metrics.observe(request, record)
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Profiles the requests profiling.py selects and saves their reports.
+    After AuthenticationMiddleware, for the session user, so the middleware
+    above it is not in the profile.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trigger, user = profiling.get_trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        profile = profiling.RequestProfile(trigger, user)
+        if not profile.start():
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+        profile.save(request, response)
+        return response
+
+    async def __acall__(self, request):
+        trigger, user = await profiling.aget_trigger(request)
+        if trigger is None:
+            return await self.get_response(request)
+        profile = profiling.RequestProfile(trigger, user)
+        if not profile.start():
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.stop()
+        await sync_to_async(profile.save)(request, response)
+        return response
@@ -0,0 +1,155 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:42
+
+import logging
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import MD5
+
+from JobLanderAPI.operations import AddConstraintOnline, AddIndexOnline
+
+logger = logging.getLogger(__name__)
+
+
+def duplicate_groups(queryset, fields):
+    # Grouped by the database, so names that differ only in case count as
+    # duplicates where the collation says so, as they do for the constraint
+    groups = queryset.values(*fields).annotate(rows=models.Count('id'), keep=models.Min('id')).filter(rows__gt=1)
+    for group in groups.order_by().iterator(chunk_size=1000):
+        keep = group.pop('keep')
+        group.pop('rows')
+        yield queryset.get(pk=keep), list(queryset.filter(**group).exclude(pk=keep))
+
+
+def fill_blanks(kept, duplicates, fields):
+    changed = [field for field in fields if not getattr(kept, field)]
+    for field in changed:
+        setattr(kept, field, next((getattr(row, field) for row in duplicates if getattr(row, field)), getattr(kept, field)))
+    return changed
+
+
+def join_answers(kept, duplicates):
+    # Different answers to the same question are all kept
+    answers = list(dict.fromkeys(row.answer for row in [kept, *duplicates] if row.answer))
+    kept.answer = '\n\n'.join(answers)
+    kept.save(update_fields=['answer'])
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Rows the new unique constraints would reject are merged into the oldest
+    of their group. Rows pointing at a removed company or employee are moved
+    to the kept one, empty fields of the kept row are filled from its
+    duplicates and differing answers are joined, so no data is lost.
+    Companies go first: merging them can make employees and company
+    questions duplicates.
+    """
+    Application = apps.get_model('JobLanderAPI', 'Application')
+    Company = apps.get_model('JobLanderAPI', 'Company')
+    CompanyQuestions = apps.get_model('JobLanderAPI', 'CompanyQuestions')
+    Employee = apps.get_model('JobLanderAPI', 'Employee')
+    Question = apps.get_model('JobLanderAPI', 'Question')
+    TodoList = apps.get_model('JobLanderAPI', 'TodoList')
+    Contact = Application.contacted_employees.through
+    merged = {}
+
+    for kept, duplicates in duplicate_groups(Company.objects.all(), ['user_id', 'name']):
+        ids = [row.pk for row in duplicates]
+        for model in (Application, Employee, CompanyQuestions):
+            model.objects.filter(company_id__in=ids).update(company_id=kept.pk)
+        kept.save(update_fields=fill_blanks(kept, duplicates, ['careers_link', 'linkedin_link', 'description']))
+        merged['companies'] = merged.get('companies', 0) + len(ids)
+        Company.objects.filter(pk__in=ids).delete()
+
+    # NULLs never collide in a unique index, employees without a company stay
+    employees = Employee.objects.filter(company__isnull=False)
+    for kept, duplicates in duplicate_groups(employees, ['user_id', 'company_id', 'name']):
+        ids = [row.pk for row in duplicates]
+        linked = set(Contact.objects.filter(employee_id=kept.pk).values_list('application_id', flat=True))
+        for contact in Contact.objects.filter(employee_id__in=ids).order_by('pk'):
+            if contact.application_id in linked:
+                contact.delete()
+            else:
+                linked.add(contact.application_id)
+                Contact.objects.filter(pk=contact.pk).update(employee_id=kept.pk)
+        kept.save(update_fields=fill_blanks(kept, duplicates, ['linkedin_link', 'email']))
+        merged['employees'] = merged.get('employees', 0) + len(ids)
+        Employee.objects.filter(pk__in=ids).delete()
+
+    company_questions = CompanyQuestions.objects.annotate(digest=MD5('question'))
+    for kept, duplicates in duplicate_groups(company_questions, ['company_id', 'digest']):
+        join_answers(kept, duplicates)
+        merged['company questions'] = merged.get('company questions', 0) + len(duplicates)
+        CompanyQuestions.objects.filter(pk__in=[row.pk for row in duplicates]).delete()
+
+    questions = Question.objects.filter(application__isnull=False).annotate(digest=MD5('question'))
+    for kept, duplicates in duplicate_groups(questions, ['user_id', 'application_id', 'digest']):
+        join_answers(kept, duplicates)
+        merged['questions'] = merged.get('questions', 0) + len(duplicates)
+        Question.objects.filter(pk__in=[row.pk for row in duplicates]).delete()
+
+    todos = TodoList.objects.annotate(digest=MD5('application_title'))
+    for kept, duplicates in duplicate_groups(todos, ['user_id', 'digest']):
+        kept.completed = any(row.completed for row in [kept, *duplicates])
+        kept.save(update_fields=['completed', *fill_blanks(kept, duplicates, ['application_link'])])
+        merged['todos'] = merged.get('todos', 0) + len(duplicates)
+        TodoList.objects.filter(pk__in=[row.pk for row in duplicates]).delete()
+
+    if merged:
+        logger.debug('Merged duplicate %s', ', '.join(f'{kind} ({count} rows)' for kind, count in merged.items()))
+
+
+class Migration(migrations.Migration):
+    # MySQL DDL is not transactional; each index is built online on its own
+    atomic = False
+
+    dependencies = [
+        ('JobLanderAPI', '0013_remove_companyquestions_user_company_user_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexOnline(
+            model_name='application',
+            index=models.Index(fields=['user', 'submission_date'], name='application_user_date_idx'),
+        ),
+        AddIndexOnline(
+            model_name='application',
+            index=models.Index(fields=['user', 'status'], name='application_user_status_idx'),
+        ),
+        AddIndexOnline(
+            model_name='application',
+            index=models.Index(fields=['user', 'company'], name='application_user_company_idx'),
+        ),
+        AddIndexOnline(
+            model_name='employee',
+            index=models.Index(fields=['user', 'name'], name='employee_user_name_idx'),
+        ),
+        AddIndexOnline(
+            model_name='todolist',
+            index=models.Index(fields=['user', 'completed'], name='todo_user_completed_idx'),
+        ),
+        # In one transaction, before the constraints that duplicates would fail
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop, atomic=True),
+        AddConstraintOnline(
+            model_name='company',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_company_per_user'),
+        ),
+        AddConstraintOnline(
+            model_name='companyquestions',
+            constraint=models.UniqueConstraint(models.F('company'), django.db.models.functions.text.MD5('question'), name='unique_company_question'),
+        ),
+        AddConstraintOnline(
+            model_name='employee',
+            constraint=models.UniqueConstraint(fields=('user', 'company', 'name'), name='unique_employee_per_company'),
+        ),
+        AddConstraintOnline(
+            model_name='question',
+            constraint=models.UniqueConstraint(models.F('user'), models.F('application'), django.db.models.functions.text.MD5('question'), name='unique_question_per_application'),
+        ),
+        AddConstraintOnline(
+            model_name='todolist',
+            constraint=models.UniqueConstraint(models.F('user'), django.db.models.functions.text.MD5('application_title'), name='unique_todo_per_user'),
+        ),
+    ]
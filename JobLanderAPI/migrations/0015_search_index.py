@@ -0,0 +1,45 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from JobLanderAPI.operations import AddFullTextIndex
+
+
+class Migration(migrations.Migration):
+    # MySQL DDL is not transactional
+    atomic = False
+
+    dependencies = [
+        ('JobLanderAPI', '0014_indexes_and_unique_constraints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=32)),
+                ('object_id', models.BigIntegerField()),
+                ('field', models.CharField(max_length=64)),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'kind', 'token'], name='searchtoken_user_token_idx'), models.Index(fields=['kind', 'object_id'], name='searchtoken_object_idx')],
+            },
+        ),
+        AddFullTextIndex(model_name='application', fields=['job_title'], name='application_job_title_ft'),
+        AddFullTextIndex(model_name='application', fields=['status'], name='application_status_ft'),
+        AddFullTextIndex(model_name='company', fields=['name'], name='company_name_ft'),
+        AddFullTextIndex(model_name='company', fields=['location'], name='company_location_ft'),
+        AddFullTextIndex(model_name='companyquestions', fields=['question'], name='companyquestions_question_ft'),
+        AddFullTextIndex(model_name='employee', fields=['name'], name='employee_name_ft'),
+        AddFullTextIndex(model_name='employee', fields=['job_title'], name='employee_job_title_ft'),
+        AddFullTextIndex(model_name='employee', fields=['contacted'], name='employee_contacted_ft'),
+        AddFullTextIndex(model_name='question', fields=['question'], name='question_question_ft'),
+        AddFullTextIndex(model_name='todolist', fields=['application_title'], name='todolist_application_title_ft'),
+    ]
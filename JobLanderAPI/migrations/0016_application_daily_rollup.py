@@ -0,0 +1,43 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_rollups(apps, schema_editor):
+    Application = apps.get_model('JobLanderAPI', 'Application')
+    ApplicationDailyRollup = apps.get_model('JobLanderAPI', 'ApplicationDailyRollup')
+    buckets = Application.objects.values('user_id', 'submission_date', 'status', 'stage').annotate(
+        total=models.Count('id')).order_by()
+    ApplicationDailyRollup.objects.bulk_create([
+        ApplicationDailyRollup(user_id=row['user_id'], day=row['submission_date'], status=row['status'],
+                               stage=row['stage'], count=row['total'])
+        for row in buckets.iterator(chunk_size=1000)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('JobLanderAPI', '0015_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('ASSESSMENT', 'Assessment'), ('INTERVIEW', 'Interview'), ('REJECTED', 'Rejected'), ('ACCEPTED', 'Accepted')], max_length=255)),
+                ('stage', models.CharField(choices=[('APPLIED', 'Applied'), ('PHONE_SCREEN', 'Phone Screen'), ('ASSESSMENT', 'Assessment'), ('INTERVIEW', 'Interview'), ('OFFER', 'Offer')], max_length=255)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'status', 'stage'), name='unique_rollup_bucket')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:59
+
+from django.db import migrations, models
+
+from JobLanderAPI.operations import AddFieldOnline
+
+
+class Migration(migrations.Migration):
+    # MySQL DDL is not transactional; each column is added online on its own
+    atomic = False
+
+    dependencies = [
+        ('JobLanderAPI', '0016_application_daily_rollup'),
+    ]
+
+    operations = [
+        AddFieldOnline(
+            model_name='application',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        AddFieldOnline(
+            model_name='company',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        AddFieldOnline(
+            model_name='companyquestions',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        AddFieldOnline(
+            model_name='cv',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        AddFieldOnline(
+            model_name='employee',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        AddFieldOnline(
+            model_name='question',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        AddFieldOnline(
+            model_name='todolist',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:26
+
+import JobLanderAPI.blobs
+from django.db import migrations, models
+
+
+def adopt_existing_files(apps, schema_editor):
+    # Files uploaded before content addressing keep their names; each becomes
+    # a blob referenced by the rows that point at it
+    CV = apps.get_model('JobLanderAPI', 'CV')
+    CVBlob = apps.get_model('JobLanderAPI', 'CVBlob')
+    storage = CV._meta.get_field('cv').storage
+    references = CV.objects.exclude(cv='').values('cv').annotate(refs=models.Count('id')).order_by()
+    CVBlob.objects.bulk_create([
+        CVBlob(name=row['cv'], size=storage.size(row['cv']) if storage.exists(row['cv']) else 0, refs=row['refs'])
+        for row in references.iterator(chunk_size=1000)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('JobLanderAPI', '0017_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CVBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='cv',
+            name='cv',
+            field=JobLanderAPI.blobs.BlobFileField(upload_to='cvs/'),
+        ),
+        migrations.RunPython(adopt_existing_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+from JobLanderAPI.operations import AddFieldOnline
+
+
+class Migration(migrations.Migration):
+    # MySQL DDL is not transactional; the column is added online
+    atomic = False
+
+    dependencies = [
+        ('JobLanderAPI', '0018_cv_blobs'),
+    ]
+
+    operations = [
+        AddFieldOnline(
+            model_name='cvblob',
+            name='text',
+            field=models.TextField(null=True),
+        ),
+    ]
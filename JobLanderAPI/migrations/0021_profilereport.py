@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('JobLanderAPI', '0020_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('trigger', models.CharField(choices=[('REQUESTED', 'Requested'), ('SAMPLED', 'Sampled')], max_length=16)),
+                ('view_name', models.CharField(max_length=255)),
+                ('method', models.CharField(max_length=16)),
+                ('path', models.TextField()),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('duration_ms', models.FloatField()),
+                ('query_count', models.PositiveIntegerField()),
+                ('db_ms', models.FloatField()),
+                ('stats', models.TextField()),
+                ('queries', models.JSONField(default=list)),
+                ('profile', models.BinaryField()),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+from JobLanderAPI.operations import AlterFieldOnline
+
+
+class Migration(migrations.Migration):
+    # MySQL DDL is not transactional; the column is changed online
+    atomic = False
+
+    dependencies = [
+        ('JobLanderAPI', '0021_profilereport'),
+    ]
+
+    operations = [
+        AlterFieldOnline(
+            model_name='application',
+            name='ats_score',
+            field=models.SmallIntegerField(default=0, null=True),
+        ),
+    ]
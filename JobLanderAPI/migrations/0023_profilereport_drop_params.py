@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:05
+
+from django.db import migrations
+
+
+def drop_params(apps, schema_editor):
+    # Reports saved before the parameters stopped being logged
+    ProfileReport = apps.get_model('JobLanderAPI', 'ProfileReport')
+    for report in ProfileReport.objects.only('queries').iterator():
+        if any('params' in query for query in report.queries):
+            report.queries = [{key: value for key, value in query.items() if key != 'params'} for query in report.queries]
+            report.save(update_fields=['queries'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('JobLanderAPI', '0022_application_ats_score_null'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_params, migrations.RunPython.noop),
+    ]
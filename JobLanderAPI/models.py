@@ -1,40 +1,60 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+from django.db.models.functions import MD5
 from enum import Enum
 from django.contrib.auth.models import User
 from datetime import date
-import os
-from django.conf import settings
+from . import blobs
 
 # Create your models here.
 class CV(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    cv = models.FileField(upload_to='cvs/')
+    cv = blobs.BlobFileField(upload_to='cvs/')
     submission_date = models.DateField(default=date.today)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"CV {self.cv} for {self.user.username}"
 
-    def delete(self, *args, **kwargs):
-        # Delete the file from storage before deleting the database entry
-        if self.cv:
-            file_path = os.path.join(settings.MEDIA_ROOT, str(self.cv))
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        super().delete(*args, **kwargs)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored file name, so replacing the file does not read the row again
+        if 'cv' in field_names:
+            instance._stored_cv = instance.__dict__['cv'] or None
+        return instance
 
     def save(self, *args, **kwargs):
-        # Delete the old file if it exists and is being replaced
-        if self.pk:
-            try:
-                old_cv = CV.objects.get(pk=self.pk)
-                if old_cv.cv and old_cv.cv != self.cv:  # If the file is changing
-                    old_file_path = os.path.join(settings.MEDIA_ROOT, str(old_cv.cv))
-                    if os.path.exists(old_file_path):
-                        os.remove(old_file_path)
-            except CV.DoesNotExist:
-                pass  # If the instance doesn't exist, nothing to delete
-        
-        super().save(*args, **kwargs)
+        # Files are stored by content (see blobs.py) and each row holds one
+        # reference on its file
+        with transaction.atomic():
+            if self._state.adding:
+                previous = None
+            elif hasattr(self, '_stored_cv'):
+                previous = self._stored_cv
+            else:
+                previous = CV.objects.filter(pk=self.pk).values_list('cv', flat=True).first() or None
+            super().save(*args, **kwargs)
+            name = self.cv.name or None
+            if name != previous:
+                if name:
+                    blobs.add_ref(name)
+                if previous:
+                    blobs.release(previous)
+        self._stored_cv = self.cv.name or None
+
+
+class CVBlob(models.Model):
+    # One stored CV file, shared by the CV rows with the same content
+    name = models.CharField(max_length=100, unique=True)
+    size = models.BigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Text extracted for ATS scoring (see ats.py), null until first needed
+    text = models.TextField(null=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} references)"
 
 
 class Company(models.Model):
@@ -44,6 +64,13 @@ class Company(models.Model):
     careers_link = models.URLField(null=True, blank=True)
     linkedin_link = models.URLField(null=True, blank=True)
     description = models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_company_per_user'),
+        ]
+
     def __str__(self):
         return f"Company: {self.name}"
 
@@ -51,6 +78,14 @@ class CompanyQuestions(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     question = models.TextField()
     answer = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # TEXT columns cannot be indexed directly on MySQL, so their MD5 is indexed instead
+            models.UniqueConstraint(models.F('company'), MD5('question'), name='unique_company_question'),
+        ]
+
     def __str__(self):
         return f"Question: {self.question} for {self.company.name}"
 
@@ -69,6 +104,16 @@ class Employee(models.Model):
     job_title = models.CharField(max_length=255)
     contacted = models.CharField(max_length=255, choices=[(tag.name, tag.value) for tag in ContactStatus])
     company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'company', 'name'], name='unique_employee_per_company'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'name'], name='employee_user_name_idx'),
+        ]
+
     def __str__(self):
         return f"{self.job_title}: {self.name} works in {self.company.name}"
 
@@ -77,6 +122,12 @@ class Question(models.Model):
     question = models.TextField()
     answer = models.TextField()
     application = models.ForeignKey('Application', on_delete=models.SET_NULL, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(models.F('user'), models.F('application'), MD5('question'), name='unique_question_per_application'),
+        ]
     
     def __str__(self):
         return f"Question: {self.question}"
@@ -95,6 +146,9 @@ class Stage(Enum):
     INTERVIEW = 'Interview'
     OFFER = 'Offer'
 
+# What an application is counted under in ApplicationDailyRollup (see rollups.py)
+ROLLUP_FIELDS = ('user_id', 'submission_date', 'status', 'stage')
+
 class Application(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True)
@@ -103,21 +157,150 @@ class Application(models.Model):
     description = models.TextField()
     link = models.URLField(null=True)
     submitted_cv = models.ForeignKey(CV, on_delete=models.SET_NULL, null=True)
-    ats_score = models.SmallIntegerField(default=0)
+    # Null when the submitted CV has no readable text (see ats.py)
+    ats_score = models.SmallIntegerField(default=0, null=True)
     stage = models.CharField(max_length=255, choices=[(tag.name, tag.value) for tag in Stage])
     status = models.CharField(max_length=255, choices=[(tag.name, tag.value) for tag in ApplicationStatus])
     submission_date = models.DateField(default=date.today)
     contacted_employees = models.ManyToManyField(Employee,blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'submission_date'], name='application_user_date_idx'),
+            models.Index(fields=['user', 'status'], name='application_user_status_idx'),
+            models.Index(fields=['user', 'company'], name='application_user_company_idx'),
+        ]
 
     def __str__(self):
         return f"{self.job_title} at {self.company.name} is {self.status}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What ats_score was computed from, so saves that change neither skip
+        # rescoring (see ats.py)
+        if 'description' in field_names and 'submitted_cv_id' in field_names:
+            instance._ats_inputs = (instance.description, instance.submitted_cv_id)
+        # The rollup bucket the row is counted in, so saves need not read it
+        if all(name in field_names for name in ROLLUP_FIELDS):
+            instance._rollup_key = tuple(getattr(instance, name) for name in ROLLUP_FIELDS)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The rollup counters are updated by the save signals (see
+        # signals.py) and must commit or roll back with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
     
 class TodoList(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     application_title = models.TextField()
     application_link = models.URLField(null=True, blank=True)
     completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(models.F('user'), MD5('application_title'), name='unique_todo_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'completed'], name='todo_user_completed_idx'),
+        ]
+
     def __str__(self):
         return f"ToDo: {self.application_title} for {self.user.username}"
 
 
+
+class ApplicationDailyRollup(models.Model):
+    # Application counts per user, submission day, status and stage, kept
+    # in step with Application writes (see rollups.py)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    status = models.CharField(max_length=255, choices=[(tag.name, tag.value) for tag in ApplicationStatus])
+    stage = models.CharField(max_length=255, choices=[(tag.name, tag.value) for tag in Stage])
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'status', 'stage'], name='unique_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.count} {self.status}/{self.stage} applications on {self.day} for {self.user_id}"
+
+class SearchToken(models.Model):
+    # Per-user inverted index used by the "index" search backend (see search.py)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    field = models.CharField(max_length=64)
+    token = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'kind', 'token'], name='searchtoken_user_token_idx'),
+            models.Index(fields=['kind', 'object_id'], name='searchtoken_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.token} in {self.kind} {self.object_id}"
+
+
+class TaskState(Enum):
+    PENDING = 'Pending'
+    RUNNING = 'Running'
+    FAILED = 'Failed'
+
+class Task(models.Model):
+    # A job queued with tasks.enqueue() for `manage.py runworkers`; deleted
+    # once it succeeds, kept as FAILED after its last attempt
+    name = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    # At most one task per key waits to run; the key is cleared when it starts
+    dedup_key = models.CharField(max_length=255, null=True, unique=True)
+    state = models.CharField(max_length=16, choices=[(tag.name, tag.value) for tag in TaskState], default=TaskState.PENDING.name)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_at = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['state', 'run_after'], name='task_state_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name}{tuple(self.args)} is {self.state}"
+
+
+class ProfileTrigger(Enum):
+    REQUESTED = 'Requested'
+    SAMPLED = 'Sampled'
+
+class ProfileReport(models.Model):
+    # One profiled request (see profiling.py); only the newest
+    # PROFILE_REPORTS_KEPT are kept
+    created_at = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    trigger = models.CharField(max_length=16, choices=[(tag.name, tag.value) for tag in ProfileTrigger])
+    view_name = models.CharField(max_length=255)
+    method = models.CharField(max_length=16)
+    path = models.TextField()
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    db_ms = models.FloatField()
+    # pstats text sorted by cumulative time, the statements with their
+    # timings, and the marshalled pstats data written by the .prof download
+    stats = models.TextField()
+    queries = models.JSONField(default=list)
+    profile = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.method} {self.view_name} at {self.created_at:%Y-%m-%d %H:%M:%S} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,88 @@
+# operations.py
+# Migration operations that change the schema without blocking writes on MySQL.
+from django.db import migrations
+
+
+class OnlineSchemaMixin:
+    """
+    On MySQL the generated DDL is executed with ALGORITHM=INPLACE, LOCK=NONE,
+    so InnoDB keeps accepting reads and writes while the index is built and
+    the statement fails instead of silently falling back to a table copy.
+    Other backends run the operation unchanged.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'mysql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+        execute = schema_editor.execute
+
+        def execute_online(sql, params=()):
+            sql = str(sql)
+            if sql.startswith('ALTER TABLE'):
+                sql += ', ALGORITHM=INPLACE, LOCK=NONE'
+            elif sql.startswith('CREATE'):
+                sql += ' ALGORITHM=INPLACE LOCK=NONE'
+            return execute(sql, params)
+
+        schema_editor.execute = execute_online
+        try:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        finally:
+            del schema_editor.execute
+
+
+class AddIndexOnline(OnlineSchemaMixin, migrations.AddIndex):
+    pass
+
+
+class AddConstraintOnline(OnlineSchemaMixin, migrations.AddConstraint):
+    pass
+
+
+class AddFullTextIndex(migrations.operations.base.Operation):
+    """
+    FULLTEXT index used by the "fulltext" search backend. MySQL only, and not
+    part of the model state since Django has no FULLTEXT index type. InnoDB
+    adds a hidden FTS_DOC_ID column for the first FULLTEXT index on a table,
+    which needs a rebuild, so MySQL chooses the algorithm here.
+    """
+    reduces_to_sql = True
+    reversible = True
+
+    def __init__(self, model_name, fields, name):
+        self.model_name = model_name
+        self.fields = fields
+        self.name = name
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'mysql':
+            return
+        model = to_state.apps.get_model(app_label, self.model_name)
+        quote = schema_editor.quote_name
+        columns = ', '.join(quote(model._meta.get_field(field).column) for field in self.fields)
+        schema_editor.execute(f'CREATE FULLTEXT INDEX {quote(self.name)} ON {quote(model._meta.db_table)} ({columns})')
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'mysql':
+            return
+        model = from_state.apps.get_model(app_label, self.model_name)
+        quote = schema_editor.quote_name
+        schema_editor.execute(f'DROP INDEX {quote(self.name)} ON {quote(model._meta.db_table)}')
+
+    def describe(self):
+        return f"Create FULLTEXT index {self.name} on {self.model_name} ({', '.join(self.fields)}) on MySQL"
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {'model_name': self.model_name, 'fields': self.fields, 'name': self.name}
+
+
+class AddFieldOnline(OnlineSchemaMixin, migrations.AddField):
+    pass
+
+
+class AlterFieldOnline(OnlineSchemaMixin, migrations.AlterField):
+    pass
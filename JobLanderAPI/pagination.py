@@ -1,21 +1,200 @@
 # pagination.py
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import F, Q
+import base64
+import json
 import math
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = 5  # Default page size
     page_size_query_param = 'page_size'  # Allows overriding via query params
     max_page_size = 10
+    cursor_query_param = 'cursor'  # Opt-in keyset pagination, e.g. ?cursor= for the first page
+    count_query_param = 'count'  # ?count=true adds the total to cursor pages
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_cursor_mode(request, view):
+            return super().paginate_queryset(queryset, request, view)
+        queryset, counted = self.get_cursor_queryset(queryset, request, view)
+        self.count = counted.count() if counted is not None else None
+        return self.set_cursor_page(list(queryset[:self.page_size_value + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() with the async ORM, for the async views."""
+        if self.is_cursor_mode(request, view):
+            queryset, counted = self.get_cursor_queryset(queryset, request, view)
+            self.count = await counted.acount() if counted is not None else None
+            return self.set_cursor_page([obj async for obj in queryset[:self.page_size_value + 1]])
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property, filled here so page() does not query
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def is_cursor_mode(self, request, view):
+        self.cursor_mode = (
+            getattr(view, 'cursor_pagination', False)
+            and self.cursor_query_param in request.query_params
+        )
+        return self.cursor_mode
+
+    def get_cursor_queryset(self, queryset, request, view):
+        """The ordered and filtered queryset of the cursor page, and the one to count (None unless ?count=)."""
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        self.ordering_field, self.descending = self.get_cursor_ordering(request, view)
+        self.nullable = self.is_nullable(queryset.model, self.ordering_field)
+        self.position, self.reverse = self.decode_cursor(request, queryset.model)
+
+        counted = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            counted = queryset
+
+        # Walking backwards flips the ordering, then the page is flipped back
+        descending = self.descending != self.reverse
+        queryset = queryset.order_by(*self.get_order_by(descending))
+        if self.position is not None:
+            queryset = queryset.filter(self.get_position_filter(self.position, descending))
+        return queryset, counted
+
+    def set_cursor_page(self, results):
+        # One row past the page tells whether there is more
+        has_more = len(results) > self.page_size_value
+        results = results[:self.page_size_value]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+
+        self.page_results = results
+        return results
 
     def get_paginated_response(self, data):
+        if self.cursor_mode:
+            total_pages = None
+            if self.count is not None:
+                total_pages = math.ceil(self.count / self.page_size_value)
+            return Response({
+                'count': self.count,                      # Only counted when ?count=true
+                'next': self.get_next_cursor_link(),
+                'previous': self.get_previous_cursor_link(),
+                'total_pages': total_pages,
+                'results': data
+            })
+
         size = self.get_page_size(self.request)
-        total_pages = math.ceil(self.page.paginator.count / size)
-        
+        count = self.page.paginator.count
+        total_pages = math.ceil(count / size)
+
         return Response({
-            'count': self.page.paginator.count,  # Total number of items
+            'count': count,                      # Total number of items
             'next': self.get_next_link(),        # Link to next page
             'previous': self.get_previous_link(),# Link to previous page
             'total_pages': total_pages,          # Total pages
             'results': data                      # Data of current page
-        })
\ No newline at end of file
+        })
+
+    def get_cursor_ordering(self, request, view):
+        # Keyed on the view's requested ordering field (see OrderingFilter) plus id
+        ordering_fields = getattr(view, 'ordering_fields', None) or ['id']
+        for param in request.query_params.get('ordering', '').split(','):
+            param = param.strip()
+            if param.lstrip('-') in ordering_fields:
+                return param.lstrip('-'), param.startswith('-')
+        return ordering_fields[0], False
+
+    def is_nullable(self, model, path):
+        for name in path.split('__'):
+            field = model._meta.get_field(name)
+            if field.null:
+                return True
+            model = field.related_model
+        return False
+
+    def get_order_by(self, descending):
+        field = F(self.ordering_field)
+        if descending:
+            return [field.desc(nulls_last=True), '-id']
+        return [field.asc(nulls_first=True), 'id']
+
+    def get_position_filter(self, position, descending):
+        # NULLs sort as the smallest value in both directions
+        value, pk = position
+        name = self.ordering_field
+        if descending:
+            if value is None:
+                return Q(**{f'{name}__isnull': True, 'id__lt': pk})
+            condition = Q(**{f'{name}__lt': value}) | Q(**{name: value, 'id__lt': pk})
+            if self.nullable:
+                condition |= Q(**{f'{name}__isnull': True})
+            return condition
+        if value is None:
+            return Q(**{f'{name}__isnull': True, 'id__gt': pk}) | Q(**{f'{name}__isnull': False})
+        return Q(**{f'{name}__gt': value}) | Q(**{name: value, 'id__gt': pk})
+
+    def get_position(self, obj):
+        value = obj
+        for name in self.ordering_field.split('__'):
+            value = getattr(value, name, None) if value is not None else None
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        return value, obj.pk
+
+    def get_field(self, model, path):
+        for name in path.split('__'):
+            field = model._meta.get_field(name)
+            model = field.related_model
+        return field
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            value = cursor['v']
+            # Lists and objects would reach the filter as lookups of their own
+            if value is not None and not isinstance(value, (str, int, float)):
+                raise ValueError('Cursor values are scalars')
+            if value is not None:
+                self.get_field(model, self.ordering_field).to_python(value)
+            return (value, int(cursor['id'])), bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position, reverse):
+        cursor = {'v': position[0], 'id': position[1]}
+        if reverse:
+            cursor['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode('ascii')
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_cursor_link(self):
+        if not self.has_next or not self.page_results:
+            return None
+        return self.encode_cursor(self.get_position(self.page_results[-1]), reverse=False)
+
+    def get_previous_cursor_link(self):
+        if not self.has_previous or not self.page_results:
+            return None
+        return self.encode_cursor(self.get_position(self.page_results[0]), reverse=True)
@@ -0,0 +1,166 @@
+# profiling.py
+# Profiles single requests in place (see ProfilerMiddleware). A staff user
+# asks for it with an "X-Profile: 1" header or ?profile=1 on any request,
+# and PROFILE_SAMPLE_RATE profiles that share of all requests. The request
+# runs under cProfile while its SQL statements are logged with their
+# timings by the query wrapper of metrics.py, without their parameters,
+# which hold user data such as password hashes and tokens. It is saved as a
+# ProfileReport: the admin lists them and downloads the .prof file (for
+# snakeviz or pstats) or a text report. Only the newest
+# PROFILE_REPORTS_KEPT reports are kept.
+#
+# A requested profile only starts once the user is known to be staff, from
+# the session or, as the views only authenticate JWTs later, from the
+# token itself; anyone else's flag is ignored. cProfile sees the thread it
+# runs in: under ASGI that is the event loop, including whatever else it
+# runs meanwhile, and not the ORM calls made in threads, whose SQL is still
+# logged. A process profiles one request at a time.
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from . import metrics
+from .authentication import CachedJWTAuthentication
+from .models import ProfileReport, ProfileTrigger
+
+HEADER = 'X-Profile'
+QUERY_PARAMETER = 'profile'
+FLAG_VALUES = {'1', 'true'}
+STATS_LIMIT = 80
+MAX_STATEMENTS = 1000
+
+active = threading.Lock()
+
+
+def requested(request):
+    return request.headers.get(HEADER, '').lower() in FLAG_VALUES or \
+        request.GET.get(QUERY_PARAMETER, '').lower() in FLAG_VALUES
+
+
+def sampled():
+    return bool(settings.PROFILE_SAMPLE_RATE) and random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+def staff_user(request):
+    """The active staff user sending the request, from the session or a JWT, else None."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            user_auth = CachedJWTAuthentication().authenticate(request)
+        except (AuthenticationFailed, InvalidToken):
+            return None
+        user = user_auth[0] if user_auth is not None else None
+    return user if user is not None and user.is_active and user.is_staff else None
+
+
+def get_trigger(request):
+    """(trigger, staff user who asked) of a request to profile, or (None, None)."""
+    if requested(request):
+        user = staff_user(request)
+        if user is not None:
+            return ProfileTrigger.REQUESTED, user
+    if sampled():
+        return ProfileTrigger.SAMPLED, None
+    return None, None
+
+
+async def aget_trigger(request):
+    if requested(request):
+        # The session and token users are loaded from the cache or database
+        user = await sync_to_async(staff_user)(request)
+        if user is not None:
+            return ProfileTrigger.REQUESTED, user
+    if sampled():
+        return ProfileTrigger.SAMPLED, None
+    return None, None
+
+
+class RequestProfile:
+
+    def __init__(self, trigger, user=None):
+        self.trigger = trigger
+        self.user = user
+        self.profiler = cProfile.Profile()
+        self.token = None
+
+    def start(self):
+        """False when another request of this process is being profiled."""
+        if not active.acquire(blocking=False):
+            return False
+        # Statements are logged in the request's metrics record, MetricsMiddleware's if installed
+        self.record = metrics.current.get()
+        if self.record is None:
+            self.record = metrics.RequestMetrics()
+            self.token = metrics.current.set(self.record)
+        self.record.statements = []
+        self.start_time = time.perf_counter()
+        self.profiler.enable()
+        return True
+
+    def stop(self):
+        self.profiler.disable()
+        self.duration = time.perf_counter() - self.start_time
+        self.statements, self.record.statements = self.record.statements, None
+        if self.token is not None:
+            metrics.current.reset(self.token)
+        active.release()
+
+    def save(self, request, response):
+        user = self.user or getattr(request, 'user', None)
+        if not (user and user.is_authenticated):
+            user = None
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(STATS_LIMIT)
+        report = ProfileReport.objects.create(
+            user=user,
+            trigger=self.trigger.name,
+            view_name=metrics.view_name(request),
+            method=request.method,
+            path=request.get_full_path(),
+            status_code=response.status_code,
+            duration_ms=round(self.duration * 1000, 3),
+            query_count=len(self.statements),
+            db_ms=round(sum(statement[2] for statement in self.statements) * 1000, 3),
+            stats=stream.getvalue(),
+            queries=[{
+                'sql': sql,
+                'many': many,
+                'ms': round(seconds * 1000, 3),
+            } for sql, many, seconds in self.statements[:MAX_STATEMENTS]],
+            # What pstats.Stats.dump_stats() writes
+            profile=marshal.dumps(stats.stats),
+        )
+        prune()
+        return report
+
+
+def prune():
+    kept = settings.PROFILE_REPORTS_KEPT
+    cutoff = list(ProfileReport.objects.order_by('-pk').values_list('pk', flat=True)[kept:kept + 1])
+    if cutoff:
+        ProfileReport.objects.filter(pk__lte=cutoff[0]).delete()
+
+
+def report_text(report):
+    lines = [
+        f'{report.method} {report.path} ({report.view_name}) -> {report.status_code}',
+        f'{report.duration_ms:.1f} ms under the profiler, {report.query_count} queries in {report.db_ms:.1f} ms',
+        f'{ProfileTrigger[report.trigger].value} at {report.created_at.isoformat()} by {report.user or "anonymous"}',
+        '',
+        'SQL',
+    ]
+    for query in report.queries:
+        lines.append(f"{query['ms']:10.3f} ms  {'executemany ' if query['many'] else ''}{query['sql']}")
+    if report.query_count > len(report.queries):
+        lines.append(f'... {report.query_count - len(report.queries)} more')
+    lines += ['', 'Profile', report.stats]
+    return '\n'.join(lines)
@@ -0,0 +1,127 @@
+# rollups.py
+# Keeps ApplicationDailyRollup in step with Application writes. Every change
+# is expressed as +1/-1 deltas on (user, day, status, stage) buckets and
+# applied with F() expressions in the writer's transaction, so concurrent
+# writers never lose counts.
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import ROLLUP_FIELDS, Application, ApplicationDailyRollup
+
+# The same key on ApplicationDailyRollup
+BUCKET_FIELDS = ('user_id', 'day', 'status', 'stage')
+REBUILD_BATCH_SIZE = 1000
+APPLY_BATCH_SIZE = 500
+
+
+def rollup_key(values):
+    return tuple(values[field] for field in ROLLUP_FIELDS)
+
+
+def instance_key(instance, previous=None):
+    previous = previous or {}
+    return tuple(previous.get(field, getattr(instance, field)) for field in ROLLUP_FIELDS)
+
+
+def apply_delta(key, delta):
+    bucket = ApplicationDailyRollup.objects.filter(**dict(zip(BUCKET_FIELDS, key)))
+    if bucket.update(count=F('count') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            ApplicationDailyRollup.objects.create(**dict(zip(BUCKET_FIELDS, key)), count=delta)
+    except IntegrityError:
+        # Another writer created the bucket in the meantime
+        bucket.update(count=F('count') + delta)
+
+
+def apply_batch(keys, deltas):
+    # Reads every bucket of the batch's users and days, a superset of the keys
+    # that the unique index serves as a range. The lock keeps the cleanup in
+    # apply_deltas, run by other transactions, from deleting a bucket between
+    # this read and the UPDATE.
+    rows = ApplicationDailyRollup.objects.select_for_update().filter(
+        user_id__in={key[0] for key in keys}, day__in={key[1] for key in keys},
+    ).values_list('pk', *BUCKET_FIELDS)
+    existing = {tuple(row[1:]): row[0] for row in rows}
+    by_delta = {}
+    for key in keys:
+        if key in existing:
+            by_delta.setdefault(deltas[key], []).append(existing[key])
+    for delta, pks in by_delta.items():
+        ApplicationDailyRollup.objects.filter(pk__in=pks).update(count=F('count') + delta)
+    new = [key for key in keys if key not in existing and deltas[key] > 0]
+    if not new:
+        return
+    try:
+        with transaction.atomic():
+            ApplicationDailyRollup.objects.bulk_create([
+                ApplicationDailyRollup(**dict(zip(BUCKET_FIELDS, key)), count=deltas[key]) for key in new
+            ])
+    except IntegrityError:
+        # Another writer created some of the buckets in the meantime
+        for key in new:
+            apply_delta(key, deltas[key])
+
+
+def apply_deltas(deltas):
+    """
+    Apply {bucket key: delta}. Bulk writes touch many buckets: those are read
+    and locked with one query per batch of keys, then existing buckets get one
+    UPDATE by primary key per distinct delta and missing ones a bulk INSERT.
+    """
+    keys = [key for key, delta in deltas.items() if delta]
+    if len(keys) <= 2:
+        # A single row write moves at most two buckets and needs no extra read
+        for key in keys:
+            apply_delta(key, deltas[key])
+    else:
+        with transaction.atomic():
+            for start in range(0, len(keys), APPLY_BATCH_SIZE):
+                apply_batch(keys[start:start + APPLY_BATCH_SIZE], deltas)
+    ApplicationDailyRollup.objects.filter(
+        user_id__in={key[0] for key in keys if deltas[key] < 0}, count__lte=0,
+    ).delete()
+
+
+def saved_deltas(old_key, new_key):
+    deltas = Counter()
+    if old_key != new_key:
+        if old_key is not None:
+            deltas[old_key] -= 1
+        deltas[new_key] += 1
+    return deltas
+
+
+def load_previous_key(instance):
+    """
+    The bucket the row is counted in right now, None for new rows. Rows
+    loaded with their rollup fields and rows saved before carry it (see
+    Application.from_db()); others are read.
+    """
+    if instance._state.adding or instance.pk is None:
+        return None
+    if hasattr(instance, '_rollup_key'):
+        return instance._rollup_key
+    values = Application.objects.filter(pk=instance.pk).values(*ROLLUP_FIELDS).first()
+    return rollup_key(values) if values else None
+
+
+def rebuild_rollups(user=None):
+    """Recount every bucket from Application, optionally for one user. Returns the bucket count."""
+    stale = ApplicationDailyRollup.objects.all()
+    applications = Application.objects.all()
+    if user is not None:
+        stale = stale.filter(user=user)
+        applications = applications.filter(user=user)
+    stale.delete()
+    buckets = applications.values(*ROLLUP_FIELDS).annotate(total=Count('id')).order_by()
+    rows = [
+        ApplicationDailyRollup(user_id=row['user_id'], day=row['submission_date'], status=row['status'],
+                               stage=row['stage'], count=row['total'])
+        for row in buckets.iterator(chunk_size=REBUILD_BATCH_SIZE)
+    ]
+    ApplicationDailyRollup.objects.bulk_create(rows, batch_size=REBUILD_BATCH_SIZE)
+    return len(rows)
@@ -0,0 +1,256 @@
+# search.py
+# Search backends behind the ?search= parameter. "index" keeps a per-user
+# inverted index in SearchToken (works everywhere, including SQLite),
+# "fulltext" uses MySQL FULLTEXT indexes and "like" is DRF's icontains scan.
+from collections import Counter
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Func, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan
+from rest_framework.filters import SearchFilter
+
+# Text fields kept in the index, and the path from each model to its owner
+INDEXED_FIELDS = {
+    'application': ['job_title', 'status'],
+    'company': ['name', 'location'],
+    'companyquestions': ['question'],
+    'employee': ['name', 'job_title', 'contacted'],
+    'question': ['question'],
+    'todolist': ['application_title'],
+}
+OWNER_PATHS = {
+    'companyquestions': 'company__user_id',
+}
+MAX_TOKEN_LENGTH = 64
+INDEX_BATCH_SIZE = 2000
+# MySQL ignores words shorter than innodb_ft_min_token_size (3 by default)
+# and the words of INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD, so a term
+# with one of them would match nothing; such searches use icontains
+FULLTEXT_MIN_TOKEN_SIZE = 3
+FULLTEXT_STOPWORDS = frozenset('''
+    a about an are as at be by com de en for from how i in is it la of on or
+    that the this to was what when where who will with und www
+'''.split())
+
+
+def tokenize(text):
+    return [token[:MAX_TOKEN_LENGTH] for token in re.findall(r'\w+', str(text or '').lower())]
+
+
+def indexed_models():
+    return [apps.get_model('JobLanderAPI', name) for name in INDEXED_FIELDS]
+
+
+def owner_id(obj):
+    value = obj
+    for name in OWNER_PATHS.get(obj._meta.model_name, 'user_id').split('__'):
+        if name.endswith('_id') and name != 'user_id':
+            name = name[:-3]
+        value = getattr(value, name, None) if value is not None else None
+    return value
+
+
+def build_tokens(kind, object_id, user_id, values):
+    SearchToken = apps.get_model('JobLanderAPI', 'SearchToken')
+    return [
+        SearchToken(user_id=user_id, kind=kind, object_id=object_id, field=field, token=token, weight=weight)
+        for field, text in values.items()
+        for token, weight in Counter(tokenize(text)).items()
+    ]
+
+
+def index_objects(model, objs, created=False):
+    kind = model._meta.model_name
+    if kind not in INDEXED_FIELDS or not get_search_backend().maintains_index:
+        return
+    SearchToken = apps.get_model('JobLanderAPI', 'SearchToken')
+    tokens = []
+    for obj in objs:
+        user_id = owner_id(obj)
+        if user_id is not None:
+            tokens += build_tokens(kind, obj.pk, user_id, {field: getattr(obj, field) for field in INDEXED_FIELDS[kind]})
+    if not created:
+        SearchToken.objects.filter(kind=kind, object_id__in=[obj.pk for obj in objs]).delete()
+    SearchToken.objects.bulk_create(tokens, batch_size=INDEX_BATCH_SIZE)
+
+
+def unindex_objects(model, pks):
+    kind = model._meta.model_name
+    if kind in INDEXED_FIELDS and get_search_backend().maintains_index:
+        apps.get_model('JobLanderAPI', 'SearchToken').objects.filter(kind=kind, object_id__in=pks).delete()
+
+
+def rebuild_index(user=None):
+    """Re-create every SearchToken row, optionally for one user only. Returns the row count."""
+    SearchToken = apps.get_model('JobLanderAPI', 'SearchToken')
+    stale = SearchToken.objects.all()
+    if user is not None:
+        stale = stale.filter(user=user)
+    stale.delete()
+    created = 0
+    for model in indexed_models():
+        kind = model._meta.model_name
+        owner = OWNER_PATHS.get(kind, 'user_id')
+        rows = model.objects.all()
+        if user is not None:
+            rows = rows.filter(**{owner: user.pk})
+        tokens = []
+        for row in rows.values('pk', owner, *INDEXED_FIELDS[kind]).iterator(chunk_size=INDEX_BATCH_SIZE):
+            tokens += build_tokens(kind, row['pk'], row[owner], {field: row[field] for field in INDEXED_FIELDS[kind]})
+            if len(tokens) >= INDEX_BATCH_SIZE:
+                SearchToken.objects.bulk_create(tokens, batch_size=INDEX_BATCH_SIZE)
+                created += len(tokens)
+                tokens = []
+        SearchToken.objects.bulk_create(tokens, batch_size=INDEX_BATCH_SIZE)
+        created += len(tokens)
+    return created
+
+
+def token_range(token):
+    # A range instead of LIKE 'token%' so SQLite can use the index as well
+    return Q(token__gte=token, token__lt=token[:-1] + chr(ord(token[-1]) + 1))
+
+
+def group_search_fields(model, search_fields):
+    """Split 'application__company__name' style paths into {relation prefix: (model, [fields])}."""
+    groups = {}
+    for path in search_fields:
+        *relations, field = path.split('__')
+        target = model
+        for name in relations:
+            target = target._meta.get_field(name).related_model
+        prefix = '__'.join(relations)
+        groups.setdefault(prefix, (target, []))[1].append(field)
+    return groups
+
+
+def fields_indexed(model, search_fields):
+    return all(
+        target._meta.model_name in INDEXED_FIELDS and set(fields) <= set(INDEXED_FIELDS[target._meta.model_name])
+        for target, fields in group_search_fields(model, search_fields).values()
+    )
+
+
+def pk_lookup(prefix):
+    return f'{prefix}__pk__in' if prefix else 'pk__in'
+
+
+class LikeSearchBackend:
+    maintains_index = False
+
+    def supports(self, model, search_fields, terms):
+        return False
+
+
+class InvertedIndexSearchBackend:
+    maintains_index = True
+
+    def supports(self, model, search_fields, terms):
+        return fields_indexed(model, search_fields) and all(tokenize(term) for term in terms)
+
+    def token_query(self, user, kind, fields, token):
+        SearchToken = apps.get_model('JobLanderAPI', 'SearchToken')
+        return SearchToken.objects.filter(token_range(token), user=user, kind=kind, field__in=fields)
+
+    def search(self, queryset, search_fields, terms, user, rank):
+        groups = group_search_fields(queryset.model, search_fields)
+        tokens = [token for term in terms for token in tokenize(term)]
+        for token in tokens:
+            # One UNION of matching ids per term lets the database start from
+            # the token index instead of testing every row of the user
+            matches = []
+            for prefix, (target, fields) in groups.items():
+                ids = self.token_query(user, target._meta.model_name, fields, token).values('object_id')
+                if prefix:
+                    ids = queryset.model.objects.filter(**{pk_lookup(prefix): ids}).values('pk')
+                matches.append(ids)
+            queryset = queryset.filter(pk__in=matches[0].union(*matches[1:]))
+        if rank and '' in groups:
+            fields = groups[''][1]
+            SearchToken = apps.get_model('JobLanderAPI', 'SearchToken')
+            # Keyed on (kind, object_id) only, so each row reads just its own tokens
+            matching = Q(*[token_range(token) for token in tokens], _connector=Q.OR)
+            scores = SearchToken.objects.filter(kind=queryset.model._meta.model_name, object_id=OuterRef('pk'))
+            scores = scores.values('object_id').annotate(
+                score=Sum('weight', filter=matching & Q(field__in=fields))
+            ).values('score')
+            queryset = queryset.annotate(
+                search_rank=Coalesce(Subquery(scores, output_field=IntegerField()), 0)
+            ).order_by('-search_rank', 'pk')
+        return queryset
+
+
+class MatchAgainst(Func):
+    output_field = FloatField()
+
+    def __init__(self, column, query):
+        super().__init__(column)
+        self.query = query
+
+    def as_sql(self, compiler, connection, **extra_context):
+        column_sql, params = compiler.compile(self.get_source_expressions()[0])
+        return f'MATCH ({column_sql}) AGAINST (%s IN BOOLEAN MODE)', (*params, self.query)
+
+
+class FullTextSearchBackend:
+    # Like the inverted index, terms match the start of words, where
+    # icontains also matches within them
+    maintains_index = False
+
+    def supports(self, model, search_fields, terms):
+        tokens = [tokenize(term) for term in terms]
+        return fields_indexed(model, search_fields) and all(tokens) and all(
+            len(token) >= FULLTEXT_MIN_TOKEN_SIZE and token not in FULLTEXT_STOPWORDS
+            for term_tokens in tokens for token in term_tokens
+        )
+
+    def search(self, queryset, search_fields, terms, user, rank):
+        tokens = [token for term in terms for token in tokenize(term)]
+        for token in tokens:
+            condition = Q()
+            for path in search_fields:
+                condition |= Q(GreaterThan(MatchAgainst(path, f'{token}*'), 0))
+            queryset = queryset.filter(condition)
+        own_fields = [path for path in search_fields if '__' not in path]
+        if rank and own_fields:
+            query = ' '.join(f'{token}*' for token in tokens)
+            score = sum((MatchAgainst(path, query) for path in own_fields[1:]), MatchAgainst(own_fields[0], query))
+            queryset = queryset.annotate(search_rank=score).order_by('-search_rank', 'pk')
+        return queryset
+
+
+BACKENDS = {
+    'like': LikeSearchBackend,
+    'index': InvertedIndexSearchBackend,
+    'fulltext': FullTextSearchBackend,
+}
+
+
+def get_search_backend():
+    name = getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        name = 'fulltext' if connection.vendor == 'mysql' else 'index'
+    return BACKENDS[name]()
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    Drop-in replacement for SearchFilter. Results are ranked by relevance
+    unless the client asked for an explicit ?ordering=. Views whose search
+    fields are not indexed keep the icontains behaviour.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        terms = self.get_search_terms(request)
+        if not search_fields or not terms or not request.user.is_authenticated:
+            return super().filter_queryset(request, queryset, view)
+        backend = get_search_backend()
+        if not backend.supports(queryset.model, search_fields, terms):
+            return super().filter_queryset(request, queryset, view)
+        rank = not request.query_params.get('ordering')
+        return backend.search(queryset, search_fields, terms, request.user, rank)
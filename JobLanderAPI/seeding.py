@@ -0,0 +1,233 @@
+# seeding.py
+# Synthetic data for scale tests, written by `manage.py seed_load`. A user's
+# rows come from a random generator seeded with the run's seed and the
+# user's number, so the data does not depend on which worker process builds
+# it or when. Volumes are skewed like real accounts: a few users hold most
+# of the applications, a few companies most of a user's applications, most
+# applications are recent, and most are still pending or were rejected at
+# an early stage. Rows are bulk inserted in batches without signals; the
+# rollups (and the search index, if the backend keeps one) are rebuilt per
+# user afterwards.
+from datetime import timedelta
+from itertools import accumulate, islice
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import (Application, ApplicationStatus, Company, CompanyQuestions, ContactStatus, Employee, Question,
+                     Stage, TodoList)
+from .rollups import rebuild_rollups
+from .search import get_search_backend, rebuild_index
+
+PASSWORD = 'seed-password'
+# Spread of the applications per user (lognormal), and of a user's
+# applications over their companies (Zipf)
+USER_SIGMA = 1.0
+COMPANY_EXPONENT = 1.1
+APPLICATIONS_PER_COMPANY = (3, 8)
+# Days before today, exponential with this mean and cut at two years
+SUBMISSION_MEAN_DAYS = 150
+SUBMISSION_MAX_DAYS = 729
+QUESTION_SHARE = 0.3
+CONTACTED_SHARE = 0.3
+TODO_SHARE = 0.1
+
+STATUS_WEIGHTS = {
+    ApplicationStatus.PENDING: 45,
+    ApplicationStatus.REJECTED: 35,
+    ApplicationStatus.ASSESSMENT: 8,
+    ApplicationStatus.INTERVIEW: 9,
+    ApplicationStatus.ACCEPTED: 3,
+}
+# Stage reached, given the status
+STAGE_WEIGHTS = {
+    ApplicationStatus.PENDING: {Stage.APPLIED: 80, Stage.PHONE_SCREEN: 12, Stage.ASSESSMENT: 5, Stage.INTERVIEW: 3},
+    ApplicationStatus.REJECTED: {Stage.APPLIED: 60, Stage.PHONE_SCREEN: 20, Stage.ASSESSMENT: 10, Stage.INTERVIEW: 10},
+    ApplicationStatus.ASSESSMENT: {Stage.ASSESSMENT: 1},
+    ApplicationStatus.INTERVIEW: {Stage.PHONE_SCREEN: 30, Stage.INTERVIEW: 70},
+    ApplicationStatus.ACCEPTED: {Stage.OFFER: 1},
+}
+CONTACT_WEIGHTS = {
+    ContactStatus.SENT: 40,
+    ContactStatus.ACCEPTED: 25,
+    ContactStatus.MESSAGED: 20,
+    ContactStatus.REPLIED: 10,
+    ContactStatus.STRONG_CONNECTION: 5,
+}
+JOB_TYPE_WEIGHTS = {'Full-time': 70, 'Contract': 12, 'Internship': 10, 'Part-time': 8}
+EMPLOYEES_PER_COMPANY = {0: 45, 1: 30, 2: 15, 3: 7, 5: 3}
+COMPANY_QUESTIONS_PER_COMPANY = {0: 60, 1: 25, 2: 10, 3: 5}
+QUESTIONS_PER_APPLICATION = {1: 6, 2: 3, 3: 1}
+CONTACTS_PER_APPLICATION = {1: 7, 2: 3}
+
+JOB_TITLES = ['Backend Engineer', 'Frontend Engineer', 'Full Stack Developer', 'Data Analyst', 'Data Engineer',
+              'DevOps Engineer', 'Site Reliability Engineer', 'Product Manager', 'QA Engineer',
+              'Machine Learning Engineer', 'Mobile Developer', 'Security Engineer', 'Engineering Manager']
+SENIORITY = ['', '', 'Junior ', 'Senior ', 'Lead ']
+SKILLS = ['python', 'django', 'react', 'sql', 'aws', 'docker', 'kubernetes', 'typescript', 'go', 'java', 'rest',
+          'graphql', 'postgresql', 'mysql', 'redis', 'terraform', 'linux', 'ci/cd', 'spark', 'airflow']
+COMPANY_WORDS = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Vandelay', 'Stark', 'Wayne', 'Cyberdyne', 'Soylent',
+                 'Tyrell', 'Wonka', 'Aperture', 'Black Mesa', 'Gringotts', 'Oscorp', 'Pied Piper', 'Dunder',
+                 'Monarch', 'Nakatomi']
+COMPANY_SUFFIXES = ['Labs', 'Systems', 'Technologies', 'Group', 'Software', 'Analytics', 'Cloud', 'Digital',
+                    'Solutions', 'Networks']
+LOCATIONS = {'Remote': 30, 'Cairo': 15, 'London': 12, 'Berlin': 10, 'New York': 10, 'Dubai': 8, 'Amsterdam': 6,
+             'Toronto': 5, 'Singapore': 4}
+FIRST_NAMES = ['Ahmed', 'Sara', 'Omar', 'Mona', 'John', 'Emma', 'Liam', 'Olivia', 'Noah', 'Ava', 'Youssef', 'Nour',
+               'Lucas', 'Mia', 'Karim', 'Hana']
+LAST_NAMES = ['Hassan', 'Smith', 'Ali', 'Johnson', 'Mahmoud', 'Brown', 'Ibrahim', 'Garcia', 'Mostafa', 'Miller',
+              'Khaled', 'Davis', 'Said', 'Wilson']
+TITLES = ['Recruiter', 'Talent Partner', 'Engineering Manager', 'Software Engineer', 'HR Specialist', 'CTO']
+QUESTIONS = ['Why do you want to work here?', 'Describe a challenging project.', 'What are your salary expectations?',
+             'When can you start?', 'Tell us about a conflict in your team.', 'Why are you leaving your current job?',
+             'What is your greatest strength?', 'Where do you see yourself in five years?',
+             'Describe a time you failed.', 'Do you need visa sponsorship?']
+
+
+def weighted(rng, weights, k):
+    """k choices from a {value: weight} dict."""
+    return rng.choices(list(weights), weights=list(weights.values()), k=k)
+
+
+def distribute(total, users, seed):
+    """Applications per user, lognormally skewed and summing to total."""
+    rng = random.Random(seed)
+    weights = [rng.lognormvariate(0, USER_SIGMA) for _ in range(users)]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    # The largest remainders take what rounding down left over
+    by_remainder = sorted(range(users), key=lambda index: counts[index] - weights[index] * scale)
+    for index in by_remainder[:total - sum(counts)]:
+        counts[index] += 1
+    return counts
+
+
+def create_users(prefix, count):
+    """Create prefix0 ... prefix<count - 1> sharing PASSWORD, returning their ids in order."""
+    password = make_password(PASSWORD)
+    usernames = [f'{prefix}{number}' for number in range(count)]
+    User.objects.bulk_create((User(username=username, email=f'{username}@example.com', password=password)
+                              for username in usernames), batch_size=1000)
+    ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+    return [ids[username] for username in usernames]
+
+
+def insert(model, objects, batch_size):
+    """bulk_create() an iterable a batch at a time rather than all at once. Returns the row count."""
+    count = 0
+    objects = iter(objects)
+    while batch := list(islice(objects, batch_size)):
+        model.objects.bulk_create(batch)
+        count += len(batch)
+    return count
+
+
+def inserted_ids(queryset):
+    # bulk_create() only returns ids on some databases; one process inserts
+    # all of a user's rows, so their ids follow the insertion order
+    return list(queryset.order_by('pk').values_list('pk', flat=True))
+
+
+def company_name(number):
+    words, suffixes = len(COMPANY_WORDS), len(COMPANY_SUFFIXES)
+    name = f'{COMPANY_WORDS[number % words]} {COMPANY_SUFFIXES[number // words % suffixes]}'
+    return name if number < words * suffixes else f'{name} {number // (words * suffixes) + 1}'
+
+
+def employee_name(number):
+    firsts, lasts = len(FIRST_NAMES), len(LAST_NAMES)
+    name = f'{FIRST_NAMES[number % firsts]} {LAST_NAMES[number // firsts % lasts]}'
+    return name if number < firsts * lasts else f'{name} {number // (firsts * lasts) + 1}'
+
+
+def seed_user(user_id, number, applications, seed, today, batch_size, index=True):
+    """Generate the rows of one user; returns the row count per model."""
+    rng = random.Random(f'{seed}:{number}')
+    low, high = APPLICATIONS_PER_COMPANY
+    companies = max(1, round(applications / rng.uniform(low, high)))
+    counts = {}
+    with transaction.atomic():
+        counts['companies'] = insert(Company, (
+            Company(user_id=user_id, name=company_name(n), location=location,
+                    careers_link=f'https://careers.example.com/{n}' if rng.random() < 0.5 else None)
+            for n, location in enumerate(weighted(rng, LOCATIONS, companies))
+        ), batch_size)
+        company_ids = inserted_ids(Company.objects.filter(user_id=user_id))
+
+        counts['company_questions'] = insert(CompanyQuestions, (
+            CompanyQuestions(company_id=pk, question=question, answer='Answer')
+            for pk, k in zip(company_ids, weighted(rng, COMPANY_QUESTIONS_PER_COMPANY, companies))
+            for question in rng.sample(QUESTIONS, k)
+        ), batch_size)
+
+        employee_companies = [company for company, k in enumerate(weighted(rng, EMPLOYEES_PER_COMPANY, companies))
+                              for _ in range(k)]
+        start = rng.randrange(len(FIRST_NAMES) * len(LAST_NAMES))
+        counts['employees'] = insert(Employee, (
+            Employee(user_id=user_id, company_id=company_ids[company], name=employee_name(start + n),
+                     job_title=rng.choice(TITLES), contacted=contacted.name,
+                     email=f'employee{n}@example.com' if rng.random() < 0.3 else None)
+            for n, (company, contacted) in enumerate(zip(employee_companies,
+                                                         weighted(rng, CONTACT_WEIGHTS, len(employee_companies))))
+        ), batch_size)
+        employees_by_company = {}
+        for company, pk in zip(employee_companies, inserted_ids(Employee.objects.filter(user_id=user_id))):
+            employees_by_company.setdefault(company, []).append(pk)
+
+        # Zipf: the company of rank r gets a share proportional to 1 / r^s
+        company_weights = list(accumulate(1 / rank ** COMPANY_EXPONENT for rank in range(1, companies + 1)))
+        application_companies = rng.choices(range(companies), cum_weights=company_weights, k=applications)
+        stages = {status: (list(weights), list(accumulate(weights.values())))
+                  for status, weights in STAGE_WEIGHTS.items()}
+        job_types = weighted(rng, JOB_TYPE_WEIGHTS, applications)
+
+        def build_application(n, company, status):
+            choices, cum_weights = stages[status]
+            days = min(int(rng.expovariate(1 / SUBMISSION_MEAN_DAYS)), SUBMISSION_MAX_DAYS)
+            return Application(
+                user_id=user_id,
+                company_id=company_ids[company],
+                job_title=rng.choice(SENIORITY) + rng.choice(JOB_TITLES),
+                job_type=job_types[n],
+                description=' '.join(rng.sample(SKILLS, rng.randint(3, 8))),
+                link=f'https://jobs.example.com/{user_id}/{n}' if rng.random() < 0.7 else None,
+                stage=rng.choices(choices, cum_weights=cum_weights)[0].name,
+                status=status.name,
+                submission_date=today - timedelta(days=days),
+            )
+
+        counts['applications'] = insert(Application, (
+            build_application(n, company, status) for n, (company, status) in enumerate(zip(
+                application_companies, weighted(rng, STATUS_WEIGHTS, applications)))
+        ), batch_size)
+        application_ids = inserted_ids(Application.objects.filter(user_id=user_id))
+
+        question_counts = weighted(rng, QUESTIONS_PER_APPLICATION, applications)
+        counts['questions'] = insert(Question, (
+            Question(user_id=user_id, application_id=pk, question=question, answer='Answer')
+            for pk, k in zip(application_ids, question_counts) if rng.random() < QUESTION_SHARE
+            for question in rng.sample(QUESTIONS, k)
+        ), batch_size)
+
+        Contact = Application.contacted_employees.through
+        contact_counts = weighted(rng, CONTACTS_PER_APPLICATION, applications)
+        counts['contacted_employees'] = insert(Contact, (
+            Contact(application_id=pk, employee_id=employee_id)
+            for pk, company, k in zip(application_ids, application_companies, contact_counts)
+            if company in employees_by_company and rng.random() < CONTACTED_SHARE
+            for employee_id in rng.sample(employees_by_company[company], min(k, len(employees_by_company[company])))
+        ), batch_size)
+
+        counts['todos'] = insert(TodoList, (
+            TodoList(user_id=user_id, application_title=f'{rng.choice(JOB_TITLES)} at {company_name(n)} #{n}',
+                     application_link=f'https://jobs.example.com/todo/{n}', completed=rng.random() < 0.6)
+            for n in range(round(applications * TODO_SHARE))
+        ), batch_size)
+
+        user = User(pk=user_id)
+        rebuild_rollups(user)
+        if index and get_search_backend().maintains_index:
+            rebuild_index(user)
+    return counts
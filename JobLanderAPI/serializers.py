@@ -1,15 +1,50 @@
 from rest_framework import serializers
 from .models import *
 from django.contrib.auth.models import User, Group
-from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
-from django.shortcuts import get_object_or_404
-
-class UserSerializer(serializers.ModelSerializer):
+from rest_framework.relations import ManyRelatedField, MANY_RELATION_KWARGS
+from .validators import OwnershipMixin, UniqueConstraintMixin, check_ownership
+from .sparse import SparseFieldsMixin
+from .metrics import SerializerTimingMixin
+from .tokens import RefreshToken
+from rest_framework_simplejwt import serializers as jwt_serializers
+
+class OwnedManyRelatedField(ManyRelatedField):
+    # Resolves the whole list of pks in one query instead of one per item
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        ids = []
+        for pk in data:
+            if isinstance(pk, bool):
+                self.child_relation.fail('incorrect_type', data_type=type(pk).__name__)
+            try:
+                ids.append(int(pk))
+            except (TypeError, ValueError):
+                self.child_relation.fail('incorrect_type', data_type=type(pk).__name__)
+        return check_ownership(self.child_relation.get_queryset(), ids,
+                               self.context['request'].user, self.child_relation.label_name)
+
+class OwnedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    def __init__(self, label_name=None, **kwargs):
+        self.label_name = label_name
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return OwnedManyRelatedField(**list_kwargs)
+
+class UserSerializer(SerializerTimingMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email']
 
-class CVSerializer(serializers.ModelSerializer):
+class CVSerializer(SerializerTimingMixin, SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     user_id = serializers.IntegerField(write_only=True)
     
@@ -31,69 +66,58 @@ class CVSerializer(serializers.ModelSerializer):
         return data
 
 
-class CompanySerializer(serializers.ModelSerializer):
+class CompanySerializer(SerializerTimingMixin, SparseFieldsMixin, UniqueConstraintMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     user_id = serializers.IntegerField(write_only=True)
+    unique_error_message = "Company Already Exists"
     
     class Meta:
         model = Company
         fields = ['id', 'user', 'name', 'location', 'careers_link', 'linkedin_link', 'description', 'user_id']
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Company.objects.all(),
-                fields=['user_id', 'name'],
-                message="Company Already Exists"
-            )
-        ]
+        validators = []
 
     def validate_user_id(self, value):
         if value != self.context['request'].user.id:
             raise serializers.ValidationError("Not the Same user")
         return value
 
-class CompanyQuestionsSerializer(serializers.ModelSerializer):
+class CompanyQuestionsSerializer(SerializerTimingMixin, SparseFieldsMixin, OwnershipMixin, UniqueConstraintMixin, serializers.ModelSerializer):
     company = CompanySerializer(read_only=True)
     company_id = serializers.IntegerField(write_only=True)
+    owned_fields = {'company_id': Company}
+    unique_error_message = "Question Already Exists"
     class Meta:
         model = CompanyQuestions
         fields = ['id', 'company', 'question', 'answer', 'company_id']
-        validators = [
-            UniqueTogetherValidator(
-                queryset=CompanyQuestions.objects.all(),
-                fields=['company_id', 'question'],
-                message="Question Already Exists"
-            )
-        ]
+        validators = []
     
     def validate_company_id(self, value):
-        company = get_object_or_404(Company, id=value)
-        if company.user != self.context['request'].user:
-            raise serializers.ValidationError("Company does not belong to the user")
+        self.check_owned('company_id', [value])
         return value
     
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class EmployeeSerializer(SerializerTimingMixin, SparseFieldsMixin, OwnershipMixin, UniqueConstraintMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     company = CompanySerializer(read_only=True)
     user_id = serializers.IntegerField(write_only=True)
     company_id = serializers.IntegerField(write_only=True)
+    owned_fields = {'company_id': Company}
+    unique_error_message = "Employee Already Exists"
     class Meta:
         model = Employee
         fields = ['id', 'user', 'name', 'linkedin_link', 'email', 'job_title', 'contacted', 'company', 'user_id', 'company_id']
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Employee.objects.all(),
-                fields=['user_id', 'company_id', 'name'],
-                message="Employee Already Exists"
-            )
-        ]
+        validators = []
     
     def validate_user_id(self, value):
         if value != self.context['request'].user.id:
             raise serializers.ValidationError("Not the Same user")
         return value
 
-class ApplicationSerializer(serializers.ModelSerializer):
+    def validate_company_id(self, value):
+        self.check_owned('company_id', [value])
+        return value
+
+class ApplicationSerializer(SerializerTimingMixin, SparseFieldsMixin, OwnershipMixin, serializers.ModelSerializer):
     company = CompanySerializer(read_only=True)
     user = UserSerializer(read_only=True)
     user_id = serializers.IntegerField(write_only=True)
@@ -104,32 +128,33 @@ class ApplicationSerializer(serializers.ModelSerializer):
     stage = serializers.CharField(required=False, write_only=True)
     submitted_cv_id = serializers.IntegerField(required=False, allow_null=True, write_only=True)
     contacted_employees = serializers.ListField(child=serializers.IntegerField(), write_only=True)
+    owned_fields = {'company_id': Company, 'submitted_cv_id': CV, 'contacted_employees': Employee}
     class Meta:
         model = Application
         fields = ['id', 'user', 'company', 'job_title', 'job_type', 'link', 'submission_date', 'status', 
             'user_id', 'company_id', 'submitted_cv','submitted_cv_id', 'description', 'ats_score', 'stage', 'contacted_employees']
         
     def validate_ats_score(self, value):
-        if value<0 or value>100:
+        if value is not None and (value<0 or value>100):
             raise serializers.ValidationError("ATS Score should be between 0 and 100")
         return value
     
     def validate_contacted_employees(self, employees):
-        for id in employees:
-            employee = get_object_or_404(Employee,id=id)
-            if employee.user != self.context['request'].user:
-                raise serializers.ValidationError("Employee does not belong to the user")
+        self.check_owned('contacted_employees', employees)
         return employees
     
     def validate_user_id(self, value):
         if value != self.context['request'].user.id:
             raise serializers.ValidationError("Not the Same user")
         return value
+
+    def validate_company_id(self, value):
+        self.check_owned('company_id', [value])
+        return value
     
     def validate_submitted_cv_id(self, value):
-        cv = get_object_or_404(CV, id=value)
-        if cv.user != self.context['request'].user:
-            raise serializers.ValidationError("CV does not belong to the user")
+        if value is not None:
+            self.check_owned('submitted_cv_id', [value])
         return value
 
     # def validate_questions(self, questions):
@@ -139,7 +164,7 @@ class ApplicationSerializer(serializers.ModelSerializer):
     #             raise serializers.ValidationError("Question does not belong to the user")
     #     return questions
 
-class ApplicationDetailsSerializer(serializers.ModelSerializer):
+class ApplicationDetailsSerializer(SerializerTimingMixin, SparseFieldsMixin, OwnershipMixin, serializers.ModelSerializer):
     company = CompanySerializer(read_only=True)
     user = UserSerializer(read_only=True)
     submitted_cv = CVSerializer(read_only=True)
@@ -147,27 +172,31 @@ class ApplicationDetailsSerializer(serializers.ModelSerializer):
     user_id = serializers.IntegerField(write_only=True)
     company_id = serializers.IntegerField(write_only=True)
     submission_date = serializers.DateField(read_only=True)
-    contacted_employees = serializers.PrimaryKeyRelatedField(many=True, queryset=Employee.objects.all())
+    contacted_employees = OwnedPrimaryKeyRelatedField(many=True, queryset=Employee.objects.only('id', 'user_id'), label_name='Employee')
+    owned_fields = {'company_id': Company, 'submitted_cv_id': CV}
     class Meta:
         model = Application
         fields = ['id', 'user', 'company', 'job_title', 'job_type', 'link',
                 'submission_date', 'status', 'user_id', 'company_id', 'submitted_cv', 'submitted_cv_id', 'description', 'ats_score', 'stage', 'contacted_employees']
         
     def validate_ats_score(self, value):
-        if value<0 or value>100:
+        if value is not None and (value<0 or value>100):
             raise serializers.ValidationError("ATS Score should be between 0 and 100")
         return value
 
-    def validate_contacted_employees(self, employees):
-        for employee in employees:
-            if employee.user != self.context['request'].user:
-                raise serializers.ValidationError("Employee does not belong to the user")
-        return employees
-    
     def validate_user_id(self, value):
         if value != self.context['request'].user.id:
             raise serializers.ValidationError("Not the Same user")
         return value
+
+    def validate_company_id(self, value):
+        self.check_owned('company_id', [value])
+        return value
+
+    def validate_submitted_cv_id(self, value):
+        if value is not None:
+            self.check_owned('submitted_cv_id', [value])
+        return value
     
     # def validate_questions(self, questions):
     #     for id in questions:
@@ -177,18 +206,17 @@ class ApplicationDetailsSerializer(serializers.ModelSerializer):
     #     return questions
 
     
-class QuestionSerializer(serializers.ModelSerializer):
+class QuestionSerializer(SerializerTimingMixin, SparseFieldsMixin, OwnershipMixin, UniqueConstraintMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     application = ApplicationSerializer(read_only=True)
     user_id = serializers.IntegerField(write_only=True)
     application_id = serializers.IntegerField(write_only=True)
+    owned_fields = {'application_id': Application}
+    unique_error_message = "Question Already Exists"
     class Meta:
         model = Question
         fields = ['id', 'question', 'answer', 'application', 'user', 'user_id', 'application_id']
-        validators = [
-            UniqueTogetherValidator(queryset=Question.objects.all(),
-                fields=['question', 'application_id','user_id'], message="Question Already Exists")
-        ]
+        validators = []
 
     def validate_user_id(self, value):
         if value != self.context['request'].user.id:
@@ -196,23 +224,28 @@ class QuestionSerializer(serializers.ModelSerializer):
         return value
     
     def validate_application_id(self, value):
-        application = get_object_or_404(Application, id=value)
-        if application.user != self.context['request'].user:
-            raise serializers.ValidationError("Application does not belong to the user")
+        self.check_owned('application_id', [value])
         return value
     
-class TodoListSerializer(serializers.ModelSerializer):
+class TodoListSerializer(SerializerTimingMixin, SparseFieldsMixin, UniqueConstraintMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     user_id = serializers.IntegerField(write_only=True)
+    unique_error_message = "ToDo Already Exists"
     class Meta:
         model = TodoList
         fields = ['id', 'user', 'application_title', 'application_link', 'completed', 'user_id']
-        validators = [
-            UniqueTogetherValidator(queryset=TodoList.objects.all(),
-                fields=['application_title', 'user_id'], message="ToDo Already Exists")
-        ]
+        validators = []
 
     def validate_user_id(self, value):
         if value != self.context['request'].user.id:
             raise serializers.ValidationError("Not the Same user")
-        return value
\ No newline at end of file
+        return value
+
+
+# Refresh tokens checked through the blacklist filter (see tokens.py)
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class TokenBlacklistSerializer(jwt_serializers.TokenBlacklistSerializer):
+    token_class = RefreshToken
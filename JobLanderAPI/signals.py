@@ -0,0 +1,167 @@
+# signals.py
+# Receivers are connected in JoblanderapiConfig.ready().
+from collections import Counter
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.dispatch import Signal, receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from . import ats, authentication, blobs, cache, rollups, search, tasks, tokens
+from .models import CV, Application, Company, CompanyQuestions, Employee, Question, TodoList
+
+# Sent by the bulk endpoints after bulk_create/bulk_update, which skip
+# post_save. Arguments: sender (the model), instances, created and, for
+# updates, previous: {pk: {attname: value before the update}}.
+bulk_saved = Signal()
+
+
+def index_saved_object(sender, instance, raw=False, update_fields=None, **kwargs):
+    indexed = search.INDEXED_FIELDS[sender._meta.model_name]
+    if not raw and (update_fields is None or set(indexed) & set(update_fields)):
+        search.index_objects(sender, [instance])
+
+
+def index_bulk_saved_objects(sender, instances, created, **kwargs):
+    search.index_objects(sender, instances, created)
+
+
+def unindex_deleted_object(sender, instance, **kwargs):
+    search.unindex_objects(sender, [instance.pk])
+
+
+# Connected per model: a receiver without sender would keep Django from
+# fast-deleting rows of every other model
+for model in search.indexed_models():
+    post_save.connect(index_saved_object, sender=model)
+    bulk_saved.connect(index_bulk_saved_objects, sender=model)
+    post_delete.connect(unindex_deleted_object, sender=model)
+
+
+@receiver(post_save, sender=Application)
+@receiver(post_delete, sender=Application)
+def invalidate_analytics(sender, instance, **kwargs):
+    cache.invalidate_on_commit(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Application.contacted_employees.through)
+def invalidate_analytics_on_contacts(sender, instance, action, **kwargs):
+    # instance is the Application, or the Employee for reverse changes; both
+    # belong to the same user
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        cache.invalidate_on_commit(instance.user_id)
+        cache.invalidate_on_commit(instance.user_id, cache.DATA)
+
+
+@receiver(bulk_saved, sender=Application)
+def invalidate_analytics_on_bulk_save(sender, instances, **kwargs):
+    for user_id in {instance.user_id for instance in instances}:
+        cache.invalidate_on_commit(user_id)
+
+
+@receiver(pre_save, sender=Application)
+def load_rollup_key(sender, instance, raw=False, update_fields=None, **kwargs):
+    tracked = {'user', 'submission_date', 'status', 'stage', *rollups.ROLLUP_FIELDS}
+    instance._rollup_skip = raw or (update_fields is not None and not tracked & set(update_fields))
+    if not instance._rollup_skip:
+        instance._rollup_previous_key = rollups.load_previous_key(instance)
+
+
+@receiver(post_save, sender=Application)
+def update_rollup_on_save(sender, instance, **kwargs):
+    if not getattr(instance, '_rollup_skip', True):
+        key = rollups.instance_key(instance)
+        rollups.apply_deltas(rollups.saved_deltas(instance._rollup_previous_key, key))
+        instance._rollup_key = key
+
+
+@receiver(post_delete, sender=Application)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    rollups.apply_deltas(Counter({rollups.instance_key(instance): -1}))
+
+
+@receiver(bulk_saved, sender=Application)
+def update_rollup_on_bulk_save(sender, instances, created, previous=None, **kwargs):
+    deltas = Counter()
+    for instance in instances:
+        old_key = None if created else rollups.instance_key(instance, (previous or {}).get(instance.pk))
+        instance._rollup_key = rollups.instance_key(instance)
+        deltas.update(rollups.saved_deltas(old_key, instance._rollup_key))
+    rollups.apply_deltas(deltas)
+
+
+def invalidate_data(sender, instance, **kwargs):
+    user_id = search.owner_id(instance)
+    if user_id is not None:
+        cache.invalidate_on_commit(user_id, cache.DATA)
+
+
+def invalidate_data_on_bulk_save(sender, instances, **kwargs):
+    for user_id in {search.owner_id(instance) for instance in instances}:
+        cache.invalidate_on_commit(user_id, cache.DATA)
+
+
+# The user's rows, and the rows embedding them, back the ETags of
+# ConditionalGetMixin
+for model in (CV, Company, CompanyQuestions, Employee, Question, Application, TodoList):
+    post_save.connect(invalidate_data, sender=model)
+    post_delete.connect(invalidate_data, sender=model)
+    bulk_saved.connect(invalidate_data_on_bulk_save, sender=model)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_data(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no response embeds
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        cache.invalidate_on_commit(instance.pk, cache.DATA)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # Password changes, deactivation and djoser's updates all save the user
+    authentication.forget_user_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def announce_blacklisted_token(sender, instance, created, **kwargs):
+    # The blacklist filters of every process fetch the new rows on their next check
+    if created:
+        transaction.on_commit(tokens.bump_version)
+
+
+@receiver(post_delete, sender=CV)
+def release_cv_file(sender, instance, **kwargs):
+    # Also runs for queryset deletes and for CVs deleted with their user
+    if instance.cv:
+        blobs.release(instance.cv.name)
+
+
+@receiver(post_save, sender=Application)
+def score_saved_application(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw and ats.needs_score(instance, created, update_fields):
+        ats.schedule([instance.pk])
+    instance._ats_inputs = ats.inputs(instance)
+
+
+@receiver(bulk_saved, sender=Application)
+def score_bulk_saved_applications(sender, instances, created, previous=None, **kwargs):
+    changed = []
+    for instance in instances:
+        before = (previous or {}).get(instance.pk, {})
+        instance._ats_inputs = (before.get('description', instance.description),
+                                before.get('submitted_cv_id', instance.submitted_cv_id))
+        if ats.needs_score(instance, created):
+            changed.append(instance.pk)
+        instance._ats_inputs = ats.inputs(instance)
+    if changed:
+        ats.schedule(changed)
+
+
+@receiver(post_save, sender=CV)
+def rescore_cv_applications(sender, instance, created, raw=False, **kwargs):
+    # CV.save() updates _stored_cv after this runs; without it, rescore anyway
+    if not created and not raw and getattr(instance, '_stored_cv', False) != (instance.cv.name or None):
+        tasks.enqueue(ats.rescore_cv, instance.pk, dedup_key=f'rescore-cv:{instance.pk}')
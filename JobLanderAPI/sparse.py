@@ -0,0 +1,95 @@
+# sparse.py
+# ?fields= and ?expand= for read requests. Without either parameter
+# responses are unchanged. With them, only the listed fields are returned
+# ("id" is always kept), and nested serializers that are not expanded come
+# back as the related id. Both parameters take comma separated, dotted
+# paths, e.g. ?fields=id,question,application.job_title&expand=application
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_paths(value):
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, path.strip().split('.')):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def get_sparse_options(request):
+    """(fields tree or None, expand tree) for the request, None when the response is not sparse."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    params = request.query_params
+    if 'fields' not in params and 'expand' not in params:
+        return None
+    only = parse_paths(params['fields']) if params.get('fields') else None
+    return only, parse_paths(params.get('expand', ''))
+
+
+class SparseFieldsMixin:
+
+    def get_fields(self):
+        fields = super().get_fields()
+        options = self.get_sparse_options()
+        if options is None:
+            return fields
+        only, expand = options
+        for name, field in list(fields.items()):
+            if only is not None and name not in only and name != 'id':
+                del fields[name]
+            elif isinstance(field, serializers.BaseSerializer):
+                if name in expand:
+                    field.sparse_options = ((only or {}).get(name) or None, expand[name])
+                else:
+                    fields[name] = self.build_id_field(name, field)
+        return fields
+
+    def get_sparse_options(self):
+        # Nested serializers get theirs from the parent, see get_fields()
+        if hasattr(self, 'sparse_options'):
+            return self.sparse_options
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return None
+        return get_sparse_options(self.context.get('request'))
+
+    def build_id_field(self, name, field):
+        # Read the foreign key column itself so the related row is not loaded
+        if isinstance(field, serializers.ListSerializer):
+            return serializers.PrimaryKeyRelatedField(many=True, read_only=True, source=field.source)
+        try:
+            model_field = self.Meta.model._meta.get_field(field.source or name)
+        except FieldDoesNotExist:
+            return serializers.PrimaryKeyRelatedField(read_only=True, source=field.source)
+        return serializers.ReadOnlyField(source=model_field.attname)
+
+
+def prune_related(tree, expand, only):
+    paths = []
+    for name, subtree in tree.items():
+        if name not in expand or (only is not None and name not in only):
+            continue
+        nested = prune_related(subtree, expand[name], (only or {}).get(name) or None)
+        paths += [f'{name}__{path}' for path in nested] or [name]
+    return paths
+
+
+class SparseFieldsViewMixin:
+    """Drops the select_related joins of relations the sparse response does not expand."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        options = get_sparse_options(self.request)
+        related = queryset.query.select_related
+        if options is None or not isinstance(related, dict):
+            return queryset
+        only, expand = options
+        paths = prune_related(related, expand, only)
+        # select_related() without arguments would follow every foreign key
+        queryset = queryset.select_related(None)
+        return queryset.select_related(*paths) if paths else queryset
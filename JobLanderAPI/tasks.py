@@ -0,0 +1,191 @@
+# tasks.py
+# A task queue kept in the database, so slow work leaves the web workers
+# without a broker to run. enqueue() writes a Task row in the caller's
+# transaction: workers only see it once that commits, and never if it rolls
+# back. `manage.py runworkers` claims due tasks and runs them on a thread or
+# process pool. A task that raises is retried with exponential backoff until
+# max_attempts, then kept as FAILED with its traceback. Tasks run at least
+# once: one whose worker died is claimed again after TASK_LEASE, so tasks
+# must be safe to repeat. Due tasks left pending for longer than
+# TASK_PENDING_WARNING mean no worker is running; enqueue() logs a warning.
+from datetime import timedelta
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import traceback
+import uuid
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+# Delay before the first retry, doubled for every further one
+RETRY_DELAY = 10
+MAX_RETRY_DELAY = 60 * 60
+# A task running for longer than this is taken to have lost its worker
+TASK_LEASE = 15 * 60
+MAX_ERROR_LENGTH = 10000
+# The backlog is checked at most this often (seconds), across processes
+STALL_CHECK_INTERVAL = 5 * 60
+STALL_CHECK_KEY = 'tasks:stall-check'
+
+
+def task(func):
+    """Mark a function as runnable by the workers; only marked functions are loaded from a Task row."""
+    func.is_task = True
+    return func
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def load(name):
+    func = import_string(name)
+    if not getattr(func, 'is_task', False):
+        raise ImportError(f'{name} is not a task')
+    return func
+
+
+def enqueue(func, *args, dedup_key=None, delay=0, max_attempts=MAX_ATTEMPTS):
+    """
+    Queue func(*args) to run once the current transaction commits. Arguments
+    must be JSON serializable. With a dedup_key, a task with the same key that
+    has not started yet makes this a no-op. Returns the Task, None when
+    deduplicated or run inline.
+    """
+    from .models import Task
+    if not getattr(func, 'is_task', False):
+        raise ValueError(f'{task_name(func)} is not a task')
+    # Inline tasks get the same arguments a worker would
+    args = json.loads(json.dumps(args))
+    if settings.TASK_RUN_INLINE:
+        transaction.on_commit(lambda: run_inline(func, args))
+        return None
+    queued = Task(name=task_name(func), args=args, dedup_key=dedup_key, max_attempts=max_attempts,
+                  run_after=timezone.now() + timedelta(seconds=delay))
+    warn_if_stalled()
+    if dedup_key is None:
+        queued.save()
+        return queued
+    try:
+        with transaction.atomic():
+            queued.save()
+    except IntegrityError:
+        return None
+    return queued
+
+
+def schedule(func, interval):
+    """
+    Queue func() to run in `interval` seconds unless a run is queued already.
+    Called regularly by every worker, this runs func about once per interval
+    however many workers there are.
+    """
+    return enqueue(func, dedup_key=f'periodic:{task_name(func)}', delay=interval)
+
+
+def oldest_pending_age():
+    """Seconds the longest waiting due task has been due, None when none is."""
+    from .models import Task, TaskState
+    now = timezone.now()
+    oldest = Task.objects.filter(state=TaskState.PENDING.name, run_after__lte=now).order_by('run_after')
+    oldest = oldest.values_list('run_after', flat=True).first()
+    return (now - oldest).total_seconds() if oldest is not None else None
+
+
+def warn_if_stalled():
+    if not settings.TASK_PENDING_WARNING or not cache.add(STALL_CHECK_KEY, 1, STALL_CHECK_INTERVAL):
+        return
+    age = oldest_pending_age()
+    if age is not None and age > settings.TASK_PENDING_WARNING:
+        logger.warning('A task has been due for %d seconds without being run; is `manage.py runworkers` running?', age)
+
+
+def run_inline(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Task %s failed', task_name(func))
+
+
+def retry_delay(attempts):
+    delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    # Jitter, so tasks failing together do not retry together
+    return timedelta(seconds=delay * random.uniform(1, 1.1))
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}'
+
+
+def claim(limit, worker=None):
+    """Mark up to `limit` due tasks as running for this worker and return them."""
+    from .models import Task, TaskState
+    worker = worker or worker_id()
+    now = timezone.now()
+    with transaction.atomic():
+        due = Task.objects.filter(state=TaskState.PENDING.name, run_after__lte=now).order_by('run_after', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('pk', flat=True)[:limit])
+        if not ids:
+            return []
+        # Where rows cannot be locked, the state check settles races between workers
+        Task.objects.filter(pk__in=ids, state=TaskState.PENDING.name).update(
+            state=TaskState.RUNNING.name, locked_by=worker, locked_at=now, dedup_key=None, attempts=F('attempts') + 1)
+    return list(Task.objects.filter(pk__in=ids, state=TaskState.RUNNING.name, locked_by=worker).order_by('run_after', 'pk'))
+
+
+def recover_expired():
+    """Requeue tasks whose worker stopped without finishing them. Returns how many."""
+    from .models import Task, TaskState
+    expired = timezone.now() - timedelta(seconds=TASK_LEASE)
+    return Task.objects.filter(state=TaskState.RUNNING.name, locked_at__lt=expired).update(
+        state=TaskState.PENDING.name, locked_by='', locked_at=None, run_after=timezone.now())
+
+
+def run(task_id, worker):
+    """Run a claimed task, then delete it or schedule its retry. Returns True when it succeeded."""
+    from .models import Task, TaskState
+    close_old_connections()
+    try:
+        current = Task.objects.filter(pk=task_id, state=TaskState.RUNNING.name, locked_by=worker).first()
+        if current is None:
+            # Requeued after its lease expired and claimed by another worker
+            return False
+        claimed = Task.objects.filter(pk=task_id, locked_by=worker)
+        try:
+            load(current.name)(*current.args)
+        except Exception:
+            error = traceback.format_exc()[-MAX_ERROR_LENGTH:]
+            if current.attempts >= current.max_attempts:
+                logger.error('Task %s %d failed for good after %d attempts\n%s', current.name, current.pk, current.attempts, error)
+                claimed.update(state=TaskState.FAILED.name, locked_by='', locked_at=None, last_error=error)
+            else:
+                logger.warning('Task %s %d failed, attempt %d of %d\n%s', current.name, current.pk, current.attempts,
+                               current.max_attempts, error)
+                claimed.update(state=TaskState.PENDING.name, locked_by='', locked_at=None, last_error=error,
+                               run_after=timezone.now() + retry_delay(current.attempts))
+            return False
+        claimed.delete()
+        return True
+    finally:
+        close_old_connections()
+
+
+def setup_worker():
+    # Needed when worker processes are spawned rather than forked
+    django.setup()
+    # Ctrl+C reaches the whole process group; the parent lets running tasks finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
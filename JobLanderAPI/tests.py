@@ -1,3 +1,1920 @@
-from django.test import TestCase
+from datetime import date, timedelta
+import asyncio
+import base64
+import csv
+import importlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from unittest import mock
+import zipfile
+import zlib
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count, F
+from django.test import AsyncRequestFactory, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from docx import Document
+from pypdf import PdfReader, PdfWriter
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import ats, blobs, bulk, cache as versions, cvtext, loadtest, metrics, profiling, rollups, search, seeding, tasks, tokens, views
+from .authentication import CachedJWTAuthentication, user_key
+from .benchmarks import make_docx, make_pdf
+from .checks import check_expression_indexes, check_shared_cache
+from .exports import ApplicationExport
+from .imports import iter_records
+from .management.commands.loadtest import Command as LoadTestCommand
+from .models import *
+from .rollups import rebuild_rollups
+from .search import rebuild_index
+
+
+class APITestCase(TestCase):
+    # CV files go to a temporary MEDIA_ROOT, removed after the class
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        # Throttle history and cached analytics must not leak between tests
+        cache.clear()
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.client = self.client_for(self.user)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def make_company(self, name='Acme', user=None, **kwargs):
+        kwargs.setdefault('location', 'Remote')
+        return Company.objects.create(user=user or self.user, name=name, **kwargs)
+
+    def make_employee(self, company, name='Jane', **kwargs):
+        kwargs.setdefault('job_title', 'Recruiter')
+        kwargs.setdefault('contacted', ContactStatus.SENT.name)
+        return Employee.objects.create(user=company.user, company=company, name=name, **kwargs)
+
+    def make_cv(self, content=b'python django', name='cv.txt', user=None):
+        cv = CV(user=user or self.user)
+        cv.cv.save(name, ContentFile(content))
+        return cv
+
+    def make_application(self, company, **kwargs):
+        kwargs.setdefault('job_title', 'Backend Engineer')
+        kwargs.setdefault('job_type', 'Full-time')
+        kwargs.setdefault('description', 'Python and Django')
+        kwargs.setdefault('stage', Stage.APPLIED.name)
+        kwargs.setdefault('status', ApplicationStatus.PENDING.name)
+        return Application.objects.create(user=company.user, company=company, **kwargs)
+
+
+@override_settings(CACHE_SHARED=True)
+class QueryCountTests(APITestCase):
+    # Each endpoint runs the same queries for one row as for a full page. The
+    # shared cache keeps the query reading ETags from the rows out of the counts
+
+    def add_rows(self, count):
+        for i in range(count):
+            company = self.make_company(f'Company {Company.objects.count()}')
+            employee = self.make_employee(company)
+            cv = self.make_cv(f'cv {CV.objects.count()}'.encode())
+            application = self.make_application(company, submitted_cv=cv)
+            application.contacted_employees.add(employee)
+            Question.objects.create(user=self.user, application=application, question='Why us?', answer='Because')
+            CompanyQuestions.objects.create(company=company, question='Salary?', answer='Enough')
+            TodoList.objects.create(user=self.user, application_title=f'Apply {i} at {company.name}')
+
+    def assert_constant_queries(self, url, expected):
+        for count in (1, 9):
+            self.add_rows(count)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_lists(self):
+        # The page and its count
+        for url in ('companies', 'employees', 'applications', 'questions', 'companyquestions', 'todos', 'cvs'):
+            with self.subTest(url=url):
+                self.assert_constant_queries(f'/api/{url}?page_size=10', 2)
+
+    def test_details(self):
+        details = {
+            'companies': (Company, 1),
+            'employees': (Employee, 1),
+            'questions': (Question, 1),
+            'companyquestions': (CompanyQuestions, 1),
+            'todos': (TodoList, 1),
+            'cvs': (CV, 1),
+            # The row and its contacted employees' ids
+            'applications': (Application, 2),
+        }
+        for url, (model, expected) in details.items():
+            with self.subTest(url=url):
+                self.add_rows(1)
+                self.assert_constant_queries(f'/api/{url}/{model.objects.latest("pk").pk}', expected)
+
+    def test_nested_rows(self):
+        self.add_rows(1)
+        response = self.client.get('/api/questions')
+        application = response.data['results'][0]['application']
+        self.assertEqual(application['company']['user']['username'], 'user')
+        response = self.client.get(f'/api/applications/{Application.objects.get().pk}')
+        self.assertEqual(response.data['contacted_employees'], [Employee.objects.get().pk])
+        self.assertEqual(response.data['submitted_cv']['user']['username'], 'user')
+
+
+@override_settings(CACHE_SHARED=True)
+class CursorPaginationTests(APITestCase):
+    # Without the query reading ETags from the rows, as in QueryCountTests
+
+    def setUp(self):
+        super().setUp()
+        company = self.make_company()
+        # Several rows per day, so pages have to break ties on the id
+        for i in range(12):
+            self.make_application(company, submission_date=date(2024, 1, 1 + i // 3))
+
+    def walk(self, url, link='next'):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data[link]
+        return ids
+
+    def expected_ids(self, *ordering):
+        return list(Application.objects.order_by(*ordering).values_list('id', flat=True))
+
+    def test_walks_every_row_once(self):
+        ids = self.walk('/api/applications?cursor=&page_size=5&ordering=submission_date')
+        self.assertEqual(ids, self.expected_ids('submission_date', 'id'))
+
+    def test_descending(self):
+        ids = self.walk('/api/applications?cursor=&page_size=5&ordering=-submission_date')
+        self.assertEqual(ids, self.expected_ids('-submission_date', '-id'))
+
+    def test_previous_links_walk_back(self):
+        url = '/api/applications?cursor=&page_size=5'
+        while url:
+            response = self.client.get(url)
+            url = response.data['next']
+        last_page = [row['id'] for row in response.data['results']]
+        ids = self.walk(response.data['previous'], 'previous')
+        pages = self.expected_ids('submission_date', 'id')
+        self.assertEqual(last_page, pages[10:])
+        self.assertEqual(ids, pages[5:10] + pages[:5])
+
+    def test_no_count_unless_asked(self):
+        # The page alone, one row past it telling whether there is a next one
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/applications?cursor=&page_size=5')
+        self.assertIsNone(response.data['count'])
+        self.assertIsNone(response.data['total_pages'])
+        self.assertIsNone(response.data['previous'])
+        response = self.client.get('/api/applications?cursor=&page_size=5&count=true')
+        self.assertEqual((response.data['count'], response.data['total_pages']), (12, 3))
+
+    def test_nullable_ordering_field(self):
+        for i, application in enumerate(Application.objects.order_by('pk')):
+            Question.objects.create(user=self.user, question=f'Question {i}', answer='Answer',
+                                    application=application if i % 2 else None)
+        for ordering in ('application__submission_date', '-application__submission_date'):
+            with self.subTest(ordering=ordering):
+                ids = self.walk(f'/api/questions?cursor=&page_size=5&ordering={ordering}')
+                self.assertEqual(sorted(ids), sorted(Question.objects.values_list('id', flat=True)))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/applications?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+        for value in ([1, 2], {'gt': 1}, 'not-a-date'):
+            cursor = base64.urlsafe_b64encode(json.dumps({'v': value, 'id': 1}).encode()).decode()
+            response = self.client.get(f'/api/applications?cursor={cursor}&ordering=submission_date')
+            self.assertEqual(response.status_code, 404, value)
+
+    def test_page_numbers_unchanged(self):
+        response = self.client.get('/api/applications?page=2&page_size=5')
+        self.assertEqual((response.data['count'], response.data['total_pages']), (12, 3))
+        self.assertEqual(len(response.data['results']), 5)
+
+
+class OwnershipValidationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.make_company()
+        self.employees = [self.make_employee(self.company, f'Employee {i}') for i in range(20)]
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.foreign_company = self.make_company(user=other)
+        self.foreign_employee = self.make_employee(self.foreign_company)
+
+    def payload(self, **kwargs):
+        return {
+            'user_id': self.user.pk, 'company_id': self.company.pk, 'job_title': 'Engineer', 'job_type': 'Full-time',
+            'description': 'Python', 'status': ApplicationStatus.PENDING.name, 'stage': Stage.APPLIED.name,
+            'contacted_employees': [], **kwargs,
+        }
+
+    def count_queries(self, employees):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/applications', self.payload(contacted_employees=employees), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return len(queries)
+
+    def reads(self, queries):
+        return len([query for query in queries if query['sql'].startswith('SELECT')])
+
+    def test_cost_does_not_grow_with_the_payload(self):
+        # The first application also creates its rollup bucket
+        self.count_queries([])
+        one = self.count_queries([self.employees[0].pk])
+        self.assertEqual(self.count_queries([employee.pk for employee in self.employees]), one)
+
+    def test_missing_and_foreign_ids_are_listed(self):
+        response = self.client.post('/api/applications', self.payload(
+            contacted_employees=[self.employees[0].pk, self.foreign_employee.pk, 999999],
+        ), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['contacted_employees'], [
+            'Employee 999999 does not exist',
+            f'Employee {self.foreign_employee.pk} does not belong to the user',
+        ])
+
+    def test_foreign_company(self):
+        response = self.client.post('/api/applications', self.payload(company_id=self.foreign_company.pk), format='json')
+        self.assertEqual(response.data['company_id'], [f'Company {self.foreign_company.pk} does not belong to the user'])
+        response = self.client.post('/api/companyquestions', {
+            'company_id': self.foreign_company.pk, 'question': 'Salary?', 'answer': 'Enough',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('company_id', response.data)
+
+    def test_detail_serializer_resolves_the_list_at_once(self):
+        application = self.make_application(self.company)
+        url = f'/api/applications/{application.pk}'
+        with CaptureQueriesContext(connection) as one:
+            self.client.patch(url, {'contacted_employees': [self.employees[0].pk]}, format='json')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.patch(url, {'contacted_employees': [e.pk for e in self.employees]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(sorted(response.data['contacted_employees']), sorted(e.pk for e in self.employees))
+        # Reads do not grow; only the through table rows differ
+        self.assertEqual(self.reads(many), self.reads(one))
+        response = self.client.patch(url, {'contacted_employees': [self.foreign_employee.pk]}, format='json')
+        self.assertEqual(response.data['contacted_employees'],
+                         [f'Employee {self.foreign_employee.pk} does not belong to the user'])
+
+
+class BulkEndpointTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.make_company()
+        self.employees = [self.make_employee(self.company, f'Employee {i}') for i in range(3)]
+
+    def application(self, i, **kwargs):
+        return {
+            'user_id': self.user.pk, 'company_id': self.company.pk, 'job_title': f'Engineer {i}',
+            'job_type': 'Full-time', 'description': 'Python', 'status': ApplicationStatus.PENDING.name,
+            'stage': Stage.APPLIED.name, 'contacted_employees': [e.pk for e in self.employees], **kwargs,
+        }
+
+    def test_create(self):
+        through = Application.contacted_employees.through._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/applications/bulk', [self.application(i) for i in range(5)], format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(Application.objects.count(), 5)
+        self.assertEqual(Application.contacted_employees.through.objects.count(), 15)
+        # Every link in one INSERT
+        inserts = [query for query in queries if query['sql'].startswith(f'INSERT INTO "{through}"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_without_returned_ids(self):
+        # MySQL returns no ids from a multi-row INSERT: they are read back,
+        # in a number of queries that does not grow with the items
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            # Creates the rollup bucket
+            self.client.post('/api/applications/bulk', [self.application(0, job_title='First')], format='json')
+            for size in (2, 20):
+                items = [self.application(i, job_title=f'Batch {size} {i}') for i in range(size)]
+                with self.assertNumQueries(13):
+                    response = self.client.post('/api/applications/bulk', items, format='json')
+                self.assertEqual(response.status_code, 201, response.data)
+                self.assertEqual([item['job_title'] for item in response.data], [item['job_title'] for item in items])
+                for item in response.data:
+                    application = Application.objects.get(pk=item['id'])
+                    self.assertEqual(application.job_title, item['job_title'])
+                    self.assertEqual(application.contacted_employees.count(), 3)
+        RollupConsistencyTests.assert_consistent(self)
+
+    def test_ids_read_back_around_other_rows(self):
+        companies = [Company(user=self.user, name=f'Company {i}', location='Remote') for i in range(3)]
+        last = Company.objects.order_by('-pk').values_list('pk', flat=True)[0]
+        # Committed by another transaction between the INSERT and the read
+        other = self.make_company('Other')
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            Company.objects.bulk_create(companies)
+        bulk.set_inserted_ids(Company, companies, last)
+        self.assertNotIn(other.pk, [company.pk for company in companies])
+        self.assertEqual([Company.objects.get(pk=company.pk).name for company in companies],
+                         ['Company 0', 'Company 1', 'Company 2'])
+
+    def test_response_in_payload_order(self):
+        applications = [self.make_application(self.company, job_title=f'Engineer {i}') for i in range(3)]
+        ids = [applications[2].pk, applications[0].pk, applications[1].pk]
+        response = self.client.patch('/api/applications/bulk', [{'id': pk, 'job_type': 'Contract'} for pk in ids],
+                                     format='json')
+        self.assertEqual([item['id'] for item in response.data], ids)
+
+    def test_one_invalid_item_fails_the_batch(self):
+        items = [self.application(0), self.application(1, status='NOT_A_STATUS'), self.application(2)]
+        response = self.client.post('/api/applications/bulk', items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('status', response.data[1])
+        self.assertEqual(response.data[2], {})
+        self.assertFalse(Application.objects.exists())
+
+    def test_unique_violations(self):
+        response = self.client.post('/api/companies/bulk', [
+            {'user_id': self.user.pk, 'name': 'Acme', 'location': 'Paris'},
+            {'user_id': self.user.pk, 'name': 'Initech', 'location': 'Paris'},
+            {'user_id': self.user.pk, 'name': 'Initech', 'location': 'Berlin'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {'non_field_errors': ['Company Already Exists']})
+        self.assertEqual(response.data[1], response.data[2])
+        self.assertEqual(Company.objects.count(), 1)
+
+    def test_update(self):
+        applications = [self.make_application(self.company, job_title=f'Engineer {i}') for i in range(3)]
+        applications[0].contacted_employees.add(self.employees[0])
+        response = self.client.patch('/api/applications/bulk', [
+            {'id': applications[0].pk, 'status': ApplicationStatus.REJECTED.name, 'contacted_employees': [self.employees[1].pk]},
+            {'id': applications[1].pk, 'job_title': 'Staff Engineer'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        applications[0].refresh_from_db()
+        self.assertEqual(applications[0].status, ApplicationStatus.REJECTED.name)
+        self.assertEqual(list(applications[0].contacted_employees.all()), [self.employees[1]])
+        self.assertEqual(Application.objects.get(pk=applications[1].pk).job_title, 'Staff Engineer')
+        self.assertEqual(Application.objects.get(pk=applications[2].pk).job_title, 'Engineer 2')
+
+    def test_update_unknown_or_foreign_ids(self):
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        foreign = self.make_application(self.make_company(user=other))
+        response = self.client.patch('/api/applications/bulk', [{'id': foreign.pk, 'job_title': 'Mine now'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {'id': [f'Object {foreign.pk} does not exist']})
+        self.assertNotEqual(Application.objects.get(pk=foreign.pk).job_title, 'Mine now')
+
+    def test_delete(self):
+        todos = [TodoList.objects.create(user=self.user, application_title=f'Todo {i}') for i in range(3)]
+        response = self.client.delete('/api/todos/bulk', {'ids': [todos[0].pk, 999999]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(TodoList.objects.count(), 3)
+        response = self.client.delete('/api/todos/bulk', {'ids': [todos[0].pk, todos[1].pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(TodoList.objects.values_list('pk', flat=True)), [todos[2].pk])
+
+    def test_one_throttle_hit(self):
+        self.client.post('/api/applications/bulk', [self.application(i) for i in range(20)], format='json')
+        self.assertEqual(len(cache.get(f'throttle_user_{self.user.pk}')), 1)
+
+
+class UniqueConstraintTests(APITestCase):
+
+    def test_duplicate_create(self):
+        company = self.make_company()
+        application = self.make_application(company)
+        cases = [
+            ('/api/companies', {'user_id': self.user.pk, 'name': 'Acme', 'location': 'Paris'}, 'Company Already Exists'),
+            ('/api/employees', {'user_id': self.user.pk, 'company_id': company.pk, 'name': 'Jane', 'job_title': 'CTO',
+                                'contacted': ContactStatus.SENT.name}, 'Employee Already Exists'),
+            ('/api/companyquestions', {'company_id': company.pk, 'question': 'Why us?', 'answer': 'A'}, 'Question Already Exists'),
+            ('/api/questions', {'user_id': self.user.pk, 'application_id': application.pk, 'question': 'Why?', 'answer': 'A'},
+             'Question Already Exists'),
+            ('/api/todos', {'user_id': self.user.pk, 'application_title': 'Apply'}, 'ToDo Already Exists'),
+        ]
+        self.make_employee(company)
+        CompanyQuestions.objects.create(company=company, question='Why us?', answer='A')
+        Question.objects.create(user=self.user, application=application, question='Why?', answer='A')
+        TodoList.objects.create(user=self.user, application_title='Apply')
+        for url, payload, message in cases:
+            with self.subTest(url=url):
+                response = self.client.post(url, payload, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data, {'non_field_errors': [message]})
+
+    def test_duplicate_update(self):
+        self.make_company()
+        company = self.make_company('Initech')
+        response = self.client.patch(f'/api/companies/{company.pk}', {'name': 'Acme'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'non_field_errors': ['Company Already Exists']})
+        self.assertEqual(Company.objects.get(pk=company.pk).name, 'Initech')
+
+    def test_other_users_may_reuse_names(self):
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.make_company(user=other)
+        response = self.client.post('/api/companies', {'user_id': self.user.pk, 'name': 'Acme', 'location': 'Paris'}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+
+    def test_database_check(self):
+        self.assertEqual(check_expression_indexes(None, databases=['default']), [])
+        with mock.patch.object(connection.features, 'supports_expression_indexes', False):
+            self.assertEqual(check_expression_indexes(None), [])
+            errors = check_expression_indexes(None, databases=['default'])
+        self.assertEqual({error.obj for error in errors}, {CompanyQuestions, Question, TodoList})
+        self.assertEqual({error.id for error in errors}, {'JobLanderAPI.E002'})
+
+
+class MergeDuplicatesMigrationTests(TransactionTestCase):
+    # Rows written before 0014 may break its constraints; they are merged
+    before = [('JobLanderAPI', '0013_remove_companyquestions_user_company_user_and_more')]
+    after = [('JobLanderAPI', '0014_indexes_and_unique_constraints')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.apps = executor.loader.project_state(self.before).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged(self):
+        model = self.apps.get_model
+        user = model('auth', 'User').objects.create(username='user')
+        companies = [model('JobLanderAPI', 'Company').objects.create(user=user, name='Acme', location='Remote', description=description)
+                     for description in ['', 'Rockets', 'Anvils']]
+        employees = [model('JobLanderAPI', 'Employee').objects.create(user=user, company=company, name='Jane', job_title='CTO',
+                                                                      contacted=ContactStatus.SENT.name) for company in companies]
+        application = model('JobLanderAPI', 'Application').objects.create(
+            user=user, company=companies[2], job_title='Engineer', job_type='Full-time', description='Python',
+            stage=Stage.APPLIED.name, status=ApplicationStatus.PENDING.name)
+        application.contacted_employees.add(employees[1], employees[2])
+        for answer in ['First', 'Second', 'First']:
+            model('JobLanderAPI', 'CompanyQuestions').objects.create(company=companies[1], question='Why us?', answer=answer)
+            model('JobLanderAPI', 'Question').objects.create(user=user, application=application, question='Why?', answer=answer)
+        for completed in [False, True]:
+            model('JobLanderAPI', 'TodoList').objects.create(user=user, application_title='Apply', completed=completed)
+
+        executor = MigrationExecutor(connection)
+        with self.assertLogs('JobLanderAPI.migrations', 'DEBUG') as logs:
+            executor.migrate(self.after)
+        self.assertIn('Merged duplicate companies (2 rows)', logs.output[0])
+        model = executor.loader.project_state(self.after).apps.get_model
+
+        self.assertEqual(list(model('JobLanderAPI', 'Company').objects.values_list('pk', 'description')),
+                         [(companies[0].pk, 'Rockets')])
+        employee = model('JobLanderAPI', 'Employee').objects.get()
+        self.assertEqual((employee.pk, employee.company_id), (employees[0].pk, companies[0].pk))
+        application = model('JobLanderAPI', 'Application').objects.get()
+        self.assertEqual(application.company_id, companies[0].pk)
+        self.assertEqual(list(application.contacted_employees.values_list('pk', flat=True)), [employee.pk])
+        self.assertEqual(model('JobLanderAPI', 'CompanyQuestions').objects.get().answer, 'First\n\nSecond')
+        self.assertEqual(model('JobLanderAPI', 'Question').objects.get().answer, 'First\n\nSecond')
+        self.assertTrue(model('JobLanderAPI', 'TodoList').objects.get().completed)
+
+
+class SearchTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.acme = self.make_company('Acme Rockets')
+        self.initech = self.make_company('Initech', location='Austin')
+        self.backend = self.make_application(self.acme, job_title='Backend Engineer')
+        self.frontend = self.make_application(self.initech, job_title='Frontend Engineer')
+        self.manager = self.make_application(self.initech, job_title='Engineering Manager')
+
+    def search(self, url, term, **params):
+        response = self.client.get(url, {'search': term, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['id'] for row in response.data['results']]
+
+    def test_prefix_and_related_fields(self):
+        self.assertCountEqual(self.search('/api/applications', 'engineer'), [self.backend.pk, self.frontend.pk, self.manager.pk])
+        self.assertCountEqual(self.search('/api/applications', 'initech'), [self.frontend.pk, self.manager.pk])
+        # Every term must match, in any of the fields
+        self.assertEqual(self.search('/api/applications', 'rock engineer'), [self.backend.pk])
+        self.assertEqual(self.search('/api/applications', 'nothing'), [])
+
+    def test_ranked_unless_ordered(self):
+        twice = self.make_application(self.acme, job_title='Manager, Product Manager')
+        self.assertEqual(self.search('/api/applications', 'manager'), [twice.pk, self.manager.pk])
+        self.assertEqual(self.search('/api/applications', 'manager', ordering='id'), [self.manager.pk, twice.pk])
+
+    def test_rebuild_index(self):
+        SearchToken.objects.all().delete()
+        self.assertEqual(self.search('/api/companies', 'initech'), [])
+        rebuild_index(self.user)
+        self.assertEqual(self.search('/api/companies', 'initech'), [self.initech.pk])
+
+    def test_index_follows_writes(self):
+        response = self.client.patch(f'/api/companies/{self.acme.pk}', {'name': 'Globex'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.search('/api/companies', 'acme'), [])
+        self.assertEqual(self.search('/api/companies', 'globex'), [self.acme.pk])
+        self.client.delete(f'/api/companies/{self.initech.pk}')
+        self.assertFalse(SearchToken.objects.filter(kind='company', object_id=self.initech.pk).exists())
+
+    def test_other_users_rows_never_match(self):
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.make_application(self.make_company('Acme Rockets', user=other), job_title='Backend Engineer')
+        self.assertEqual(self.search('/api/applications', 'backend'), [self.backend.pk])
+
+    def test_same_results_as_icontains(self):
+        for term in ['eng', 'initech engineer', 'austin']:
+            for url in ['/api/applications', '/api/companies']:
+                with self.subTest(term=term, url=url):
+                    indexed = self.search(url, term, ordering='id')
+                    with override_settings(SEARCH_BACKEND='like'):
+                        self.assertEqual(self.search(url, term, ordering='id'), indexed)
+
+
+@override_settings(SEARCH_BACKEND='fulltext')
+class FullTextSearchTests(APITestCase):
+    # SQLite has no MATCH ... AGAINST: the MySQL queries are checked as SQL,
+    # the icontains fallback by running it
+
+    def setUp(self):
+        super().setUp()
+        self.acme = self.make_company('Acme Rockets')
+        self.application = self.make_application(self.acme, job_title='Head of Engineering')
+        self.backend = search.FullTextSearchBackend()
+
+    def test_query(self):
+        queryset = self.backend.search(Application.objects.all(), ['job_title', 'company__name'], ['Rock', 'engineer'],
+                                       self.user, rank=True)
+        sql = str(queryset.query)
+        # Each term in any of the fields, ranked on the application's own fields
+        self.assertEqual(sql.count('IN BOOLEAN MODE'), 5)
+        self.assertIn('MATCH ("JobLanderAPI_company"."name") AGAINST (rock* IN BOOLEAN MODE) > 0', sql)
+        self.assertIn('MATCH ("JobLanderAPI_application"."job_title") AGAINST (rock* engineer* IN BOOLEAN MODE) AS "search_rank"', sql)
+
+    def test_terms_fulltext_skips(self):
+        fields = ['job_title', 'company__name']
+        self.assertTrue(self.backend.supports(Application, fields, ['head engineering']))
+        for term in ['head for engineering', 'the', 'qa', 'c++']:
+            with self.subTest(term=term):
+                self.assertFalse(self.backend.supports(Application, fields, [term]))
+        response = self.client.get('/api/applications', {'search': 'head of eng'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.application.pk])
+
+
+@override_settings(CACHE_SHARED=True)
+class AnalyticsCacheTests(APITestCase):
+    # Versions are bumped on commit, which the test transaction never does
+    # unless the callbacks are run by captureOnCommitCallbacks
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company = self.make_company()
+            self.make_application(self.company)
+
+    def statistics(self):
+        response = self.client.get('/api/statistics')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_hit_without_queries(self):
+        self.assertEqual(self.statistics()['total_applications'], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.statistics()['total_applications'], 1)
+        self.assertEqual(versions.cache_stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_writes_invalidate(self):
+        self.statistics()
+        with self.captureOnCommitCallbacks(execute=True):
+            application = self.make_application(self.company)
+        self.assertEqual(self.statistics()['total_applications'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/applications/{application.pk}', {'status': ApplicationStatus.REJECTED.name}, format='json')
+        self.assertEqual(self.statistics()['rejected_applications'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/api/applications/bulk', {'ids': [application.pk]}, format='json')
+        self.assertEqual(self.statistics()['total_applications'], 1)
+
+    def test_other_users_keep_their_entries(self):
+        other = self.client_for(User.objects.create_user('other', 'other@example.com', 'password'))
+        other.get('/api/statistics')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_application(self.company)
+        with self.assertNumQueries(0):
+            other.get('/api/statistics')
+
+    def test_bumped_after_commit(self):
+        before = versions.get_version(self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            for _ in range(3):
+                self.make_application(self.company)
+        self.assertEqual(versions.get_version(self.user.pk), before)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(versions.get_version(self.user.pk), before)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_kept_briefly_without_a_shared_cache(self):
+        self.statistics()
+        with self.assertNumQueries(0):
+            self.statistics()
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 11):
+            with CaptureQueriesContext(connection) as queries:
+                self.statistics()
+        self.assertTrue(queries)
+        with override_settings(ANALYTICS_LOCAL_CACHE_TIMEOUT=0), CaptureQueriesContext(connection) as queries:
+            self.statistics()
+        self.assertTrue(queries)
+
+    def test_deploy_check(self):
+        self.assertEqual(check_shared_cache(None), [])
+        with override_settings(CACHE_SHARED=False):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['JobLanderAPI.W001'])
+        with override_settings(CACHE_SHARED=None):
+            # The local memory cache of the tests is per process
+            self.assertEqual(len(check_shared_cache(None)), 1)
+
+
+class RollupConsistencyTests(APITestCase):
+    # After any sequence of writes the buckets equal a recount of Application
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.make_company()
+
+    def assert_consistent(self):
+        buckets = {
+            (row['user_id'], row['day'], row['status'], row['stage']): row['count']
+            for row in ApplicationDailyRollup.objects.values('user_id', 'day', 'status', 'stage', 'count')
+        }
+        counts = Application.objects.values('user_id', 'submission_date', 'status', 'stage').annotate(total=Count('id'))
+        self.assertEqual(buckets, {
+            (row['user_id'], row['submission_date'], row['status'], row['stage']): row['total'] for row in counts
+        })
+
+    def test_single_writes(self):
+        application = self.make_application(self.company)
+        self.assert_consistent()
+        response = self.client.patch(f'/api/applications/{application.pk}', {'status': ApplicationStatus.REJECTED.name,
+                                     'submission_date': str(date.today() - timedelta(days=3))}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assert_consistent()
+        # Emptied buckets are removed
+        self.assertEqual(ApplicationDailyRollup.objects.count(), 1)
+        application.refresh_from_db()
+        application.description = 'Go'
+        application.save(update_fields=['description'])
+        self.assertEqual(self.client.delete(f'/api/applications/{application.pk}').status_code, 204)
+        self.assert_consistent()
+        self.assertFalse(ApplicationDailyRollup.objects.exists())
+
+    def test_saves_read_no_previous_bucket(self):
+        application = Application.objects.get(pk=self.make_application(self.company).pk)
+        for field, value in [('status', ApplicationStatus.REJECTED.name), ('stage', Stage.INTERVIEW.name)]:
+            setattr(application, field, value)
+            with CaptureQueriesContext(connection) as queries:
+                application.save()
+            self.assertFalse([query for query in queries if query['sql'].startswith('SELECT')
+                              and Application._meta.db_table in query['sql']])
+            self.assert_consistent()
+
+    def test_save_and_rollups_in_one_transaction(self):
+        application = self.make_application(self.company)
+        application.status = ApplicationStatus.REJECTED.name
+        with mock.patch.object(rollups, 'apply_deltas', side_effect=DatabaseError('lost')):
+            with self.assertRaises(DatabaseError):
+                application.save()
+        self.assertEqual(Application.objects.get(pk=application.pk).status, ApplicationStatus.PENDING.name)
+        self.assert_consistent()
+
+    def test_bulk_writes(self):
+        items = [{'user_id': self.user.pk, 'company_id': self.company.pk, 'job_title': f'Engineer {i}',
+                  'job_type': 'Full-time', 'description': 'Python', 'status': ApplicationStatus.PENDING.name,
+                  'stage': Stage.APPLIED.name, 'submission_date': str(date.today() - timedelta(days=i % 3)),
+                  'contacted_employees': []}
+                 for i in range(9)]
+        response = self.client.post('/api/applications/bulk', items, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assert_consistent()
+        ids = [row['id'] for row in response.data]
+        response = self.client.patch('/api/applications/bulk', [
+            {'id': pk, 'stage': Stage.INTERVIEW.name, 'status': ApplicationStatus.ACCEPTED.name} for pk in ids[:5]
+        ], format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assert_consistent()
+        self.client.delete('/api/applications/bulk', {'ids': ids[3:7]}, format='json')
+        self.assert_consistent()
+
+    def test_cascades(self):
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        for user in (self.user, other):
+            self.make_application(self.make_company('Initech', user=user))
+        self.make_application(self.company)
+        self.company.delete()
+        other.delete()
+        self.assert_consistent()
+
+    def test_rebuild(self):
+        for _ in range(3):
+            self.make_application(self.company)
+        Application.objects.update(stage=Stage.INTERVIEW.name)
+        self.assertEqual(rebuild_rollups(self.user), 1)
+        self.assert_consistent()
+
+    def test_timeseries_reads_the_rollups(self):
+        for days, status in [(0, ApplicationStatus.PENDING), (1, ApplicationStatus.REJECTED), (40, ApplicationStatus.PENDING)]:
+            self.make_application(self.company, submission_date=date.today() - timedelta(days=days), status=status.name)
+        start = date.today() - timedelta(days=9)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/timeseries', {'interval': 'day', 'points': 10, 'start_date': str(start)})
+        self.assertEqual(response.status_code, 200, response.data)
+        results = response.data['results']
+        self.assertEqual(sum(point['total_applications'] for point in results), 2)
+        self.assertEqual(sum(point['rejections'] for point in results), 1)
+        self.assertFalse([query for query in queries if Application._meta.db_table + '"' in query['sql']])
+
+
+class DashboardTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        company = self.make_company()
+        for days, status, stage in [(0, ApplicationStatus.PENDING, Stage.APPLIED),
+                                    (2, ApplicationStatus.REJECTED, Stage.INTERVIEW),
+                                    (20, ApplicationStatus.ACCEPTED, Stage.OFFER)]:
+            self.make_application(company, submission_date=date.today() - timedelta(days=days),
+                                  status=status.name, stage=stage.name)
+        self.params = {'interval': 'week', 'points': 6, 'start_date': str(date.today() - timedelta(weeks=5))}
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_one_query_for_every_section(self):
+        with self.assertNumQueries(1):
+            dashboard = self.get('/api/dashboard', **self.params)
+        self.assertEqual(dashboard, {
+            'statistics': self.get('/api/statistics'),
+            'percents': self.get('/api/percents'),
+            'timeseries': self.get('/api/timeseries', **self.params),
+        })
+        self.assertEqual(dashboard['statistics']['total_applications'], 3)
+
+    def test_sections(self):
+        self.assertEqual(list(self.get('/api/dashboard', sections='timeseries,statistics', **self.params)),
+                         ['statistics', 'timeseries'])
+        self.assertEqual(list(self.get('/api/dashboard', sections='percents')), ['percents'])
+
+    def test_invalid_parameters(self):
+        for params in [{'sections': 'statistics,nope'}, {'points': 0}, {'interval': 'year'}, {'start_date': 'May'}]:
+            with self.subTest(params=params):
+                response = self.client.get('/api/dashboard', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+
+@override_settings(CACHE_SHARED=True)
+class SparseFieldsTests(APITestCase):
+    # Without the query reading ETags from the rows, as in QueryCountTests
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.make_company()
+        self.application = self.make_application(self.company)
+        self.question = Question.objects.create(user=self.user, application=self.application, question='Why?', answer='A')
+
+    def question_row(self, **params):
+        response = self.client.get('/api/questions', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results'][0]
+
+    def test_unchanged_without_parameters(self):
+        row = self.question_row()
+        self.assertEqual(row['application']['company']['name'], 'Acme')
+        self.assertEqual(row['user']['username'], 'user')
+
+    def test_fields(self):
+        self.assertEqual(self.question_row(fields='question'), {'id': self.question.pk, 'question': 'Why?'})
+
+    def test_unexpanded_relations_are_ids(self):
+        row = self.question_row(fields='question,application,user')
+        self.assertEqual(row, {'id': self.question.pk, 'question': 'Why?',
+                               'application': self.application.pk, 'user': self.user.pk})
+
+    def test_nested_expansion(self):
+        row = self.question_row(fields='application.job_title,application.company', expand='application')
+        self.assertEqual(row, {'id': self.question.pk, 'application': {
+            'id': self.application.pk, 'job_title': 'Backend Engineer', 'company': self.company.pk,
+        }})
+        row = self.question_row(fields='application.company.name', expand='application.company')
+        self.assertEqual(row['application']['company'], {'id': self.company.pk, 'name': 'Acme'})
+
+    def test_unexpanded_relations_are_not_joined(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.question_row(fields='question,application')
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn(Company._meta.db_table, queries[-1]['sql'])
+
+    def test_writes_ignore_the_parameters(self):
+        response = self.client.patch(f'/api/questions/{self.question.pk}?fields=id', {'answer': 'B'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['answer'], 'B')
+
+
+@override_settings(CACHE_SHARED=True)
+class ConditionalGetTests(APITestCase):
+    # Versions are bumped by on-commit callbacks, see AnalyticsCacheTests
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+            self.company = self.make_company()
+
+    def test_not_modified(self):
+        response = self.client.get('/api/companies')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/companies', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(f'/api/companies/{self.company.pk}', HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get('/api/companies')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/companies/{self.company.pk}', {'location': 'Paris'}, format='json')
+        response = self.client.get('/api/companies', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['location'], 'Paris')
+
+    def test_etag_per_user_and_url(self):
+        etag = self.client.get('/api/companies')['ETag']
+        self.assertNotEqual(self.client.get('/api/companies', {'fields': 'name'})['ETag'], etag)
+        other = self.client_for(User.objects.create_user('other', 'other@example.com', 'password'))
+        self.assertEqual(other.get('/api/companies', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_last_modified(self):
+        versions.cache.set(versions.version_key(self.user.pk, versions.DATA), time.time_ns() - 5 * 10 ** 9, None)
+        response = self.client.get('/api/companies')
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get('/api/companies', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        # A version from the current second is not announced yet
+        versions.invalidate(self.user.pk, versions.DATA)
+        self.assertNotIn('Last-Modified', self.client.get('/api/companies'))
+
+    @override_settings(CACHE_SHARED=False)
+    def test_from_the_rows_without_a_shared_cache(self):
+        application = self.make_application(self.company)
+        employee = self.make_employee(self.company, 'Jane')
+        etag = self.client.get('/api/companies')['ETag']
+        response = self.client.get('/api/companies', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('Last-Modified', response)
+        # No on-commit callbacks run: the rows themselves change the ETag
+        for write in [
+            lambda: application.contacted_employees.add(employee),
+            lambda: application.contacted_employees.remove(employee),
+            lambda: self.client.patch(f'/api/companies/{self.company.pk}', {'location': 'Paris'}, format='json'),
+            lambda: self.client.delete(f'/api/employees/{employee.pk}'),
+        ]:
+            write()
+            response = self.client.get('/api/companies', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+        other = self.client_for(User.objects.create_user('other', 'other@example.com', 'password'))
+        self.assertEqual(other.get('/api/companies', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ExportTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        company = self.make_company('Acme, Inc.')
+        employees = [self.make_employee(company, name) for name in ('Zoe', 'Adam')]
+        self.applications = [self.make_application(company, job_title=f'Engineer {i}') for i in range(5)]
+        self.applications[0].contacted_employees.add(*employees)
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.make_application(self.make_company(user=other))
+
+    def export(self, resource, format):
+        response = self.client.get(f'/api/export/{resource}', {'format': format})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="{resource}.{format}"')
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('applications', 'csv'))))
+        self.assertEqual([int(row['id']) for row in rows], [a.pk for a in self.applications])
+        self.assertEqual(rows[0]['company'], 'Acme, Inc.')
+        self.assertEqual(rows[0]['contacted_employees'], 'Adam; Zoe')
+        self.assertEqual(rows[1]['contacted_employees'], '')
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export('companies', 'ndjson').splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['Acme, Inc.'])
+
+    def test_chunks(self):
+        # Two queries per chunk of applications: the rows and their contacts
+        with self.assertNumQueries(6):
+            chunks = list(ApplicationExport().iter_chunks(self.user, chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+
+    def test_unknown_resource(self):
+        response = self.client.get('/api/export/todos', {'format': 'csv'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class ImportTests(APITestCase):
+
+    def upload(self, resource, name, content, **data):
+        response = self.client.post(f'/api/import/{resource}', {'file': SimpleUploadedFile(name, content.encode()), **data},
+                                    format='multipart')
+        return response
+
+    def test_csv(self):
+        company = self.make_company()
+        self.make_employee(company, 'Jane')
+        content = (
+            'company,company_location,job_title,job_type,status,stage,description,contacted_employees\n'
+            'Acme,,Backend,Full-time,PENDING,APPLIED,Python,Jane\n'
+            'Initech,Austin,Frontend,Full-time,REJECTED,INTERVIEW,React,\n'
+            'Initech,,Data,Full-time,NOT_A_STATUS,APPLIED,SQL,\n'
+            'Acme,,Platform,Full-time,PENDING,APPLIED,Go,Bob\n'
+        )
+        response = self.upload('applications', 'history.csv', content)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual({key: response.data[key] for key in ('created', 'failed', 'companies_created')},
+                         {'created': 2, 'failed': 2, 'companies_created': 1})
+        self.assertEqual([(error['row'], list(error['errors'])) for error in response.data['errors']],
+                         [(3, ['status']), (4, ['contacted_employees'])])
+        self.assertEqual(Company.objects.get(name='Initech').location, 'Austin')
+        self.assertEqual(list(Application.objects.get(job_title='Backend').contacted_employees.values_list('name', flat=True)),
+                         ['Jane'])
+
+    def test_json_array_and_ndjson(self):
+        records = [{'name': f'Company {i}', 'location': 'Remote'} for i in range(3)]
+        response = self.upload('companies', 'companies.json', json.dumps(records))
+        self.assertEqual(response.data['created'], 3, response.data)
+        response = self.upload('companies', 'companies', '{"name": "Globex", "location": "Remote"}\n{"name": \n',
+                               format='ndjson')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+
+    def test_records_cut_by_the_read_size(self):
+        records = [{'name': 'x' * 100, 'n': i} for i in range(50)]
+        with mock.patch('JobLanderAPI.imports.READ_SIZE', 7):
+            parsed = list(iter_records(io.BytesIO(json.dumps(records).encode()), 'rows.json'))
+        self.assertEqual(parsed, records)
+
+    def test_malformed_files(self):
+        for name, content in [('a.json', '{"name": "Acme"}'), ('a.json', '[{"name": "Acme"} {"name": "B"}]')]:
+            with self.subTest(content=content):
+                response = self.upload('companies', name, content)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('file', response.data)
+        self.assertFalse(Company.objects.exists())
+
+    def test_export_round_trip(self):
+        company = self.make_company()
+        self.make_employee(company, 'Jane')
+        self.make_application(company).contacted_employees.add(*Employee.objects.all())
+        exported = b''.join(self.client.get('/api/export/applications', {'format': 'csv'}).streaming_content).decode()
+        Application.objects.all().delete()
+        response = self.upload('applications', 'applications.csv', exported)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 0), response.data)
+        self.assertEqual(Application.objects.get().contacted_employees.get().name, 'Jane')
+
+
+    def test_queries_per_chunk(self):
+        def import_rows(count, offset):
+            content = 'company,job_title,job_type,status,stage\n' + ''.join(
+                f'Company {offset + i},Engineer,Full-time,PENDING,APPLIED\n' for i in range(count)
+            )
+            with CaptureQueriesContext(connection) as queries:
+                response = self.upload('applications', 'history.csv', content)
+            self.assertEqual(response.data['created'], count, response.data)
+            return len(queries)
+
+        # The first import creates the rollup buckets
+        import_rows(1, 0)
+        features = type(connection.features)
+        with mock.patch.object(features, 'can_return_rows_from_bulk_insert', False):
+            with mock.patch('JobLanderAPI.imports.IMPORT_BATCH_SIZE', 2):
+                two_small_chunks = import_rows(4, 100)
+            with mock.patch('JobLanderAPI.imports.IMPORT_BATCH_SIZE', 10):
+                two_large_chunks = import_rows(20, 200)
+                three_large_chunks = import_rows(30, 300)
+        # Companies and applications are written in bulk: the count depends on the chunks, not the rows
+        self.assertEqual(two_small_chunks, two_large_chunks)
+        # Lookups, one INSERT each for companies, applications and contacts, search, rollups and versions
+        self.assertLessEqual(three_large_chunks - two_large_chunks, 16)
+        self.assertEqual(Application.objects.count(), 55)
+        self.assertEqual(Application.objects.filter(company__name='Company 329').count(), 1)
+
+
+class BlobTestCase(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        shutil.rmtree(os.path.join(self.media_root, blobs.CV_DIR), ignore_errors=True)
+        self.deletes = Task.objects.filter(name=tasks.task_name(blobs.delete_unreferenced))
+
+    def stored_files(self):
+        path = os.path.join(self.media_root, blobs.CV_DIR)
+        return sorted(name for name in os.listdir(path) if os.path.isfile(os.path.join(path, name)))
+
+    def run_deletes(self):
+        for task in self.deletes:
+            blobs.delete_unreferenced(*task.args)
+            task.delete()
+
+
+class BlobStorageTests(BlobTestCase):
+
+    def test_same_content_is_stored_once(self):
+        first, second = self.make_cv(name='a.pdf'), self.make_cv(name='b.PDF')
+        self.assertEqual(first.cv.name, second.cv.name)
+        self.assertRegex(first.cv.name, r'^cvs/[0-9a-f]{64}\.pdf$')
+        self.assertEqual(CVBlob.objects.get().refs, 2)
+        self.assertNotEqual(self.make_cv(b'other').cv.name, first.cv.name)
+
+    def test_upload(self):
+        upload = SimpleUploadedFile('resume.pdf', b'%PDF python')
+        response = self.client.post('/api/cvs', {'cv': upload, 'user_id': self.user.pk}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        cv = CV.objects.get()
+        self.assertEqual(cv.cv.name, blobs.blob_name(ContentFile(b'%PDF python'), 'resume.pdf'))
+        self.assertEqual(cv.cv.read(), b'%PDF python')
+        self.assertEqual(os.listdir(os.path.join(self.media_root, blobs.INCOMING_DIR)), [])
+
+    def test_last_release_deletes_the_file(self):
+        first, second = self.make_cv(), self.make_cv()
+        name = first.cv.name
+        first.delete()
+        self.assertEqual(CVBlob.objects.get().refs, 1)
+        self.assertFalse(self.deletes.exists())
+        second.cv.save('new.txt', ContentFile(b'rewritten'))
+        self.assertEqual(self.deletes.get().args[0], name)
+        self.run_deletes()
+        self.assertEqual(self.stored_files(), [os.path.basename(second.cv.name)])
+        self.assertEqual(CVBlob.objects.get().name, second.cv.name)
+
+    def test_reupload_before_the_delete_keeps_the_file(self):
+        name = self.make_cv().cv.name
+        CV.objects.all().delete()
+        self.make_cv()
+        self.run_deletes()
+        self.assertEqual(self.stored_files(), [os.path.basename(name)])
+
+    def test_concurrent_store_of_the_same_content(self):
+        content = ContentFile(b'python django')
+        name = blobs.blob_name(content, 'cv.txt')
+        blobs.cv_storage().save(name, ContentFile(b'python django'))
+        # The other upload stores the file right after this one looked for it
+        with mock.patch('JobLanderAPI.blobs.refresh', side_effect=[False, True]):
+            self.assertEqual(blobs.store(content, 'cv.txt'), name)
+        self.assertEqual(self.stored_files(), [os.path.basename(name)])
+
+
+class GarbageCollectionTests(BlobTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.kept = self.make_cv().cv.name
+        storage = blobs.cv_storage()
+        self.orphan = storage.save(f'{blobs.CV_DIR}/orphan.txt', ContentFile(b'orphan'))
+        self.young = storage.save(f'{blobs.CV_DIR}/young.txt', ContentFile(b'young'))
+        self.upload = storage.save(f'{blobs.INCOMING_DIR}/tmp.upload', ContentFile(b'partial'))
+        old = time.time() - 2 * 3600
+        for name in (self.kept, self.orphan, self.upload):
+            os.utime(storage.path(name), (old, old))
+
+    def gc(self, *args):
+        out = io.StringIO()
+        call_command('gc_cv_files', '--batch-size=1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_old_unreferenced_files(self):
+        self.assertIn('Scanned 4 files. Deleted 2 files, 13 bytes reclaimed.', self.gc())
+        self.assertEqual(self.stored_files(), sorted(os.path.basename(name) for name in (self.kept, self.young)))
+        self.assertFalse(os.listdir(os.path.join(self.media_root, blobs.INCOMING_DIR)))
+
+    def test_dry_run(self):
+        self.assertIn('Would delete 2 files', self.gc('--dry-run'))
+        self.assertEqual(len(self.stored_files()), 3)
+
+    def test_min_age(self):
+        self.assertIn('Deleted 3 files', self.gc('--min-age=0'))
+        self.assertEqual(self.stored_files(), [os.path.basename(self.kept)])
+
+
+def make_pdf_with_object_stream(line):
+    # PDF 1.5 layout: every dictionary in an object stream, found through a cross-reference stream
+    content = zlib.compress(f'BT /F1 11 Tf 72 760 Td ({line}) Tj ET'.encode())
+    compressed = {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        3: b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>',
+        5: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    }
+    header, body = b'', b''
+    for number, obj in compressed.items():
+        header += b'%d %d ' % (number, len(body))
+        body += obj + b' '
+    stream = zlib.compress(header + body)
+    out = io.BytesIO()
+    out.write(b'%PDF-1.5\n')
+    offsets = {4: out.tell()}
+    out.write(b'4 0 obj\n<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(content) + content + b'\nendstream\nendobj\n')
+    offsets[6] = out.tell()
+    out.write(b'6 0 obj\n<< /Type /ObjStm /N 4 /First %d /Length %d /Filter /FlateDecode >>\nstream\n'
+              % (len(header), len(stream)) + stream + b'\nendstream\nendobj\n')
+    offsets[7] = out.tell()
+    entries = b'\x00' + bytes(6)
+    for number in range(1, 8):
+        if number in compressed:
+            entries += b'\x02' + (6).to_bytes(4, 'big') + list(compressed).index(number).to_bytes(2, 'big')
+        else:
+            entries += b'\x01' + offsets[number].to_bytes(4, 'big') + bytes(2)
+    out.write(b'7 0 obj\n<< /Type /XRef /Size 8 /W [1 4 2] /Root 1 0 R /Length %d >>\nstream\n' % len(entries)
+              + entries + b'\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n' % offsets[7])
+    return out.getvalue()
+
+
+class CVTextTests(TestCase):
+
+    def extract(self, data, name):
+        return cvtext.extract_text(io.BytesIO(data), name)
+
+    def encrypted(self, password):
+        writer = PdfWriter(clone_from=PdfReader(io.BytesIO(make_pdf(['Python Django']))))
+        writer.encrypt(user_password=password, owner_password='owner', algorithm='AES-128')
+        out = io.BytesIO()
+        writer.write(out)
+        return out.getvalue()
+
+    def test_pdf(self):
+        self.assertIn('Python Django', self.extract(make_pdf(['Python Django', 'SQL']), 'cv.pdf'))
+
+    def test_object_streams(self):
+        self.assertIn('Kubernetes', self.extract(make_pdf_with_object_stream('Kubernetes'), 'cv.pdf'))
+
+    def test_broken_xref(self):
+        data = make_pdf(['Python Django'])
+        start = data.rindex(b'startxref')
+        self.assertIn('Python Django', self.extract(data[:start] + b'startxref\n999999\n%%EOF\n', 'cv.pdf'))
+        # Every entry of the table points at the wrong offset
+        self.assertIn('Python Django', self.extract(re.sub(rb'\d{10}(?= 00000 n)', b'0000000003', data), 'cv.pdf'))
+
+    def test_encrypted(self):
+        self.assertIn('Python Django', self.extract(self.encrypted(''), 'cv.pdf'))
+        with self.assertRaises(cvtext.UnreadableFile):
+            self.extract(self.encrypted('secret'), 'cv.pdf')
+
+    def test_docx(self):
+        document = Document()
+        document.sections[0].header.paragraphs[0].text = 'Jane Doe'
+        document.add_paragraph('Développeuse Python')
+        document.add_table(rows=1, cols=1).cell(0, 0).text = 'Кириллица 日本語'
+        out = io.BytesIO()
+        document.save(out)
+        self.assertEqual(self.extract(out.getvalue(), 'cv.docx').split('\n'), ['Jane Doe', 'Développeuse Python', 'Кириллица 日本語'])
+
+    def test_malformed_files(self):
+        missing = io.BytesIO()
+        with zipfile.ZipFile(missing, 'w') as archive:
+            archive.writestr('word/document.xml', '<w:document')
+        cut = make_docx(['Python'])
+        for data, name in [(missing.getvalue(), 'cv.docx'), (cut[:len(cut) // 2], 'cv.docx'), (b'%PDF-1.4\n%%EOF', 'cv.pdf'),
+                           (b'GIF89a', 'cv.gif')]:
+            with self.subTest(name=name, data=data[:20]):
+                with self.assertRaises(cvtext.UnreadableFile):
+                    self.extract(data, name)
+
+
+class ATSScoreTests(BlobTestCase):
+
+    def setUp(self):
+        super().setUp()
+        ats.cv_terms.cache_clear()
+        self.company = self.make_company()
+
+    def scored(self, cv):
+        application = self.make_application(self.company, description='Python, Django and Kubernetes', submitted_cv=cv)
+        ats.score_applications([application.pk])
+        application.refresh_from_db()
+        return application.ats_score
+
+    def test_scores(self):
+        self.assertEqual(self.scored(self.make_cv(make_pdf(['Python', 'Django']), 'cv.pdf')), 67)
+        self.assertEqual(self.scored(self.make_cv(make_docx(['Kubernetes']), 'cv.docx')), 33)
+
+    def test_unreadable_cv_has_no_score(self):
+        with self.assertLogs('JobLanderAPI.ats', 'WARNING'):
+            self.assertIsNone(self.scored(self.make_cv(b'%PDF-1.4 broken', 'cv.pdf')))
+        self.assertEqual(CVBlob.objects.get().text, '')
+
+    def test_replaced_file_is_scored_again(self):
+        cv = self.make_cv(b'%PDF-1.4 broken', 'cv.pdf')
+        application = self.make_application(self.company, description='Python', submitted_cv=cv, ats_score=None)
+        cv.cv.save('cv.txt', ContentFile(b'Python'))
+        ats.rescore_cv(cv.pk)
+        application.refresh_from_db()
+        self.assertEqual(application.ats_score, 100)
+
+
+class TermMatrixTests(BlobTestCase):
+
+    def setUp(self):
+        super().setUp()
+        ats.cv_terms.cache_clear()
+
+    def naive_score(self, cv_terms, description):
+        weights = ats.description_weights(description)
+        return round(100 * sum(weight for term, weight in weights.items() if term in cv_terms) / sum(weights.values()))
+
+    def test_scores_match_the_definition(self):
+        descriptions = ['Python and Django developers', 'Go, Kubernetes and Python', 'Python and Django developers', 'SQL']
+        matrix = ats.TermMatrix(descriptions)
+        self.assertEqual(len(matrix.rows), 3)
+        for cv_terms in [frozenset({'python', 'django'}), frozenset(ats.terms(' '.join(descriptions * 3) + ' rust java c'))]:
+            with self.subTest(cv_terms=sorted(cv_terms)):
+                self.assertEqual(matrix.scores(cv_terms, [matrix.add(d) for d in descriptions]),
+                                 [self.naive_score(cv_terms, d) for d in descriptions])
+
+    def test_one_matrix_per_batch(self):
+        company = self.make_company()
+        cvs = [self.make_cv(content, 'cv.txt') for content in (b'Python Django', b'Kubernetes', b'SQL')]
+        for i in range(12):
+            self.make_application(company, description=['Python and Django', 'Kubernetes and SQL'][i % 2], submitted_cv=cvs[i % 3])
+        with mock.patch('JobLanderAPI.ats.description_weights', wraps=ats.description_weights) as weights:
+            ats.rescore(Application.objects.all())
+        # Each distinct description is weighed once, whatever the number of CVs
+        self.assertEqual(weights.call_count, 2)
+        self.assertEqual(
+            {(a.description, a.submitted_cv_id, a.ats_score) for a in Application.objects.all()},
+            {('Python and Django', cvs[0].pk, 100), ('Kubernetes and SQL', cvs[1].pk, 50),
+             ('Python and Django', cvs[2].pk, 0), ('Kubernetes and SQL', cvs[0].pk, 0),
+             ('Python and Django', cvs[1].pk, 0), ('Kubernetes and SQL', cvs[2].pk, 50)},
+        )
+
+
+class AsyncViewTests(APITestCase):
+    # urls.py routes to the async views only under ASGI, so they are called
+    # directly here and compared with what the sync endpoints return
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+            company = self.make_company()
+            for i in range(3):
+                application = self.make_application(company, job_title=f'Engineer {i}',
+                                                    submission_date=date(2024, 1, 1) + timedelta(days=i))
+                Question.objects.create(user=self.user, application=application, question=f'Why {i}?', answer='Because')
+        self.factory = AsyncRequestFactory()
+        self.authorization = f'Bearer {AccessToken.for_user(self.user)}'
+
+    async def aget(self, view, path, **headers):
+        # Unlike RequestFactory, the headers cannot be passed as HTTP_* keywords
+        request = self.factory.get(path, headers={'Authorization': self.authorization, **headers})
+        return await view.as_view()(request)
+
+    async def assert_same(self, view, path):
+        response = await self.aget(view, path)
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(self.client.get)(path)
+        self.assertEqual(json.loads(response.render().content), expected.json())
+
+    async def test_same_results(self):
+        await self.assert_same(views.AsyncApplicationsView, '/api/applications?page_size=2&page=2')
+        await self.assert_same(views.AsyncApplicationsView, '/api/applications?cursor=&page_size=2&ordering=submission_date')
+        await self.assert_same(views.AsyncQuestionsView, '/api/questions?ordering=-question')
+        await self.assert_same(views.AsyncStatisticsView, '/api/statistics')
+        await self.assert_same(views.AsyncTimeSeriesView, '/api/timeseries?interval=week&points=4')
+
+    async def test_invalid_params(self):
+        self.assertEqual((await self.aget(views.AsyncTimeSeriesView, '/api/timeseries?interval=year')).status_code, 400)
+
+    async def test_authentication(self):
+        self.authorization = 'Bearer not-a-token'
+        self.assertEqual((await self.aget(views.AsyncApplicationsView, '/api/applications')).status_code, 401)
+        self.authorization = ''
+        self.assertEqual((await self.aget(views.AsyncStatisticsView, '/api/statistics')).status_code, 401)
+
+    async def test_not_modified(self):
+        for shared in (True, False):
+            with self.subTest(shared=shared), override_settings(CACHE_SHARED=shared):
+                etag = (await self.aget(views.AsyncApplicationsView, '/api/applications'))['ETag']
+                self.assertEqual(etag, (await sync_to_async(self.client.get)('/api/applications'))['ETag'])
+                response = await self.aget(views.AsyncApplicationsView, '/api/applications', **{'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304)
+
+    async def test_create(self):
+        application = await Application.objects.afirst()
+        body = {'user_id': self.user.pk, 'application_id': application.pk, 'question': 'Salary?', 'answer': 'Enough'}
+        request = self.factory.post('/api/questions', body,
+                                    content_type='application/json', headers={'Authorization': self.authorization})
+        response = await views.AsyncQuestionsView.as_view()(request)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(await Question.objects.filter(user=self.user, question='Salary?').aexists())
+
+
+class LoadTestTests(APITestCase):
+
+    def test_percentiles(self):
+        self.assertIsNone(loadtest.percentile([], 50))
+        self.assertEqual([loadtest.percentile(list(range(1, 101)), p) for p in loadtest.PERCENTILES], [50, 95, 99])
+        self.assertEqual(loadtest.summarize([0.2, 0.1], 1, 2), {
+            'requests': 2, 'errors': 1, 'rps': 1.0, 'p50_ms': 100.0, 'p95_ms': 200.0, 'p99_ms': 200.0,
+        })
+
+    def test_seed_users(self):
+        users = loadtest.seed_users(2, 10, seed=1)
+        self.assertEqual(Application.objects.filter(user_id=users[0]['id']).count(), 10)
+        for user in users:
+            self.assertTrue(user['username'].startswith(loadtest.USERNAME_PREFIX))
+            for model, key in ((Company, 'company'), (Employee, 'employee'), (Question, 'question'), (TodoList, 'todo')):
+                self.assertCountEqual(model.objects.filter(user_id=user['id']).values_list('id', flat=True), user['ids'][key])
+        # The data only depends on the seed
+        titles = lambda user: list(Application.objects.filter(user_id=user['id']).order_by('id').values_list('job_title', flat=True))
+        again = loadtest.seed_users(1, 10, seed=1)
+        self.assertEqual(titles(again[0]), titles(users[0]))
+        loadtest.delete_users(users + again)
+        self.assertFalse(User.objects.filter(username__startswith=loadtest.USERNAME_PREFIX).exists())
+
+    def test_every_step_succeeds(self):
+        # The steps of the mixed scenario in order, as count_queries() runs them
+        user = loadtest.seed_users(1, 10)[0]
+        session = loadtest.Session(0, user, access=str(AccessToken.for_user(User.objects.get(pk=user['id']))))
+        client = Client()
+        names = []
+        for step in loadtest.SCENARIOS['mixed']:
+            self.assertTrue(step.available(session), step.name)
+            method, path, body, headers = step.build(session)
+            content_type = headers.pop('Content-Type', 'application/octet-stream')
+            response = client.generic(method, path, body, content_type, headers=headers)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            self.assertEqual(response.status_code, step.expect, f'{step.name}: {content[:200]!r}')
+            step.done(session, response.status_code, content)
+            names.append(step.name)
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(session.todos, [])
+
+    def test_run_steps(self):
+        requests = []
+
+        async def handle(reader, writer):
+            # Keep-alive, with a fixed length or chunked body
+            try:
+                while head := await reader.readuntil(b'\r\n\r\n'):
+                    request_line, *lines = head.decode().split('\r\n')
+                    requests.append((request_line, 'Authorization: Bearer token' in lines))
+                    if request_line.startswith('GET /chunked'):
+                        writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n2\r\nok\r\n0\r\n\r\n')
+                    else:
+                        writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            steps = [loadtest.Step('chunked', 'GET', '/chunked'), loadtest.Step('missing', 'GET', '/missing')]
+            sessions = [loadtest.Session(index, access='token') for index in range(3)]
+            async with server:
+                return await loadtest.run_steps('127.0.0.1', port, sessions, steps, duration=0.2)
+
+        results, statuses = asyncio.run(run())
+        self.assertEqual(results['total']['requests'], results['chunked']['requests'])
+        self.assertEqual(results['missing']['errors'], statuses['missing 404'])
+        self.assertGreater(results['chunked']['requests'], 0)
+        self.assertTrue(all(authorized for _, authorized in requests))
+
+    def compare(self, before, after, **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as file:
+            json.dump({'meta': {}, 'endpoints': before}, file)
+        self.addCleanup(os.remove, file.name)
+        options = {'tolerance': 20, 'min_requests': 20, **options}
+        command = LoadTestCommand(stdout=io.StringIO())
+        command.compare({'endpoints': after}, file.name, options['tolerance'], options['min_requests'])
+        return command.stdout.getvalue()
+
+    def test_compare(self):
+        stats = {'requests': 100, 'rps': 100.0, 'p95_ms': 10.0, 'queries': 3}
+        self.compare({'a': stats}, {'a': {**stats, 'rps': 90.0, 'p95_ms': 11.0}})
+        for change in ({'p95_ms': 13.0}, {'rps': 70.0}, {'queries': 4}):
+            with self.assertRaisesMessage(CommandError, 'a'):
+                self.compare({'a': stats}, {'a': {**stats, **change}})
+        output = self.compare({'a': stats}, {'a': {**stats, 'requests': 5, 'p95_ms': 50.0}})
+        self.assertIn('not checked', output)
+
+
+class MetricsTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        settings_override = override_settings(METRICS_DIR=self.metrics_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for histogram in metrics.HISTOGRAMS.values():
+            histogram.series.clear()
+        # Flushed by collect() only, without the background thread
+        flusher = mock.patch.object(metrics, 'flusher', metrics.Flusher())
+        flusher.start()
+        self.addCleanup(flusher.stop)
+        self.staff = self.client_for(User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True))
+
+    def count(self, totals, view, method, name='joblander_request_duration_seconds'):
+        series = totals[name].get((view, method))
+        return sum(series[:-1]) if series else 0
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.get('/api/companies')
+        response = self.staff.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        self.assertIn('joblander_request_queries_count{view="companies",method="GET"} 1', response.content.decode())
+
+    def test_unknown_methods(self):
+        self.client.generic('BREW', '/api/companies')
+        self.client.generic('OPTIONS', '/api/companies')
+        totals = metrics.collect()
+        self.assertEqual(self.count(totals, 'companies', metrics.OTHER_METHOD), 1)
+        self.assertEqual(self.count(totals, 'companies', 'OPTIONS'), 1)
+        self.assertEqual(self.count(totals, 'companies', 'BREW'), 0)
+
+    def test_exited_workers(self):
+        self.client.get('/api/companies')
+        # Two exited workers, one of which left its temporary file
+        metrics.flusher.flush()
+        for pid in (111, 222):
+            shutil.copy(metrics.flusher.path, os.path.join(self.metrics_dir, f'{pid}-abc.json'))
+        open(os.path.join(self.metrics_dir, '111-def.tmp'), 'w').close()
+        self.assertEqual(self.count(metrics.collect(), 'companies', 'GET'), 3)
+        metrics.retire(111)
+        metrics.retire(222)
+        metrics.retire(333)
+        self.assertCountEqual(os.listdir(self.metrics_dir), [metrics.flusher.path.name, metrics.EXITED_FILE])
+        self.assertEqual(self.count(metrics.collect(), 'companies', 'GET'), 3)
+        metrics.clear()
+        self.assertEqual(os.listdir(self.metrics_dir), [])
+
+
+class ProfilingTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True)
+
+    def jwt_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    def test_requested_by_staff(self):
+        response = self.jwt_client(self.staff).get('/api/companies', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        report = ProfileReport.objects.get()
+        self.assertEqual((report.user, report.trigger, report.view_name), (self.staff, ProfileTrigger.REQUESTED.name, 'companies'))
+        self.assertGreater(report.query_count, 0)
+        # The statements are kept without their parameters
+        self.assertEqual(set(report.queries[0]), {'sql', 'many', 'ms'})
+        self.assertIn('/api/companies', profiling.report_text(report))
+
+        client = APIClient()
+        client.force_login(self.staff)
+        client.get('/api/companies?profile=1')
+        self.assertEqual(ProfileReport.objects.filter(user=self.staff).count(), 2)
+
+    def test_not_started_for_others(self):
+        with mock.patch.object(profiling, 'RequestProfile') as request_profile:
+            self.assertEqual(self.jwt_client(self.user).get('/api/companies', HTTP_X_PROFILE='1').status_code, 200)
+            self.assertEqual(APIClient().get('/api/companies?profile=1').status_code, 401)
+            anonymous = APIClient()
+            anonymous.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+            self.assertEqual(anonymous.get('/api/companies', HTTP_X_PROFILE='1').status_code, 401)
+            inactive = self.jwt_client(self.staff)
+            User.objects.filter(pk=self.staff.pk).update(is_active=False)
+            inactive.get('/api/companies', HTTP_X_PROFILE='1')
+        request_profile.assert_not_called()
+        self.assertFalse(ProfileReport.objects.exists())
+
+    async def test_async_trigger(self):
+        for user, expected in ((self.staff, (ProfileTrigger.REQUESTED, self.staff)), (self.user, (None, None))):
+            request = AsyncRequestFactory().get('/api/companies', headers={
+                'Authorization': f'Bearer {AccessToken.for_user(user)}', 'X-Profile': '1',
+            })
+            self.assertEqual(await profiling.aget_trigger(request), expected)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1)
+    def test_sampled(self):
+        self.jwt_client(self.user).get('/api/companies')
+        report = ProfileReport.objects.get()
+        self.assertEqual((report.user, report.trigger), (self.user, ProfileTrigger.SAMPLED.name))
+
+    def test_migration_drops_stored_params(self):
+        report = ProfileReport.objects.create(
+            trigger=ProfileTrigger.SAMPLED.name, view_name='companies', method='GET', path='/api/companies',
+            status_code=200, duration_ms=1, query_count=1, db_ms=1, stats='', profile=b'',
+            queries=[{'sql': 'SELECT %s', 'params': "('secret',)", 'many': False, 'ms': 1}],
+        )
+        migration = importlib.import_module('JobLanderAPI.migrations.0023_profilereport_drop_params')
+        migration.drop_params(django_apps, None)
+        report.refresh_from_db()
+        self.assertEqual(report.queries, [{'sql': 'SELECT %s', 'many': False, 'ms': 1}])
+
+
+class SeedLoadTests(TestCase):
+
+    def seed(self, *args):
+        out = io.StringIO()
+        call_command('seed_load', '--workers=0', '--batch-size=7', *args, stdout=out)
+        return out.getvalue()
+
+    def test_distribute(self):
+        counts = seeding.distribute(1000, 50, seed=3)
+        self.assertEqual(sum(counts), 1000)
+        self.assertEqual(counts, seeding.distribute(1000, 50, seed=3))
+        self.assertNotEqual(counts, seeding.distribute(1000, 50, seed=4))
+        # Skewed: the busiest users hold far more than their share
+        self.assertGreater(sum(sorted(counts)[-5:]), 250)
+        self.assertEqual(seeding.distribute(0, 3, seed=0), [0, 0, 0])
+
+    def test_names_are_unique(self):
+        for name in (seeding.company_name, seeding.employee_name):
+            self.assertEqual(len({name(number) for number in range(1000)}), 1000)
+
+    def test_seed_load(self):
+        output = self.seed('--users=5', '--applications=300', '--seed=1')
+        users = User.objects.filter(username__startswith='seed-')
+        self.assertEqual(users.count(), 5)
+        self.assertTrue(users.first().check_password(seeding.PASSWORD))
+        self.assertEqual(Application.objects.count(), 300)
+        self.assertIn(f'{Application.objects.count()} applications', output)
+        self.assertIn(f'{Question.objects.count()} questions', output)
+        self.assertIn(f'{Application.contacted_employees.through.objects.count()} contacted_employees', output)
+        # Rows only point at their user's rows
+        self.assertFalse(Application.objects.exclude(company__user=F('user')).exists())
+        self.assertFalse(Question.objects.exclude(application__user=F('user')).exists())
+        self.assertFalse(Application.contacted_employees.through.objects.exclude(
+            employee__company=F('application__company')).exists())
+        # The stage follows the status
+        self.assertFalse(Application.objects.filter(status=ApplicationStatus.ACCEPTED.name).exclude(stage=Stage.OFFER.name).exists())
+        RollupConsistencyTests.assert_consistent(self)
+
+    def test_same_data_for_a_seed(self):
+        def rows(prefix):
+            return list(Application.objects.filter(user__username__startswith=prefix).order_by('pk').values_list(
+                'user__username', 'company__name', 'job_title', 'status', 'stage', 'submission_date'))
+
+        self.seed('--users=3', '--applications=50', '--seed=2', '--prefix=a-')
+        self.seed('--users=3', '--applications=50', '--seed=2', '--prefix=b-', '--batch-size=1000')
+        self.assertEqual([row[1:] for row in rows('a-')], [row[1:] for row in rows('b-')])
+
+    def test_invalid(self):
+        self.seed('--users=1', '--applications=5')
+        with self.assertRaisesMessage(CommandError, 'exist already'):
+            self.seed('--users=1', '--applications=5')
+        with self.assertRaises(CommandError):
+            self.seed('--users=0', '--prefix=other-')
+
+
+@override_settings(CACHE_SHARED=True)
+class CachedAuthenticationTests(TestCase):
+    # Entries are dropped by on-commit callbacks, see AnalyticsCacheTests
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.authentication = CachedJWTAuthentication()
+        self.token = AccessToken.for_user(self.user)
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/api/companies', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        return self.authentication.authenticate(request)
+
+    def test_user_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate()[0], self.user)
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual(user, self.user)
+        self.assertEqual((user.username, user.is_active, user.is_staff), ('user', True, False))
+        self.assertEqual(token['user_id'], self.user.pk)
+        self.assertNotIn('password', cache.get(user_key(self.user.pk)))
+        # The other fields load on first use, for djoser to check the password
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('password'))
+
+    def test_cached_user_saved(self):
+        self.authenticate()
+        user = self.authenticate()[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            user.set_password('changed')
+            user.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('changed'))
+        self.assertEqual(self.user.email, 'user@example.com')
+        self.assertIsNone(cache.get(user_key(self.user.pk)))
+
+    def test_saving_drops_the_entry(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Jane'
+            self.user.save()
+        self.assertEqual(self.authenticate()[0].first_name, 'Jane')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaisesMessage(AuthenticationFailed, 'User is inactive'):
+            self.authenticate()
+
+    def test_deleted_user(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        with self.assertRaisesMessage(AuthenticationFailed, 'User not found'):
+            self.authenticate()
+
+    def test_checks_run_on_cached_users(self):
+        self.authenticate()
+        # queryset.update() sends no signal: the cached row is used until it expires
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertTrue(self.authenticate()[0].is_active)
+        cached = cache.get(user_key(self.user.pk))
+        cached['is_active'] = False
+        cache.set(user_key(self.user.pk), cached)
+        with self.assertRaisesMessage(AuthenticationFailed, 'User is inactive'):
+            self.authenticate()
+
+    def test_revoked_by_password_change(self):
+        # Modules keep the api_settings they imported, which override_settings() replaces
+        with mock.patch('rest_framework_simplejwt.settings.api_settings.CHECK_REVOKE_TOKEN', True):
+            self.token = AccessToken.for_user(self.user)
+            self.authenticate()
+            self.assertNotIn(self.user.password, cache.get(user_key(self.user.pk)).values())
+            with self.assertNumQueries(0):
+                self.authenticate()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.set_password('changed')
+                self.user.save()
+            with self.assertRaisesMessage(AuthenticationFailed, 'password has been changed'):
+                self.authenticate()
+
+    @override_settings(CACHE_SHARED=False)
+    def test_kept_briefly_without_a_shared_cache(self):
+        self.authenticate()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.authenticate()
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=time.time() + settings.AUTH_USER_LOCAL_CACHE_TIMEOUT + 1):
+            with self.assertRaisesMessage(AuthenticationFailed, 'User is inactive'):
+                self.authenticate()
+        with override_settings(AUTH_USER_LOCAL_CACHE_TIMEOUT=0):
+            cache.clear()
+            with self.assertRaisesMessage(AuthenticationFailed, 'User is inactive'):
+                self.authenticate()
+            self.assertIsNone(cache.get(user_key(self.user.pk)))
+
+    async def test_async(self):
+        request = AsyncRequestFactory().get('/api/companies', headers={'Authorization': f'Bearer {self.token}'})
+        user, _ = await self.authentication.aauthenticate(request)
+        self.assertEqual(user, self.user)
+        self.assertEqual((await cache.aget(user_key(self.user.pk)))['id'], self.user.pk)
+        await User.objects.filter(pk=self.user.pk).aupdate(username='jane')
+        self.assertEqual((await self.authentication.aauthenticate(request))[0].username, 'user')
+
+
+@override_settings(CACHE_SHARED=True)
+class BlacklistFilterTests(TestCase):
+    # The filter's version is bumped by on-commit callbacks, see AnalyticsCacheTests
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        patcher = mock.patch.object(tokens, 'blacklist_filter', tokens.BlacklistFilter())
+        self.filter = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def blacklist(self, bump=True):
+        token = RefreshToken.for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=bump):
+            token.blacklist()
+        return str(token)
+
+    def test_bloom_filter(self):
+        bloom = tokens.BloomFilter(1000)
+        for n in range(1000):
+            bloom.add(f'in-{n}')
+        self.assertTrue(all(f'in-{n}' in bloom for n in range(1000)))
+        false_positives = sum(f'out-{n}' in bloom for n in range(10000))
+        self.assertLess(false_positives, 10000 * tokens.FALSE_POSITIVE_RATE * 2)
+
+    def test_blacklisted(self):
+        token = self.blacklist()
+        with self.assertRaisesMessage(TokenError, 'blacklisted'):
+            tokens.RefreshToken(token)
+        # Blacklisted after the filter was built
+        later = self.blacklist()
+        with self.assertRaisesMessage(TokenError, 'blacklisted'):
+            tokens.RefreshToken(later)
+
+    def test_no_lookup(self):
+        self.blacklist()
+        token = str(RefreshToken.for_user(self.user))
+        tokens.RefreshToken(token)
+        with self.assertNumQueries(0):
+            tokens.RefreshToken(token)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_local_max_age_without_a_shared_cache(self):
+        token = str(RefreshToken.for_user(self.user))
+        tokens.RefreshToken(token)
+        with self.assertNumQueries(0):
+            tokens.RefreshToken(token)
+        # Another machine's bump would not be seen here
+        blacklisted = self.blacklist(bump=False)
+        tokens.RefreshToken(blacklisted)
+        self.filter.fetched_at -= tokens.LOCAL_MAX_AGE + 1
+        with self.assertRaisesMessage(TokenError, 'blacklisted'):
+            tokens.RefreshToken(blacklisted)
+
+    def test_prune_expired(self):
+        expired = RefreshToken.for_user(self.user)
+        expired.blacklist()
+        current = RefreshToken.for_user(self.user)
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(tokens.prune_expired(batch_size=1), (1, 1))
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [current['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    def test_max_age(self):
+        tokens.RefreshToken(str(RefreshToken.for_user(self.user)))
+        token = self.blacklist(bump=False)
+        # Let through until the filter is brought up to date
+        tokens.RefreshToken(token)
+        self.filter.fetched_at -= tokens.MAX_AGE + 1
+        with self.assertRaisesMessage(TokenError, 'blacklisted'):
+            tokens.RefreshToken(token)
+
+    def test_rotated_token_refused(self):
+        client = APIClient()
+        refresh = client.post('/api/token/', {'username': 'user', 'password': 'password'}).data['refresh']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.post('/api/token/refresh/', {'refresh': refresh}).status_code, 401)
+        self.assertEqual(client.post('/api/token/refresh/', {'refresh': response.data['refresh']}).status_code, 200)
+
+
+TASK_CALLS = []
+
+
+@tasks.task
+def record_call(*args):
+    TASK_CALLS.append(args)
+
+
+@tasks.task
+def fail():
+    raise RuntimeError('boom')
+
+
+class TaskQueueTests(TestCase):
+
+    def setUp(self):
+        TASK_CALLS.clear()
+        cache.clear()
+
+    def test_enqueue(self):
+        with self.assertRaises(ValueError):
+            tasks.enqueue(print)
+        task = tasks.enqueue(record_call, (1, 2), date(2024, 1, 2).isoformat())
+        self.assertEqual(Task.objects.get().args, [[1, 2], '2024-01-02'])
+        self.assertEqual(task.state, TaskState.PENDING.name)
+
+    def test_dedup_until_started(self):
+        self.assertIsNotNone(tasks.enqueue(record_call, 1, dedup_key='key'))
+        self.assertIsNone(tasks.enqueue(record_call, 2, dedup_key='key'))
+        tasks.claim(10, 'worker')
+        self.assertIsNotNone(tasks.enqueue(record_call, 3, dedup_key='key'))
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_claim_and_run(self):
+        first = tasks.enqueue(record_call, 'first')
+        tasks.enqueue(record_call, 'later', delay=60)
+        tasks.enqueue(record_call, 'second')
+        claimed = tasks.claim(1, 'worker')
+        self.assertEqual([task.pk for task in claimed], [first.pk])
+        self.assertEqual((claimed[0].state, claimed[0].attempts, claimed[0].locked_by), (TaskState.RUNNING.name, 1, 'worker'))
+        self.assertFalse(tasks.run(first.pk, 'other worker'))
+        self.assertTrue(tasks.run(first.pk, 'worker'))
+        self.assertEqual(TASK_CALLS, [('first',)])
+        self.assertFalse(Task.objects.filter(pk=first.pk).exists())
+        self.assertEqual([task.args for task in tasks.claim(10, 'worker')], [['second']])
+
+    def test_retries_then_fails(self):
+        task = tasks.enqueue(fail, max_attempts=2)
+        with self.assertLogs('JobLanderAPI.tasks', 'WARNING'):
+            tasks.claim(1, 'worker')
+            self.assertFalse(tasks.run(task.pk, 'worker'))
+        task.refresh_from_db()
+        self.assertEqual(task.state, TaskState.PENDING.name)
+        self.assertIn('RuntimeError: boom', task.last_error)
+        self.assertGreater(task.run_after, timezone.now() + timedelta(seconds=tasks.RETRY_DELAY - 1))
+        Task.objects.update(run_after=timezone.now())
+        with self.assertLogs('JobLanderAPI.tasks', 'ERROR'):
+            tasks.claim(1, 'worker')
+            tasks.run(task.pk, 'worker')
+        task.refresh_from_db()
+        self.assertEqual((task.state, task.attempts), (TaskState.FAILED.name, 2))
+        self.assertEqual(tasks.claim(1, 'worker'), [])
+
+    def test_recover_expired(self):
+        task = tasks.enqueue(record_call)
+        tasks.claim(1, 'worker')
+        self.assertEqual(tasks.recover_expired(), 0)
+        Task.objects.update(locked_at=timezone.now() - timedelta(seconds=tasks.TASK_LEASE + 1))
+        self.assertEqual(tasks.recover_expired(), 1)
+        self.assertEqual([claimed.pk for claimed in tasks.claim(1, 'other worker')], [task.pk])
+
+    @override_settings(TASK_RUN_INLINE=True)
+    def test_inline(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(tasks.enqueue(record_call, 'inline'))
+            self.assertEqual(TASK_CALLS, [])
+        self.assertEqual(TASK_CALLS, [('inline',)])
+        self.assertFalse(Task.objects.exists())
+
+    def test_warns_when_no_worker_runs_the_tasks(self):
+        tasks.enqueue(record_call)
+        Task.objects.update(run_after=timezone.now() - timedelta(hours=1))
+        with self.assertNoLogs('JobLanderAPI.tasks'):
+            # Checked at most once per interval
+            tasks.enqueue(record_call)
+        cache.clear()
+        with self.assertLogs('JobLanderAPI.tasks', 'WARNING') as logs:
+            tasks.enqueue(record_call)
+            tasks.enqueue(record_call)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('runworkers', logs.output[0])
+
+
+class RunWorkersTests(TransactionTestCase):
+    # The worker threads use their own connections, so the tasks must be committed
+
+    def test_runworkers_once(self):
+        TASK_CALLS.clear()
+        for i in range(3):
+            tasks.enqueue(record_call, i)
+        out = io.StringIO()
+        call_command('runworkers', '--once', '--workers=1', stdout=out)
+        self.assertEqual(sorted(TASK_CALLS), [(0,), (1,), (2,)])
+        self.assertIn('3 tasks succeeded', out.getvalue())
+        # Scheduled once however often workers start, due after the interval
+        call_command('runworkers', '--once', '--workers=1', stdout=io.StringIO())
+        prune = Task.objects.get(name=tasks.task_name(tokens.prune_expired))
+        self.assertGreater(prune.run_after, timezone.now() + timedelta(seconds=settings.TOKEN_PRUNE_INTERVAL - 60))
@@ -0,0 +1,168 @@
+# tokens.py
+# Refresh tokens whose blacklist check skips the database for tokens that
+# were never blacklisted. Each process keeps a Bloom filter of the
+# blacklisted jtis: a jti it does not contain is certainly not blacklisted,
+# one it contains (1% false positives) is looked up as before. The filter
+# is built on first use in the process and kept current from the rows
+# added since, which it fetches whenever the version token in the shared
+# cache changed; signals.py bumps it once a blacklisting commits. Row ids
+# are handed out before commit, so ids skipped over by a fetch are fetched
+# again until GAP_TIMEOUT, for the transactions still running. Deleted rows
+# (see prune_expired) stay in the filter until its next rebuild, which only
+# costs lookups. A filter is also brought up to date once it is MAX_AGE
+# seconds old, whatever the version, which bounds how long a lost bump (an
+# evicted key, a cache restart) lets a blacklisted token through. Without
+# a cache shared by the machines (see CACHES in settings.py) bumps only
+# reach the processes sharing the cache, and the filter is brought up to
+# date every LOCAL_MAX_AGE seconds instead: a token blacklisted through
+# another machine can be used for that long.
+from hashlib import blake2b
+import math
+import os
+import threading
+import time
+
+from django.core.cache import cache
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from . import tasks
+from .cache import is_shared
+
+VERSION_KEY = 'token_blacklist:version'
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 10000
+# Missing ids are only tracked this far below the newest one
+GAP_WINDOW = 1000
+GAP_TIMEOUT = 10 * 60
+FETCH_BATCH_SIZE = 10000
+MAX_AGE = 60
+LOCAL_MAX_AGE = 5
+PRUNE_BATCH_SIZE = 1000
+PRUNE_PAUSE = 0.05
+
+
+class BloomFilter:
+
+    def __init__(self, capacity, false_positive_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, value):
+        # Double hashing: h1 + i * h2 stands in for k independent hashes
+        digest = blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY, time.time_ns())
+    return version
+
+
+def bump_version():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+class BlacklistFilter:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.pid = None
+        self.version = None
+        self.fetched_at = 0.0
+        self.synced_id = 0
+        # Missing id -> when it was first missed
+        self.gaps = {}
+
+    def might_contain(self, jti):
+        version = get_version()
+        max_age = MAX_AGE if is_shared() else LOCAL_MAX_AGE
+        with self.lock:
+            if self.bloom is None or self.pid != os.getpid():
+                self.rebuild(version)
+            elif version != self.version or time.monotonic() - self.fetched_at > max_age:
+                self.fetch(version)
+            return jti in self.bloom
+
+    def rebuild(self, version):
+        count = BlacklistedToken.objects.count()
+        self.bloom = BloomFilter(max(2 * count, MIN_CAPACITY))
+        self.pid = os.getpid()
+        self.synced_id = 0
+        self.gaps = {}
+        self.fetch(version)
+
+    def fetch(self, version):
+        # The version is read first, so a change made meanwhile is fetched next time
+        self.version = version
+        self.fetched_at = time.monotonic()
+        rows = BlacklistedToken.objects.filter(pk__gt=self.synced_id)
+        if self.gaps:
+            rows = rows | BlacklistedToken.objects.filter(pk__in=list(self.gaps))
+        now = time.monotonic()
+        previous, seen = self.synced_id, set()
+        for pk, jti in rows.values_list('pk', 'token__jti').iterator(chunk_size=FETCH_BATCH_SIZE):
+            self.bloom.add(jti)
+            seen.add(pk)
+            self.gaps.pop(pk, None)
+            self.synced_id = max(self.synced_id, pk)
+        for pk in range(max(previous, self.synced_id - GAP_WINDOW) + 1, self.synced_id):
+            if pk not in seen:
+                self.gaps[pk] = now
+        self.gaps = {pk: since for pk, since in self.gaps.items() if now - since < GAP_TIMEOUT}
+        if self.bloom.count > self.bloom.capacity:
+            self.rebuild(version)
+
+
+blacklist_filter = BlacklistFilter()
+
+
+@tasks.task
+def prune_expired(batch_size=PRUNE_BATCH_SIZE, pause=PRUNE_PAUSE):
+    """
+    Delete the expired refresh tokens and their blacklist entries, which
+    token rotation adds on every refresh, a batch per short transaction.
+    Returns how many tokens and blacklist entries were deleted. runworkers
+    schedules it every TOKEN_PRUNE_INTERVAL seconds.
+    """
+    expired = OutstandingToken.objects.filter(expires_at__lte=aware_utcnow()).order_by('pk')
+    outstanding = blacklisted = 0
+    while True:
+        # The oldest rows expire first, so walking the primary key finds them without a full scan
+        ids = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        # Cascades to the blacklist entries
+        _, deleted = OutstandingToken.objects.filter(pk__in=ids).only('pk').delete()
+        outstanding += deleted.get(OutstandingToken._meta.label, 0)
+        blacklisted += deleted.get(BlacklistedToken._meta.label, 0)
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+    return outstanding, blacklisted
+
+
+class RefreshToken(tokens.RefreshToken):
+    """simplejwt's RefreshToken, looking up only the tokens blacklist_filter might contain."""
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
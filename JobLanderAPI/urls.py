@@ -1,23 +1,37 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+
+def read_view(view, async_view):
+    # Served by ASGI, the hot read endpoints use the async views (see asyncviews.py)
+    return (async_view if settings.ASYNC_VIEWS else view).as_view()
+
 urlpatterns = [
     path('', views.index, name='index'),
     path('companies', views.CompaniesView.as_view(), name='companies'),
     path('companies/<int:pk>', views.SingleCompanyView.as_view(), name='single_company'),
+    path('companies/bulk', views.BulkCompaniesView.as_view(), name='bulk_companies'),
     path('companyquestions', views.CompanyQuestionsView.as_view(), name='companyquestions'),
     path('companyquestions/<int:pk>', views.SingleCompanyQuestionView.as_view(), name='single_companyquestion'),
     path('employees', views.EmployeesView.as_view(), name='employees'),
     path('employees/<int:pk>', views.SingleEmployeeView.as_view(), name='single_employee'),
-    path('applications', views.ApplicationsView.as_view(), name='applications'),
+    path('employees/bulk', views.BulkEmployeesView.as_view(), name='bulk_employees'),
+    path('applications', read_view(views.ApplicationsView, views.AsyncApplicationsView), name='applications'),
     path('applications/<int:pk>', views.SingleApplicationView.as_view(), name='single_application'),
-    path('questions', views.QuestionsView.as_view(), name='questions'),
+    path('applications/bulk', views.BulkApplicationsView.as_view(), name='bulk_applications'),
+    path('questions', read_view(views.QuestionsView, views.AsyncQuestionsView), name='questions'),
     path('questions/<int:pk>', views.SingleQuestionView.as_view(), name='single_question'),
     path('todos', views.TodoListView.as_view(), name='todos'),
     path('todos/<int:pk>', views.SingleTodoView.as_view(), name='single_todo'),
-    path('statistics', views.StatisticsView.as_view(), name='statistics'),
+    path('todos/bulk', views.BulkTodosView.as_view(), name='bulk_todos'),
+    path('statistics', read_view(views.StatisticsView, views.AsyncStatisticsView), name='statistics'),
     path('percents', views.PercentsView.as_view(), name='percents'),
-    path('timeseries', views.TimeSeriesView.as_view(), name='timeseries'),
+    path('timeseries', read_view(views.TimeSeriesView, views.AsyncTimeSeriesView), name='timeseries'),
+    path('dashboard', views.DashboardView.as_view(), name='dashboard'),
+    path('analytics/cache', views.AnalyticsCacheStatsView.as_view(), name='analytics_cache'),
+    path('export/<str:resource>', views.ExportView.as_view(), name='export'),
+    path('import/<str:resource>', views.ImportView.as_view(), name='import'),
     path('cvs', views.CVsView.as_view(), name='cv'),
     path('cvs/<int:pk>', views.SingleCVView.as_view(), name='single_cv'),
 ]
\ No newline at end of file
@@ -0,0 +1,104 @@
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, UniqueConstraint
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+
+def load_objects(queryset, ids, cache=None):
+    """
+    Fetch the rows for `ids` that are not in `cache` yet with a single IN query.
+    Ids that do not exist are cached as None so they are not looked up twice.
+    """
+    objects = cache.setdefault(queryset.model, {}) if cache is not None else {}
+    unknown = [pk for pk in ids if pk not in objects]
+    if unknown:
+        found = {obj.pk: obj for obj in queryset.filter(pk__in=unknown)}
+        for pk in unknown:
+            objects[pk] = found.get(pk)
+    return objects
+
+
+def check_ownership(queryset, ids, user, label, cache=None):
+    """
+    Resolve `ids` against `queryset` with a single IN query and make sure every
+    row belongs to `user`. Returns the objects in the order of `ids`.
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return []
+    objects = load_objects(queryset, ids, cache)
+    missing = [pk for pk in ids if objects[pk] is None]
+    foreign = [pk for pk in ids if objects[pk] is not None and objects[pk].user_id != user.id]
+    errors = []
+    if missing:
+        errors.append(f"{label} {', '.join(map(str, missing))} does not exist")
+    if foreign:
+        errors.append(f"{label} {', '.join(map(str, foreign))} does not belong to the user")
+    if errors:
+        raise serializers.ValidationError(errors)
+    return [objects[pk] for pk in ids]
+
+
+class OwnershipMixin:
+    # Maps write fields to the model their ids point at. Bulk writes use it to
+    # load every referenced row up front into context['owned_objects'].
+    owned_fields = {}
+
+    def check_owned(self, field_name, ids):
+        model = self.owned_fields[field_name]
+        # Built once per serializer: bulk writes validate every item with the same one
+        querysets = self.__dict__.setdefault('_owned_querysets', {})
+        if model not in querysets:
+            querysets[model] = owned_queryset(model)
+        return check_ownership(querysets[model], ids, self.context['request'].user,
+                               model.__name__, self.context.get('owned_objects'))
+
+
+def owned_queryset(model):
+    return model.objects.only('id', 'user_id')
+
+
+def unique_field_sets(model):
+    """The attnames covered by each of the model's unconditional UniqueConstraints."""
+    field_sets = []
+    for constraint in model._meta.constraints:
+        if not isinstance(constraint, UniqueConstraint) or constraint.condition is not None:
+            continue
+        names = list(constraint.fields)
+        for expression in constraint.expressions:
+            nodes = [expression] if isinstance(expression, F) else expression.flatten()
+            names += [node.name for node in nodes if isinstance(node, F)]
+        field_sets.append([model._meta.get_field(name).attname for name in names])
+    return field_sets
+
+
+def is_unique_violation(exc):
+    # MySQL reports ER_DUP_ENTRY (1062), SQLite "UNIQUE constraint failed"
+    return exc.args[:1] == (1062,) or 'UNIQUE constraint failed' in str(exc)
+
+
+@contextmanager
+def unique_violation_as(message):
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as exc:
+        if not is_unique_violation(exc):
+            raise
+        raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='unique')
+
+
+class UniqueConstraintMixin:
+    # Uniqueness is enforced by the model's UniqueConstraints instead of a
+    # SELECT before every write; a violation becomes this validation error.
+    unique_error_message = None
+
+    def create(self, validated_data):
+        with unique_violation_as(self.unique_error_message):
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with unique_violation_as(self.unique_error_message):
+            return super().update(instance, validated_data)
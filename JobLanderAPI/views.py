@@ -1,19 +1,33 @@
 from django.shortcuts import render
-from rest_framework import generics
+from rest_framework import generics, status
 from .models import *
 from .serializers import *
 from .pagination import CustomPageNumberPagination
+from .bulk import BulkAPIView
+from .sparse import SparseFieldsViewMixin
+from .conditional import AsyncConditionalGetMixin, ConditionalGetMixin
+from .asyncviews import AsyncAPIViewMixin, AsyncListCreateAPIView
+from .blobs import HashedUploadViewMixin
+from .exports import EXPORTS, CSVRenderer, NDJSONRenderer
+from .imports import IMPORTERS, ImportFormatError, iter_records
+from .analytics import AnalyticsError, aget_dashboard, get_dashboard, parse_sections, parse_timeseries_params
+from .cache import cache_stats
+from . import metrics
+from django.http import HttpResponse
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.settings import api_settings
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from django.db.models import Count, Q, Max
+from django.db.models import Prefetch
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models.functions import TruncMonth, TruncDay, TruncWeek
-from datetime import datetime, timedelta
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import MultiPartParser
 
 def index(request):
     return render(request, 'index.html')
 
-class CVsView(generics.ListCreateAPIView):
+class CVsView(HashedUploadViewMixin, ConditionalGetMixin, SparseFieldsViewMixin, generics.ListCreateAPIView):
     queryset = CV.objects.all()
     serializer_class = CVSerializer
     permission_classes = [IsAuthenticated]
@@ -22,36 +36,45 @@ class CVsView(generics.ListCreateAPIView):
     pagination_class = CustomPageNumberPagination
 
     def get_queryset(self):
-        return CV.objects.filter(user=self.request.user)
+        return CV.objects.filter(user=self.request.user).select_related('user')
     
-class SingleCVView(generics.RetrieveUpdateDestroyAPIView):
+class SingleCVView(HashedUploadViewMixin, ConditionalGetMixin, SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = CV.objects.all()
     serializer_class = CVSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return CV.objects.filter(id=self.kwargs['pk'], user=self.request.user)
+        return CV.objects.filter(id=self.kwargs['pk'], user=self.request.user).select_related('user')
 
-class CompaniesView(generics.ListCreateAPIView):
+class CompaniesView(ConditionalGetMixin, SparseFieldsViewMixin, generics.ListCreateAPIView):
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
     permission_classes = [IsAuthenticated]
     ordering_fields = ['name']
     search_fields = ['name','location']
     pagination_class = CustomPageNumberPagination
+    cursor_pagination = True
 
     def get_queryset(self):
-        return Company.objects.filter(user=self.request.user)
+        return Company.objects.filter(user=self.request.user).select_related('user')
 
-class SingleCompanyView(generics.RetrieveUpdateDestroyAPIView):
+class SingleCompanyView(ConditionalGetMixin, SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Company.objects.filter(id=self.kwargs['pk'], user=self.request.user)
+        return Company.objects.filter(id=self.kwargs['pk'], user=self.request.user).select_related('user')
 
-class CompanyQuestionsView(generics.ListCreateAPIView):
+
+class BulkCompaniesView(BulkAPIView):
+    serializer_class = CompanySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Company.objects.filter(user=self.request.user).select_related('user')
+
+class CompanyQuestionsView(ConditionalGetMixin, SparseFieldsViewMixin, generics.ListCreateAPIView):
     queryset = CompanyQuestions.objects.all()
     serializer_class = CompanyQuestionsSerializer
     permission_classes = [IsAuthenticated]
@@ -61,20 +84,21 @@ class CompanyQuestionsView(generics.ListCreateAPIView):
     pagination_class = CustomPageNumberPagination
 
     def get_queryset(self):
+        queryset = CompanyQuestions.objects.filter(company__user=self.request.user).select_related('company__user')
         company_id = self.request.query_params.get('company__id', None)
         if company_id:
-            self.queryset = self.queryset.filter(company__id=company_id)
-        return self.queryset
+            queryset = queryset.filter(company__id=company_id)
+        return queryset
     
-class SingleCompanyQuestionView(generics.RetrieveUpdateDestroyAPIView):
+class SingleCompanyQuestionView(ConditionalGetMixin, SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = CompanyQuestions.objects.all()
     serializer_class = CompanyQuestionsSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return CompanyQuestions.objects.filter(id=self.kwargs['pk'])
+        return CompanyQuestions.objects.filter(id=self.kwargs['pk'], company__user=self.request.user).select_related('company__user')
 
-class EmployeesView(generics.ListCreateAPIView):
+class EmployeesView(ConditionalGetMixin, SparseFieldsViewMixin, generics.ListCreateAPIView):
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
     permission_classes = [IsAuthenticated]
@@ -82,24 +106,32 @@ class EmployeesView(generics.ListCreateAPIView):
     filter_fields = ['company__id']
     search_fields = ['name', 'job_title', 'company__name', 'contacted']
     pagination_class = CustomPageNumberPagination
+    cursor_pagination = True
 
     def get_queryset(self):
-        queryset = Employee.objects.filter(user=self.request.user)
+        queryset = Employee.objects.filter(user=self.request.user).select_related('user', 'company__user')
         company_id = self.request.query_params.get('company__id', None)
         if company_id:
             queryset = queryset.filter(company__id=company_id)
         return queryset
     
-class SingleEmployeeView(generics.RetrieveUpdateDestroyAPIView):
+class SingleEmployeeView(ConditionalGetMixin, SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Employee.objects.filter(id=self.kwargs['pk'], user=self.request.user)
+        return Employee.objects.filter(id=self.kwargs['pk'], user=self.request.user).select_related('user', 'company__user')
     
 
-class ApplicationsView(generics.ListCreateAPIView):
+class BulkEmployeesView(BulkAPIView):
+    serializer_class = EmployeeSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Employee.objects.filter(user=self.request.user).select_related('user', 'company__user')
+
+class ApplicationsView(ConditionalGetMixin, SparseFieldsViewMixin, generics.ListCreateAPIView):
     queryset = Application.objects.all()
     serializer_class = ApplicationSerializer
     permission_classes = [IsAuthenticated]
@@ -107,9 +139,10 @@ class ApplicationsView(generics.ListCreateAPIView):
     filter_fields = ['company__id', 'submission_date', 'status']
     search_fields = ['job_title', 'company__name', 'status']
     pagination_class = CustomPageNumberPagination
+    cursor_pagination = True
 
     def get_queryset(self):
-        queryset =  Application.objects.filter(user=self.request.user)
+        queryset =  Application.objects.filter(user=self.request.user).select_related('user', 'company__user')
         company_id = self.request.query_params.get('company__id', None)
         submission_date = self.request.query_params.get('submission_date', None)
         status = self.request.query_params.get('status', None)
@@ -120,16 +153,28 @@ class ApplicationsView(generics.ListCreateAPIView):
         if status:
             queryset = queryset.filter(status=status)
         return queryset
+
+class AsyncApplicationsView(AsyncConditionalGetMixin, AsyncListCreateAPIView, ApplicationsView):
+    pass
     
-class SingleApplicationView(generics.RetrieveUpdateDestroyAPIView):
+class SingleApplicationView(ConditionalGetMixin, SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Application.objects.all()
     serializer_class = ApplicationDetailsSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Application.objects.filter(id=self.kwargs['pk'], user=self.request.user)
+        return Application.objects.filter(id=self.kwargs['pk'], user=self.request.user).select_related(
+            'user', 'company__user', 'submitted_cv__user'
+        ).prefetch_related(Prefetch('contacted_employees', queryset=Employee.objects.only('id')))
     
-class QuestionsView(generics.ListCreateAPIView):
+class BulkApplicationsView(BulkAPIView):
+    serializer_class = ApplicationSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Application.objects.filter(user=self.request.user).select_related('user', 'company__user')
+
+class QuestionsView(ConditionalGetMixin, SparseFieldsViewMixin, generics.ListCreateAPIView):
     queryset = Question.objects.all()
     serializer_class = QuestionSerializer
     permission_classes = [IsAuthenticated]
@@ -137,23 +182,31 @@ class QuestionsView(generics.ListCreateAPIView):
     filter_fields = ['application__id']
     search_fields = ['question', 'application__job_title', 'application__company__name']
     pagination_class = CustomPageNumberPagination
+    cursor_pagination = True
 
     def get_queryset(self):
-        queryset =  Question.objects.filter(user=self.request.user)
+        queryset =  Question.objects.filter(user=self.request.user).select_related(
+            'user', 'application__user', 'application__company__user'
+        )
         application_id = self.request.query_params.get('application__id', None)
         if application_id:
             queryset = queryset.filter(application__id=application_id)
         return queryset
+
+class AsyncQuestionsView(AsyncConditionalGetMixin, AsyncListCreateAPIView, QuestionsView):
+    pass
     
-class SingleQuestionView(generics.RetrieveUpdateDestroyAPIView):
+class SingleQuestionView(ConditionalGetMixin, SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Question.objects.all()
     serializer_class = QuestionSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Question.objects.filter(id=self.kwargs['pk'], user=self.request.user)
+        return Question.objects.filter(id=self.kwargs['pk'], user=self.request.user).select_related(
+            'user', 'application__user', 'application__company__user'
+        )
     
-class TodoListView(generics.ListCreateAPIView):
+class TodoListView(ConditionalGetMixin, SparseFieldsViewMixin, generics.ListCreateAPIView):
     queryset = TodoList.objects.all()
     serializer_class = TodoListSerializer
     permission_classes = [IsAuthenticated]
@@ -162,125 +215,126 @@ class TodoListView(generics.ListCreateAPIView):
     pagination_class = CustomPageNumberPagination
 
     def get_queryset(self):
-        return TodoList.objects.filter(user=self.request.user)
+        return TodoList.objects.filter(user=self.request.user).select_related('user')
     
-class SingleTodoView(generics.RetrieveUpdateDestroyAPIView):
+class SingleTodoView(ConditionalGetMixin, SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = TodoList.objects.all()
     serializer_class = TodoListSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return TodoList.objects.filter(id=self.kwargs['pk'], user=self.request.user)
+        return TodoList.objects.filter(id=self.kwargs['pk'], user=self.request.user).select_related('user')
+
+
+class BulkTodosView(BulkAPIView):
+    serializer_class = TodoListSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return TodoList.objects.filter(user=self.request.user).select_related('user')
 
 class StatisticsView(APIView):
+    permission_classes = [IsAuthenticated]
+
     def get(self, request, *args, **kwargs):
-        user = request.user
-
-        stats = Application.objects.filter(user=user).aggregate(
-            total_applications=Count('id'),
-            pending_applications=Count('id', filter=~Q(status=ApplicationStatus.REJECTED.name) & ~Q(status=ApplicationStatus.ACCEPTED.name)),
-            rejected_applications=Count('id', filter=Q(status=ApplicationStatus.REJECTED.name)),
-            accepted_applications=Count('id', filter=Q(status=ApplicationStatus.ACCEPTED.name)),
-            last_application=Max('submission_date'),
-            last_rejection=Max('submission_date', filter=Q(status=ApplicationStatus.REJECTED.name)),
-            last_acceptance=Max('submission_date', filter=Q(status=ApplicationStatus.ACCEPTED.name)),
-            last_pending=Max('submission_date', filter=~Q(status=ApplicationStatus.REJECTED.name) & ~Q(status=ApplicationStatus.ACCEPTED.name)),
-        )
+        return Response(get_dashboard(request.user, ['statistics'])['statistics'])
+
+class AsyncStatisticsView(AsyncAPIViewMixin, StatisticsView):
+
+    async def get(self, request, *args, **kwargs):
+        return Response((await aget_dashboard(request.user, ['statistics']))['statistics'])
 
-        return Response(stats)
-    
 class PercentsView(APIView):
+    permission_classes = [IsAuthenticated]
+
     def get(self, request, *args, **kwargs):
-        user = request.user
-        
-        # Aggregate in a single query
-        stats = Application.objects.filter(user=user, status__in=[ApplicationStatus.ACCEPTED.name, ApplicationStatus.REJECTED.name]).aggregate(
-            total_applications=Count('id'),
-            applied_stage=Count('id', filter=Q(stage=Stage.APPLIED.name)),
-            phonescreen_stage=Count('id', filter=Q(stage=Stage.PHONE_SCREEN.name)),
-            assessment_stage=Count('id', filter=Q(stage=Stage.ASSESSMENT.name)),
-            interview_stage=Count('id', filter=Q(stage=Stage.INTERVIEW.name)),
-            offer_stage=Count('id', filter=Q(stage=Stage.OFFER.name)),
-        )
+        return Response(get_dashboard(request.user, ['percents'])['percents'])
+
+
+class TimeSeriesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            params = parse_timeseries_params(request.query_params, request.user)
+        except AnalyticsError as exc:
+            return Response({'error': str(exc)}, status=400)
+        return Response(get_dashboard(request.user, ['timeseries'], params)['timeseries'])
 
-        total = max(stats['total_applications'],1)
-        for key in stats:
-            stats[key] = round((stats[key]/total)*100, 2)
 
-        return Response(stats)
+class AsyncTimeSeriesView(AsyncAPIViewMixin, TimeSeriesView):
 
+    async def get(self, request, *args, **kwargs):
+        try:
+            params = parse_timeseries_params(request.query_params, request.user)
+        except AnalyticsError as exc:
+            return Response({'error': str(exc)}, status=400)
+        return Response((await aget_dashboard(request.user, ['timeseries'], params))['timeseries'])
+
+
+class DashboardView(APIView):
+    # statistics, percents and timeseries in one request, e.g.
+    # ?sections=statistics,timeseries&interval=week&points=8
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            sections = parse_sections(request.query_params.get('sections'))
+            params = parse_timeseries_params(request.query_params, request.user) if 'timeseries' in sections else None
+        except AnalyticsError as exc:
+            return Response({'error': str(exc)}, status=400)
+        return Response(get_dashboard(request.user, sections, params))
+
+
+class ExportView(APIView):
+    # GET export/<resource>?format=csv|ndjson streams every row of the user
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+
+    def get(self, request, resource, *args, **kwargs):
+        if resource not in EXPORTS:
+            raise NotFound(f"Unknown export. Choose from: {', '.join(EXPORTS)}")
+        return EXPORTS[resource]().stream(request.user, request.accepted_renderer.format, resource)
+
+    def handle_exception(self, exc):
+        # Errors are JSON, whatever format the export was asked in
+        self.request.accepted_renderer = JSONRenderer()
+        self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
+
+class ImportView(APIView):
+    # POST import/<resource> with a multipart "file" (CSV, NDJSON or a JSON
+    # array, detected from the name unless "format" is given). Valid rows are
+    # imported, the others are listed in the report.
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, resource, *args, **kwargs):
+        if resource not in IMPORTERS:
+            raise NotFound(f"Unknown import. Choose from: {', '.join(IMPORTERS)}")
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ["No file was submitted."]}, status=status.HTTP_400_BAD_REQUEST)
+        records = iter_records(upload.file, upload.name, request.data.get('format') or None)
+        try:
+            report = IMPORTERS[resource](request).run(records)
+        except ImportFormatError as exc:
+            return Response({'file': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class AnalyticsCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(cache_stats())
+
+
+class MetricsView(APIView):
+    # Prometheus scrapes it with basic_auth as a staff user
+    authentication_classes = [*api_settings.DEFAULT_AUTHENTICATION_CLASSES, BasicAuthentication]
+    permission_classes = [IsAdminUser]
 
-class TimeSeriesView(APIView):
     def get(self, request, *args, **kwargs):
-        user = request.user
-        interval = request.query_params.get('interval', 'month')
-        points = int(request.query_params.get('points', 12))
-        start_date = request.query_params.get('start_date', request.user.date_joined.strftime('%Y-%m-%d'))
-        if interval not in ['month', 'week', 'day']:
-            return Response({'error': 'Invalid interval. Choose from: month, week, day'}, status=400)
-        if points < 1 or points>100:
-            return Response({'error': 'Invalid number of points Choose from 1 to 100'}, status=400)
-        if start_date:
-            try:
-                start_date = datetime.strptime(start_date, '%Y-%m-%d')
-            except ValueError:
-                return Response({'error': 'Invalid date format. Use: YYYY-MM-DD'}, status=400)
-        
-        if interval=='day':
-            trunc_func = TruncDay
-            if not start_date:
-                start_date = datetime.now() - timedelta(days=points-1)
-            date_str = '%Y-%m-%d'
-        elif interval == 'week':
-            trunc_func = TruncWeek
-            if not start_date:
-                start_date = datetime.now() - timedelta(weeks=points)
-            start_date = start_date - timedelta(days=start_date.weekday())
-            date_str = '%Y-%m-W%W'
-        else:
-            trunc_func = TruncMonth
-            if not start_date:
-                start_date = datetime.now().replace(day=1) - timedelta(weeks=4*(points-1))
-            date_str = '%Y-%m'
-
-        data = Application.objects.filter(user=user, submission_date__gte=start_date).annotate(date=trunc_func('submission_date')).values('date').annotate(
-            total_applications=Count('id'),
-            rejections=Count('id', filter=models.Q(status=ApplicationStatus.REJECTED.name)),
-            acceptances=Count('id', filter=models.Q(status=ApplicationStatus.ACCEPTED.name)),
-        ).order_by('date')[:points]
-
-        results = []
-        j = 0
-        for i in range(points):
-            if interval == 'day':
-                date_point = start_date + timedelta(days=i)
-            elif interval == 'week':
-                date_point = start_date + timedelta(weeks=i)
-            else:
-                date_point = start_date + timedelta(weeks=4*i)
-            date_point = date_point.date()
-            if j>=len(data) or data[j]['date'] != date_point:
-                results.append({
-                    'date': date_point.strftime(date_str),
-                    'total_applications': 0,
-                    'rejections': 0,
-                    'acceptances': 0
-                })
-            else:
-                results.append({
-                    'date': data[j]['date'].strftime(date_str),
-                    'total_applications': data[j]['total_applications'],
-                    'rejections': data[j]['rejections'],
-                    'acceptances': data[j]['acceptances']
-                })
-                j+=1
-
-
-        response_data ={
-            "points" : points,
-            "start_date" : start_date.strftime(date_str),
-            "interval" : interval,
-            "results": results,
-        }
-
-        return Response(response_data)
+        return HttpResponse(metrics.render(metrics.collect()), content_type=metrics.CONTENT_TYPE)
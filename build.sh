@@ -2,5 +2,8 @@ set -o errexit
 
 pip install -r requirements.txt
 
+# Warns without a shared CACHE_URL (see joblander/settings.py)
+py manage.py check --deploy --fail-level ERROR
+
 py manage.py collectstatic --no-input
 py manage.py migrate
\ No newline at end of file
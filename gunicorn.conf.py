@@ -0,0 +1,21 @@
+# gunicorn.conf.py
+# Read by gunicorn from the working directory, whichever command starts it
+# (start.sh, fly.toml, manage.py loadtest). Keeps METRICS_DIR (see
+# JobLanderAPI/metrics.py) to the files of the running workers.
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'joblander.settings')
+
+
+def on_starting(server):
+    from JobLanderAPI import metrics
+    # Totals start over with the server
+    metrics.clear()
+
+
+def child_exit(server, worker):
+    from JobLanderAPI import metrics
+    try:
+        metrics.retire(worker.pid)
+    except OSError:
+        server.log.exception('Could not retire the metrics of worker %s', worker.pid)
@@ -2,6 +2,10 @@
 ASGI config for joblander project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Served by ASGI, the hot read endpoints use async views (see ASYNC_VIEWS in
+settings.py), e.g.
+
+    gunicorn --workers 2 --worker-class uvicorn_worker.UvicornWorker joblander.asgi
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -12,5 +16,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'joblander.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'true')
 
 application = get_asgi_application()
@@ -58,13 +58,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'JobLanderAPI.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'JobLanderAPI.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'JobLanderAPI.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -158,33 +160,107 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'JobLanderAPI.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'rest_framework.filters.OrderingFilter',
-        'rest_framework.filters.SearchFilter',
+        'JobLanderAPI.search.FullTextSearchFilter',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
         'rest_framework.throttling.UserRateThrottle',
         'rest_framework.throttling.AnonRateThrottle',
     ],
+    # An empty rate turns the throttle off, e.g. for load tests
     'DEFAULT_THROTTLE_RATES': {
-        'user': '100/minute',
-        'anon': '50/minute',
+        'user': env('USER_THROTTLE_RATE', default='100/minute') or None,
+        'anon': env('ANON_THROTTLE_RATE', default='50/minute') or None,
     },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
 }
 
+# Backend behind ?search= (see JobLanderAPI/search.py): "auto" picks MySQL
+# FULLTEXT on MySQL and the inverted index elsewhere; "index", "fulltext" or
+# "like" (plain icontains) force one. Run rebuild_search_index after
+# switching to "index". Both indexes match terms at the start of words.
+# FULLTEXT leaves out short words and stopwords, so searches with those fall
+# back to icontains.
+SEARCH_BACKEND = env('SEARCH_BACKEND', default='auto')
+
+# Analytics responses are cached per user and ETags derive from per-user
+# versions (see JobLanderAPI/cache.py and conditional.py). For invalidation
+# to reach every worker of every machine the cache has to be shared by
+# them: a Redis ("redis://host:6379/0"), Memcached or database
+# ("dbcache://table", after createcachetable) CACHE_URL, and `check
+# --deploy` warns without one. The default file cache is only shared on
+# one machine, so there the analytics are kept for
+# ANALYTICS_LOCAL_CACHE_TIMEOUT seconds (0 computes them on every request),
+# ETags cost a query over the user's rows and the refresh token blacklist
+# filter is only current to a few seconds. CACHE_SHARED overrides the guess
+# made from the backend, for caches it cannot tell apart, e.g. a file cache
+# on a volume every machine mounts.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='filecache:///tmp/joblander-cache?max_entries=10000'),
+}
+CACHE_SHARED = env.bool('CACHE_SHARED', default=None)
+ANALYTICS_LOCAL_CACHE_TIMEOUT = env.int('ANALYTICS_LOCAL_CACHE_TIMEOUT', default=10)
+
+# Served by joblander/asgi.py (gunicorn with uvicorn workers), the hot read
+# endpoints use async views on the async ORM (see JobLanderAPI/asyncviews.py).
+# asgi.py turns this on; under WSGI the sync views avoid running an event
+# loop per request.
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+
+# Each process writes its request histograms here for /metrics to add them
+# up (see JobLanderAPI/metrics.py). gunicorn.conf.py empties it when the
+# server starts and folds in the files of exited workers.
+METRICS_DIR = env('METRICS_DIR', default='/tmp/joblander-metrics')
+
+# Staff profile a request with an "X-Profile: 1" header or ?profile=1 (the
+# flag is ignored from anyone else), and PROFILE_SAMPLE_RATE (0 to 1)
+# profiles that share of all requests. The newest PROFILE_REPORTS_KEPT
+# reports are listed in the admin (see JobLanderAPI/profiling.py).
+PROFILE_SAMPLE_RATE = env.float('PROFILE_SAMPLE_RATE', default=0.0)
+PROFILE_REPORTS_KEPT = env.int('PROFILE_REPORTS_KEPT', default=200)
+
+# Slow work such as file deletion, ATS scoring and emails is queued in the
+# database and run by `manage.py runworkers` (see JobLanderAPI/tasks.py),
+# which every deploy starts: a process group in fly.toml, start.sh in the
+# Docker image. TASK_WORKERS is its default pool size; TASK_RUN_INLINE runs
+# tasks in the process that queued them once its transaction commits, for
+# development without a worker. A warning is logged when a due task waits
+# longer than TASK_PENDING_WARNING seconds (0 turns it off).
+TASK_WORKERS = env.int('TASK_WORKERS', default=2)
+TASK_RUN_INLINE = env.bool('TASK_RUN_INLINE', default=False)
+TASK_PENDING_WARNING = env.int('TASK_PENDING_WARNING', default=10 * 60)
+
+# CachedJWTAuthentication keeps users in the cache for this many seconds;
+# saving a user drops its entry (see JobLanderAPI/authentication.py). That
+# only reaches other machines through a shared cache, so without one the
+# entries are kept for AUTH_USER_LOCAL_CACHE_TIMEOUT seconds (0 loads the
+# user on every request): deactivating a user or changing their password
+# takes that long to apply everywhere.
+AUTH_USER_CACHE_TIMEOUT = env.int('AUTH_USER_CACHE_TIMEOUT', default=60)
+AUTH_USER_LOCAL_CACHE_TIMEOUT = env.int('AUTH_USER_LOCAL_CACHE_TIMEOUT', default=5)
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=2),
     "ROTATE_REFRESH_TOKENS": True,  # Generates a new refresh token when refreshing
     "BLACKLIST_AFTER_ROTATION": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    # Check refresh tokens against the blacklist through a filter that
+    # spares most of them the lookup (see JobLanderAPI/tokens.py)
+    "TOKEN_REFRESH_SERIALIZER": "JobLanderAPI.serializers.TokenRefreshSerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "JobLanderAPI.serializers.TokenBlacklistSerializer",
 }
 
+# runworkers deletes the expired refresh tokens and their blacklist entries,
+# which token rotation adds on every refresh, this often (seconds; 0 turns
+# it off, e.g. to run prune_tokens from cron instead)
+TOKEN_PRUNE_INTERVAL = env.int('TOKEN_PRUNE_INTERVAL', default=24 * 60 * 60)
+
 DJOSER={
     "USER_ID_FIELD":"id",
     "USER_CREATE_PASSWORD_RETYPE":True,
@@ -196,6 +272,15 @@ DJOSER={
         "user": "djoser.serializers.UserSerializer",
         "current_user": "djoser.serializers.UserSerializer",
     },
+    # Sent by a task (see JobLanderAPI/emails.py)
+    "EMAIL": {
+        "activation": "JobLanderAPI.emails.ActivationEmail",
+        "confirmation": "JobLanderAPI.emails.ConfirmationEmail",
+        "password_reset": "JobLanderAPI.emails.PasswordResetEmail",
+        "password_changed_confirmation": "JobLanderAPI.emails.PasswordChangedConfirmationEmail",
+        "username_changed_confirmation": "JobLanderAPI.emails.UsernameChangedConfirmationEmail",
+        "username_reset": "JobLanderAPI.emails.UsernameResetEmail",
+    },
     # "PASSWORD_RESET_CONFIRM_RETYPE":True,
     # "USERNAME_CHANGED_EMAIL_CONFIRMATION":True,
     # "SEND_CONFIRMATION_EMAIL":True,
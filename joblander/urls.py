@@ -19,11 +19,13 @@ from django.urls import path,include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenBlacklistView
+from JobLanderAPI.views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('JobLanderAPI.urls')),
     path('api/', include('djoser.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),  # Prometheus, staff only
     
     # JWT Authentication endpoints
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),  # Get access + refresh tokens
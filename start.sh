@@ -0,0 +1,15 @@
+#!/usr/bin/env bash
+# Serves the app and runs the task worker (see JobLanderAPI/tasks.py) next
+# to it, for hosts that start one command per instance: the Dockerfile and
+# Koyeb. fly.toml runs the worker as its own process group instead.
+set -o errexit
+
+python manage.py runworkers &
+gunicorn --bind ":${PORT:-8000}" --workers 2 joblander.wsgi &
+
+# Stopping the instance stops both; running tasks are let finish
+trap 'kill -TERM $(jobs -p) 2>/dev/null' TERM INT
+# Either one exiting takes the other down, so the host restarts the instance
+wait -n || true
+kill -TERM $(jobs -p) 2>/dev/null || true
+wait